@@ -647,9 +647,19 @@ class Serial:
 
             str_list = []
             for ii in range(nb_lines):
-                str_list.append(self.readline(eol=eol, timeout=timeout))
+                str_list.append(self._readline(eol=eol, timeout=timeout))
 
             return str_list
+
+    def write_readline_pipeline(self, msgs, write_synchro=None, eol=None,
+                                timeout=None):
+        '''Send all *msgs* back to back and return their answers in order
+        (one line per message)'''
+        if not msgs:
+            return []
+        return self.write_readlines(''.join(msgs), len(msgs),
+                                    write_synchro=write_synchro,
+                                    eol=eol, timeout=timeout)
             
 
         
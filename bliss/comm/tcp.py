@@ -18,6 +18,7 @@ from gevent import socket, event, queue, lock
 import time
 import logging
 import weakref
+import numpy
 
 from .exceptions import CommunicationError, CommunicationTimeout
 from ..common.greenlet_utils import KillMask
@@ -29,6 +30,105 @@ class SocketTimeout(CommunicationTimeout):
     '''Socket timeout error'''
 
 
+def _byte_array(buffer):
+    '''Return a writable uint8 numpy view on *buffer*'''
+    if isinstance(buffer, numpy.ndarray):
+        if not buffer.flags.c_contiguous:
+            raise ValueError('buffer must be contiguous')
+        return buffer.reshape(-1).view(numpy.uint8)
+    return numpy.frombuffer(buffer, dtype=numpy.uint8)
+
+
+class RxBuffer(object):
+    '''Receive buffer.
+
+    Data is received directly in a bytearray (with *recv_into*), consumed
+    data is only dropped when room is needed and the end of line search
+    resumes where the previous one stopped, so large answers are not
+    copied over and over.
+
+    Only the receiving greenlet moves the data in the bytearray,
+    readers only consume it.
+    '''
+
+    def __init__(self, size=16 * 1024):
+        self._buffer = bytearray(size)
+        self._start = 0         # first unread byte
+        self._end = 0           # end of received data
+        self._scan_eol = None
+        self._scan_pos = 0      # where the search of _scan_eol resumes
+
+    def __len__(self):
+        return self._end - self._start
+
+    def __nonzero__(self):
+        return self._end > self._start
+
+    def _reserve(self, size):
+        data_len = self._end - self._start
+        if self._start:
+            self._buffer[:data_len] = self._buffer[self._start:self._end]
+            self._scan_pos -= self._start
+            self._start, self._end = 0, data_len
+        missing = self._end + size - len(self._buffer)
+        if missing > 0:
+            self._buffer.extend(bytearray(max(missing, len(self._buffer))))
+
+    def recv_into(self, fd, size=16 * 1024):
+        '''Receive up to *size* bytes from socket *fd*'''
+        if len(self._buffer) - self._end < size:
+            self._reserve(size)
+        end = self._end
+        nbytes = fd.recv_into(memoryview(self._buffer)[end:end + size], size)
+        self._end += nbytes
+        return nbytes
+
+    def append(self, data):
+        if len(self._buffer) - self._end < len(data):
+            self._reserve(len(data))
+        self._buffer[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def last(self, size):
+        '''Return the last *size* received bytes (for debugging)'''
+        return str(self._buffer[self._end - size:self._end])
+
+    def find(self, eol):
+        '''Return the position of *eol* in the unread data or -1'''
+        if eol != self._scan_eol or self._scan_pos < self._start:
+            self._scan_eol = eol
+            self._scan_pos = self._start
+        pos = self._buffer.find(eol, self._scan_pos, self._end)
+        if pos == -1:
+            self._scan_pos = max(self._start, self._end - len(eol) + 1)
+            return -1
+        self._scan_pos = pos
+        return pos - self._start
+
+    def read(self, size=None):
+        '''Consume and return up to *size* bytes (all data if None)'''
+        end = self._end if size is None else min(self._end, self._start + size)
+        msg = memoryview(self._buffer)[self._start:end].tobytes()
+        self._start = end
+        return msg
+
+    def skip(self, size):
+        self._start = min(self._end, self._start + size)
+
+    def read_into(self, array, offset=0):
+        '''Consume data to fill the uint8 *array* from *offset*.
+        Return the number of bytes copied'''
+        nbytes = min(len(array) - offset, self._end - self._start)
+        if nbytes > 0:
+            array[offset:offset + nbytes] = numpy.frombuffer(
+                self._buffer, numpy.uint8, nbytes, self._start)
+            self._start += nbytes
+        return nbytes
+
+    def clear(self):
+        self._start = self._end
+
+
 # Decorator function for read/write functions.
 # Performs reading of data via "_raw_read_task" in self.connect()
 def try_connect_socket(fu):
@@ -71,7 +171,7 @@ class BaseSocket:
         self._timeout = timeout
         self._connected = False
         self._eol = eol
-        self._data = ''
+        self._data = RxBuffer()
         self._event = event.Event()
         self._raw_read_task = None
         self._lock = lock.Semaphore()
@@ -130,7 +230,7 @@ class BaseSocket:
             if self._raw_read_task:
                 self._raw_read_task.kill()
                 self._raw_read_task = None
-            self._data = ''
+            self._data.clear()
             self._connected = False
             self._fd = None
 
@@ -151,13 +251,7 @@ class BaseSocket:
                 self._event.clear()
                 if not self._connected:
                     raise socket.error(errno.EPIPE,"Broken pipe")
-        if maxsize:
-            msg = self._data[:maxsize]
-            self._data = self._data[maxsize:]
-        else:
-            msg = self._data
-            self._data = ''
-        return msg
+        return self._data.read(maxsize or None)
 
     @try_connect_socket
     def read(self, size=1, timeout=None):
@@ -169,9 +263,24 @@ class BaseSocket:
                 self._event.clear()
                 if not self._connected:
                     raise socket.error(errno.EPIPE,"Broken pipe")
-        msg = self._data[:size]
-        self._data = self._data[size:]
-        return msg
+        return self._data.read(size)
+
+    @try_connect_socket
+    def read_into(self, buffer, timeout=None):
+        '''Fill *buffer* (a bytearray or a contiguous numpy array) with the
+        received data. Return the number of bytes read'''
+        array = _byte_array(buffer)
+        timeout_errmsg = "timeout on socket(%s, %d)" % (self._host, self._port)
+        with gevent.Timeout(timeout or self._timeout,
+                            SocketTimeout(timeout_errmsg)):
+            offset = self._data.read_into(array)
+            while offset < len(array):
+                self._event.wait()
+                self._event.clear()
+                offset += self._data.read_into(array, offset)
+                if offset < len(array) and not self._connected:
+                    raise socket.error(errno.EPIPE,"Broken pipe")
+        return offset
 
     @try_connect_socket
     def readline(self, eol=None, timeout=None):
@@ -192,8 +301,8 @@ class BaseSocket:
                     raise socket.error(errno.EPIPE,"Broken pipe")
                 eol_pos = self._data.find(local_eol)
 
-        msg = self._data[:eol_pos]
-        self._data = self._data[eol_pos + len(local_eol):]
+        msg = self._data.read(eol_pos)
+        self._data.skip(len(local_eol))
         return msg
 
     @try_connect_socket
@@ -222,6 +331,14 @@ class BaseSocket:
                     write_synchro.notify()
                 return self.readline(eol=eol, timeout=timeout)
 
+    @try_connect_socket
+    def write_read_into(self, msg, buffer, write_synchro=None, timeout=None):
+        with self._lock:
+            self._sendall(msg)
+            if write_synchro:
+                write_synchro.notify()
+            return self.read_into(buffer, timeout=timeout)
+
     @try_connect_socket
     def write_readlines(
             self, msg, nb_lines, write_synchro=None, eol=None, timeout=None):
@@ -247,8 +364,19 @@ class BaseSocket:
 
                 return str_list
 
+    @try_connect_socket
+    def write_readline_pipeline(
+            self, msgs, write_synchro=None, eol=None, timeout=None):
+        '''Send all *msgs* back to back and return their answers in order
+        (one line per message), in one round trip'''
+        if not msgs:
+            return []
+        return self.write_readlines(''.join(msgs), len(msgs),
+                                    write_synchro=write_synchro,
+                                    eol=eol, timeout=timeout)
+
     def flush(self):
-        self._data = ''
+        self._data.clear()
 
     def _sendall(self,data) :
         raise NotImplementedError
@@ -276,10 +404,11 @@ class Socket(BaseSocket):
     def _raw_read(sock,fd):
         try:
             while(1):
-                raw_data = fd.recv(16 * 1024)
-                sock._debug("Rx: %r %r",raw_data,HexMsg(raw_data))
-                if raw_data:
-                    sock._data += raw_data
+                nbytes = sock._data.recv_into(fd)
+                if nbytes:
+                    if sock._logger.isEnabledFor(logging.DEBUG):
+                        raw_data = sock._data.last(nbytes)
+                        sock._debug("Rx: %r %r",raw_data,HexMsg(raw_data))
                     sock._event.set()
                 else:
                     break
@@ -332,7 +461,7 @@ class Command:
             self.__socket = socket
             self.__transaction = transaction
             self.__clear_transaction = clear_transaction
-            self.data = ''
+            self.data = RxBuffer()
 
         def __enter__(self):
             return self
@@ -348,13 +477,13 @@ class Command:
                     while not self.__transaction.empty():
                         read_value = self.__transaction.get()
                         if not isinstance(read_value,socket.error):
-                            self.data += read_value
+                            self.data.append(read_value)
 
                     if self.__clear_transaction and \
                        len(self.__socket._transaction_list) > 1:
-                        self.__socket._transaction_list[1].put(self.data)
+                        self.__socket._transaction_list[1].put(self.data.read())
                     else:
-                        self.__transaction.put(self.data)
+                        self.__transaction.put(self.data.read())
 
                 if self.__clear_transaction:
                     self.__socket._transaction_list.pop(trans_index)
@@ -437,17 +566,33 @@ class Command:
                 self._host, self._port)
             with gevent.Timeout(timeout or self._timeout,
                                 CommandTimeout(timeout_errmsg)):
-                ctx.data = ''
                 while len(ctx.data) < size:
                     read_value = transaction.get()
                     if isinstance(read_value,socket.error):
                         raise read_value
-                    ctx.data += read_value
+                    ctx.data.append(read_value)
 
-                msg = ctx.data[:size]
-                ctx.data = ctx.data[size:]
+                msg = ctx.data.read(size)
         return msg
 
+    @try_connect_command
+    def _read_into(self, transaction, buffer, timeout=None,
+                   clear_transaction=True):
+        array = _byte_array(buffer)
+        with Command.Transaction(self, transaction, clear_transaction) as ctx:
+            timeout_errmsg = "timeout on socket(%s, %d)" % (
+                self._host, self._port)
+            with gevent.Timeout(timeout or self._timeout,
+                                CommandTimeout(timeout_errmsg)):
+                offset = 0
+                while offset < len(array):
+                    read_value = transaction.get()
+                    if isinstance(read_value,socket.error):
+                        raise read_value
+                    ctx.data.append(read_value)
+                    offset += ctx.data.read_into(array, offset)
+        return offset
+
     @try_connect_command
     def _readline(self, transaction, eol=None, timeout=None,
                   clear_transaction=True):
@@ -456,17 +601,16 @@ class Command:
                                 CommandTimeout("timeout on socket(%s, %d)" %
                                                (self._host, self._port))):
                 local_eol = eol or self._eol
-                ctx.data = ''
                 eol_pos = -1
                 while eol_pos == -1:
                     read_value = transaction.get()
                     if isinstance(read_value,socket.error):
                         raise read_value
-                    ctx.data += read_value
+                    ctx.data.append(read_value)
                     eol_pos = ctx.data.find(local_eol)
 
-                msg = ctx.data[:eol_pos]
-                ctx.data = ctx.data[eol_pos + len(local_eol):]
+                msg = ctx.data.read(eol_pos)
+                ctx.data.skip(len(local_eol))
 
         return msg
 
@@ -491,6 +635,15 @@ class Command:
             write_synchro.notify()
         return self._read(size=size, timeout=timeout, transaction=transaction)
 
+    @try_connect_command
+    def write_read_into(self, msg, buffer, write_synchro=None, timeout=None):
+        '''Send *msg* and fill *buffer* (a bytearray or a contiguous numpy
+        array) with the answer. Return the number of bytes read'''
+        transaction = self._write(msg)
+        if write_synchro:
+            write_synchro.notify()
+        return self._read_into(transaction, buffer, timeout=timeout)
+
     @try_connect_command
     def write_readline(self, msg, write_synchro=None, eol=None, timeout=None):
         with gevent.Timeout(timeout or self._timeout,
@@ -531,6 +684,17 @@ class Command:
                 start_time = time.time()
             return str_list
 
+    @try_connect_command
+    def write_readline_pipeline(
+            self, msgs, write_synchro=None, eol=None, timeout=None):
+        '''Send all *msgs* back to back and return their answers in order
+        (one line per message), in one round trip'''
+        if not msgs:
+            return []
+        return self.write_readlines(''.join(msgs), len(msgs),
+                                    write_synchro=write_synchro,
+                                    eol=eol, timeout=timeout)
+
     @staticmethod
     def _raw_read(command,fd):
         try:
@@ -32,7 +32,7 @@ class Socket(BaseSocket):
                 raw_data = fd.recv(16 * 1024)
                 sock._debug("Rx: %r %r",raw_data,HexMsg(raw_data))
                 if raw_data:
-                    sock._data += raw_data
+                    sock._data.append(raw_data)
                     sock._event.set()
                 else:
                     break
@@ -31,21 +31,27 @@ as calls to :meth:`~bliss.config.static.Config.get`. Example::
 from bliss.common import log as elog
 from bliss.common.task_utils import *
 from bliss.common.motor_config import StaticConfig
-from bliss.common.motor_settings import AxisSettings
+from bliss.common.motor_settings import AxisSettings, SETTINGS_WRITER
 from bliss.common import event
 from bliss.common.utils import Null, with_custom_members
 from bliss.config.static import get_config
 from bliss.common.encoder import Encoder
 from bliss.common.hook import MotionHook
 import gevent
+import gevent.event
 import re
 import math
+import time
 import types
 import functools
 import numpy
 
 #: Default polling time
 DEFAULT_POLLING_TIME = 0.02
+#: Polling time around the estimated end of a motion
+FAST_POLLING_TIME = 0.002
+#: Adapt the move loop polling to the estimated end of motion
+ADAPTIVE_POLLING = True
 
 
 def get_encoder(name):
@@ -106,6 +112,23 @@ class Motion(object):
         return self.__axis
 
 
+def motion_duration(displacement, velocity, acceleration):
+    """
+    Duration of a trapezoidal (or triangular) velocity profile motion
+    """
+    full_accel_time = velocity / acceleration
+    full_accel_dplmnt = 0.5*acceleration * full_accel_time**2
+
+    full_dplmnt_non_const_vel = 2 * full_accel_dplmnt
+    reaches_max_velocity = displacement > full_dplmnt_non_const_vel
+    if reaches_max_velocity:
+        max_vel_dplmnt = displacement - full_dplmnt_non_const_vel
+        max_vel_time = max_vel_dplmnt / velocity
+        return max_vel_time + 2*full_accel_time
+    else:
+        return math.sqrt(2*displacement/acceleration)
+
+
 class MotionEstimation(object):
     """
     Estimate motion time and displacement based on current axis position
@@ -133,26 +156,152 @@ class MotionEstimation(object):
             self.duration = 0
             return
 
-        full_accel_time = vel / accel
-        full_accel_dplmnt = 0.5*accel * full_accel_time**2
-
-        full_dplmnt_non_const_vel = 2 * full_accel_dplmnt
-        reaches_max_velocity = displacement > full_dplmnt_non_const_vel
-        if reaches_max_velocity:
-            max_vel = vel
-            accel_time = full_accel_time
-            accel_dplmnt = full_accel_dplmnt
-            dplmnt_non_const_vel = full_dplmnt_non_const_vel
-            max_vel_dplmnt = displacement - dplmnt_non_const_vel
-            max_vel_time = max_vel_dplmnt / vel
-            self.duration = max_vel_time + 2*accel_time
-        else:
-            self.duration = math.sqrt(2*displacement/accel)
+        self.duration = motion_duration(displacement, vel, accel)
 
         if do_backlash:
             backlash_estimation = MotionEstimation(axis, target_pos, self.fpos)
             self.duration += backlash_estimation.duration
 
+
+class _ControllerPoller(object):
+    """
+    Poll the state and position of the moving axes of a controller
+
+    The axes waiting for their state in the same polling cycle are read
+    together with :meth:`Controller.state_all` and
+    :meth:`Controller.read_position_all`. Controllers which do not
+    implement these methods are polled axis per axis.
+    """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.state_all_supported = True
+        self.read_position_all_supported = True
+        self._requests = dict()
+        self._task = None
+
+    def poll(self, axis):
+        """
+        Returns the (state, position) of **axis**, position is in *steps*
+        or None when the controller can't read it with the state.
+        """
+        result = self._requests.get(axis)
+        if result is None:
+            result = self._requests[axis] = gevent.event.AsyncResult()
+        if self._task is None:
+            self._task = gevent.spawn(self._poll)
+        return result.get()
+
+    def _read_states(self, axes):
+        """
+        Returns the states of **axes**; when read axis per axis, the
+        exception raised by an axis replaces its state (the other axes
+        are not affected)
+        """
+        if self.state_all_supported:
+            try:
+                return self.controller.state_all(axes)
+            except NotImplementedError:
+                self.state_all_supported = False
+        states = list()
+        for axis in axes:
+            try:
+                states.append(self.controller.state(axis))
+            except Exception as e:
+                states.append(e)
+        return states
+
+    def _read_positions(self, axes):
+        if axes and self.read_position_all_supported:
+            try:
+                return self.controller.read_position_all(axes)
+            except NotImplementedError:
+                self.read_position_all_supported = False
+        return [None] * len(axes)
+
+    def _poll(self):
+        try:
+            while self._requests:
+                # let the other moving axes join this cycle
+                gevent.sleep(0)
+                requests, self._requests = self._requests, dict()
+                axes = requests.keys()
+                try:
+                    states = self._read_states(axes)
+                except Exception as e:
+                    for result in requests.itervalues():
+                        result.set_exception(e)
+                    continue
+                for axis, state in zip(axes, states):
+                    if isinstance(state, Exception):
+                        requests.pop(axis).set_exception(state)
+                axes = [axis for axis in axes if axis in requests]
+                states = [state for state in states
+                          if not isinstance(state, Exception)]
+                try:
+                    positions = self._read_positions(
+                        [axis for axis in axes if axis._hw_control])
+                except Exception as e:
+                    for result in requests.itervalues():
+                        result.set_exception(e)
+                    continue
+                positions = iter(positions)
+                for axis, state in zip(axes, states):
+                    position = next(positions) if axis._hw_control else None
+                    requests[axis].set((state, position))
+        finally:
+            self._task = None
+
+
+def _get_poller(controller):
+    poller = getattr(controller, '_axes_poller', None)
+    if poller is None:
+        poller = controller._axes_poller = _ControllerPoller(controller)
+    return poller
+
+
+class _PollingSchedule(object):
+    """
+    Adaptive polling of a motion
+
+    The move loop polls every *polling_time*, like a fixed period polling
+    (each poll sends the axis position, i.e: software position triggers),
+    except around the end of motion estimated with the velocity and the
+    acceleration: from 2 polling periods before until 1 polling period
+    after, it polls every FAST_POLLING_TIME.
+    """
+
+    def __init__(self, axis, motion, polling_time):
+        now = time.time()
+        self.polling_time = polling_time
+        self.fast_polling_time = min(polling_time, FAST_POLLING_TIME)
+        self.fast_start = self.fast_end = None
+        if motion is None or not ADAPTIVE_POLLING:
+            return
+        try:
+            velocity = axis.velocity()
+            acceleration = axis.acceleration()
+            displacement = abs(motion.delta / axis.steps_per_unit)
+            duration = motion_duration(displacement, velocity, acceleration)
+        except (NotImplementedError, ZeroDivisionError, TypeError):
+            return
+        estimated_end = now + duration
+        self.fast_start = estimated_end - 2 * polling_time
+        self.fast_end = estimated_end + polling_time
+
+    def delay(self):
+        if self.fast_start is None:
+            return self.polling_time
+        now = time.time()
+        if now < self.fast_start:
+            # don't sleep past the start of the fast polling
+            return min(max(self.fast_start - now, self.fast_polling_time),
+                       self.polling_time)
+        if now < self.fast_end:
+            return self.fast_polling_time
+        return self.polling_time
+
+
 def lazy_init(func):
     @functools.wraps(func)
     def func_wrapper(self, *args, **kwargs):
@@ -178,6 +327,7 @@ class Axis(object):
         self.__move_done_callback = gevent.event.Event()
         self.__move_done.set()
         self.__move_done_callback.set()
+        self.__move_loop_wakeup = gevent.event.Event()
         self.__move_task = None
         self.__stopped = False
         self._in_group_move = False
@@ -438,8 +588,11 @@ class Axis(object):
 
 
     @lazy_init 
-    def _read_dial_and_update(self, update_user=True):
-        dial_pos = self._hw_position()
+    def _read_dial_and_update(self, update_user=True, hw_position=None):
+        if hw_position is None:
+            dial_pos = self._hw_position()
+        else:
+            dial_pos = hw_position / self.steps_per_unit
         self.settings.set("dial_position", dial_pos)
         if update_user:
             user_pos = self.dial2user(dial_pos, self.offset)
@@ -504,6 +657,8 @@ class Axis(object):
         self.settings.set("state", self.state(read_hw=True)) 
         self._read_dial_and_update()
         self._set_position(self.position())
+        # settings written now, not only by the background writer
+        SETTINGS_WRITER.flush()
         event.send(self, "sync_hard")
         
     @lazy_init
@@ -620,10 +775,10 @@ class Axis(object):
             self.settings.set("high_limit", high_limit)
         return self.settings.get('low_limit'), self.settings.get('high_limit')
 
-    def _update_settings(self, state):
+    def _update_settings(self, state, hw_position=None):
         if self._hw_control:
             self.settings.set("state", state) 
-            self._read_dial_and_update()
+            self._read_dial_and_update(hw_position=hw_position)
  
     def _backlash_move(self, backlash_start, backlash, polling_time):
         final_pos = backlash_start + backlash
@@ -633,7 +788,7 @@ class Axis(object):
         return self._handle_move(backlash_motion, polling_time)
 
     def _handle_move(self, motion, polling_time):
-        state = self._move_loop(polling_time)
+        state = self._move_loop(polling_time, motion=motion)
         if state in ['LIMPOS', 'LIMNEG']:
             raise RuntimeError(str(state))
 
@@ -970,14 +1125,30 @@ class Axis(object):
             except gevent.GreenletExit:
                 pass
 
-    def _move_loop(self, polling_time=DEFAULT_POLLING_TIME, ctrl_state_funct='state'):
+    def _move_loop(self, polling_time=DEFAULT_POLLING_TIME, ctrl_state_funct='state',
+                   motion=None):
         state_funct = getattr(self.__controller, ctrl_state_funct)
+        poller = _get_poller(self.__controller)
+        schedule = _PollingSchedule(self, motion, polling_time)
+        wakeup = self.__move_loop_wakeup
         while True:
-            state = state_funct(self)
-            self._update_settings(state)
+            # cleared before reading the state, not to miss an end of motion
+            # notified meanwhile
+            wakeup.clear()
+            if ctrl_state_funct == 'state' and poller.state_all_supported:
+                # moving axes of the controller are polled together
+                state, hw_position = poller.poll(self)
+            else:
+                state, hw_position = state_funct(self), None
+            self._update_settings(state, hw_position)
             if state != "MOVING":
                 return state
-            gevent.sleep(polling_time)
+            # estimations are meaningless once the motion is stopped
+            delay = polling_time if self.__stopped else schedule.delay()
+            wakeup.wait(delay)
+
+    def _wakeup_move_loop(self):
+        self.__move_loop_wakeup.set()
         
     def _cleanup_stop(self, jog=False):
         if jog:
@@ -993,6 +1164,7 @@ class Axis(object):
 
     def _set_stopped(self):
         self.__stopped = True
+        self._wakeup_move_loop()
         if not self.is_moving:
           self.__move_task = None
 
@@ -10,13 +10,14 @@ import itertools
 from bliss.common.task_utils import *
 from bliss.common.axis import Axis, AxisState, DEFAULT_POLLING_TIME
 from bliss.common import event
+from bliss.common.session import resolve
 from bliss.common.utils import grouped
 
 
 def Group(*axes_list):
     axes = dict()
     g = _Group(id(axes), {})
-    for axis in axes_list:
+    for axis in map(resolve, axes_list):
         if not isinstance(axis, Axis):
             raise ValueError("invalid axis %r" % axis)
         axes[axis.name] = axis
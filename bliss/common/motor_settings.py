@@ -10,10 +10,83 @@ from bliss.common import event
 from bliss.config import settings
 from bliss.config import channels
 import functools
+import atexit
+import gevent
+
+# settings only kept in channels (not written to the axis hash)
+CHANNEL_ONLY_SETTINGS = ('state', 'position')
+
+
+class _SettingsWriter(object):
+    """
+    Write axis settings to Redis in one pipeline.
+
+    Writes are gathered and sent out of the caller greenlet (i.e: the
+    move loop); channels already broadcast the new values. Values which
+    could not be written are logged and sent again RETRY_DELAY later.
+    """
+
+    RETRY_DELAY = 1.
+
+    def __init__(self):
+        self._pending = dict()
+        self._task = None
+
+    def set(self, hash_name, setting_name, value):
+        self._pending.setdefault(hash_name, dict())[setting_name] = value
+        if self._task is None:
+            self._task = gevent.spawn(self._write)
+
+    def _write(self):
+        try:
+            self.flush()
+        except Exception:
+            elog.exception("motor settings: can't write %s, retrying in %gs" %
+                           (", ".join(sorted(self._pending)),
+                            self.RETRY_DELAY), raise_exception=False)
+
+    def flush(self):
+        """
+        Write the pending values now (the values are kept for the next
+        write if it fails)
+        """
+        pending, self._pending = self._pending, dict()
+        self._task = None
+        if not pending:
+            return
+        pipeline = settings.get_cache().pipeline()
+        for hash_name, values in pending.iteritems():
+            deleted = [name for name, value in values.iteritems()
+                       if value is None]
+            updated = dict(((name, value) for name, value in values.iteritems()
+                            if value is not None))
+            if deleted:
+                pipeline.hdel(hash_name, *deleted)
+            if updated:
+                pipeline.hmset(hash_name, updated)
+        try:
+            pipeline.execute()
+        except:
+            # keep the values not set again meanwhile
+            for hash_name, values in pending.iteritems():
+                newer_values = self._pending.setdefault(hash_name, dict())
+                for name, value in values.iteritems():
+                    newer_values.setdefault(name, value)
+            if self._task is None:
+                self._task = gevent.spawn_later(self.RETRY_DELAY, self._write)
+            raise
+
+SETTINGS_WRITER = _SettingsWriter()
+atexit.register(SETTINGS_WRITER.flush)
+
 
 def setting_update_from_channel(value, setting_name=None, axis=None):
     #print 'setting update from channel', axis.name, setting_name, str(value)
 
+    if setting_name not in CHANNEL_ONLY_SETTINGS:
+        # the hash was written by the sender
+        get_axis_settings_values(axis)[setting_name] = value
+
     if not axis._hw_control:
         if setting_name == 'state':
             if 'MOVING' in str(value):
@@ -32,22 +105,34 @@ def get_from_config(axis, setting_name):
         return
 
 
-def get_axis_setting(axis, setting_name):
-    hash_setting = settings.HashSetting("axis.%s" % axis.name)
-    if len(hash_setting) == 0:
-        # there is no setting value in cache
-        setting_value = get_from_config(axis, setting_name)
-        if setting_value is not None:
-            # write setting to cache
-            hash_setting[setting_name] = setting_value
+def get_axis_settings_values(axis):
+    """
+    Return the local copy of the axis settings hash.
+
+    It is read in one HGETALL on first use, then kept up to date by the
+    axis writes and the beacon channels.
+    """
+    try:
+        return axis._settings_values
+    except AttributeError:
+        SETTINGS_WRITER.flush()
+        values = settings.HashSetting("axis.%s" % axis.name).get_all()
+        axis._settings_values = values
+        return values
+
+
+def set_axis_setting(axis, setting_name, value):
+    """Write a setting in the axis hash (deleted if **value** is None)"""
+    values = get_axis_settings_values(axis)
+    if value is None:
+        values.pop(setting_name, None)
     else:
-        setting_value = hash_setting.get(setting_name)
-        if setting_value is None:
-            # take setting value from config
-            setting_value = get_from_config(axis, setting_name)
-            if setting_value is not None:
-                # write setting to cache
-                hash_setting[setting_name] = setting_value
+        values[setting_name] = value
+    SETTINGS_WRITER.set("axis.%s" % axis.name, setting_name, value)
+
+
+def get_axis_setting(axis, setting_name):
+    setting_value = get_axis_settings_values(axis).get(setting_name)
 
     try:
         beacon_channels = axis._beacon_channels
@@ -58,6 +143,12 @@ def get_axis_setting(axis, setting_name):
     try:
         chan = beacon_channels[setting_name]
     except KeyError:
+        if setting_value is None:
+            # take setting value from config
+            setting_value = get_from_config(axis, setting_name)
+            if setting_value is not None:
+                # write setting to cache
+                set_axis_setting(axis, setting_name, setting_value)
         chan_name = "axis.%s.%s" % (axis.name, setting_name)
         cb = functools.partial(setting_update_from_channel, setting_name=setting_name, axis=axis)
         if setting_value is None:
@@ -132,8 +223,8 @@ class ControllerAxisSettings:
         if convert_func is not None:
             value = convert_func(value)
 
-        if setting_name not in ('state', 'position'):
-            settings.HashSetting("axis.%s" % axis.name)[setting_name] = value
+        if setting_name not in CHANNEL_ONLY_SETTINGS:
+            set_axis_setting(axis, setting_name, value)
         axis._beacon_channels[setting_name].value = value
         event.send(axis, 'internal_'+setting_name, value)
 
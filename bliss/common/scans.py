@@ -57,7 +57,7 @@ def _get_counters(mg, missing_list):
     counters = list()
     if mg is not None:
         for cnt_name in mg.enable:
-            cnt = operator.attrgetter(cnt_name)(setup_globals)
+            cnt = session.resolve(operator.attrgetter(cnt_name)(setup_globals))
             if cnt:
                 counters.append(cnt)
             else:
@@ -67,7 +67,7 @@ def _get_counters(mg, missing_list):
 def _get_all_counters(counters):
     all_counters, missing_counters = [], []
     if counters:
-        for cnt in counters:
+        for cnt in map(session.resolve, counters):
             if isinstance(cnt, measurementgroup.MeasurementGroup):
                 all_counters.extend(_get_counters(cnt, missing_counters))
             else:
@@ -227,9 +227,12 @@ def step_scan(chain,scan_info,name=None,save=default_writer is not None):
     scandata = scan_module.ScanSaving()
     config = scandata.get()
     root_path = config.get('root_path')
-    save &= default_writer is not None
-    writer = default_writer.Writer(root_path) if save else None
+    external_writer = scandata.writer == 'external'
+    if not external_writer:
+        save &= default_writer is not None
+    writer = default_writer.Writer(root_path) if save and not external_writer else None
     scan_info['save'] = save
+    scan_info['writer'] = scandata.writer
     scan_info['root_path'] = root_path
     scan_info['session_name'] = scandata.session
     scan_info['user_name'] = scandata.user_name
@@ -272,6 +275,7 @@ def ascan(motor, start, stop, npoints, count_time, *counters, **kwargs):
                     scan object and acquisition chain
         return_scan (bool): False by default
     """
+    motor = session.resolve(motor)
     scan_info = { 'type': kwargs.get('type', 'ascan'),
                   'save': kwargs.get('save', True),
                   'title': kwargs.get('title'),
@@ -376,6 +380,7 @@ def mesh(motor1, start1, stop1, npoints1, motor2, start2, stop2, npoints2, count
     its acquisition chain without executing the actual scan.
 
     """
+    motor1, motor2 = session.resolve(motor1), session.resolve(motor2)
     scan_info = { 'type': kwargs.get('type', 'mesh'),
                   'save': kwargs.get('save', True),
                   'title': kwargs.get('title'),
@@ -473,6 +478,7 @@ def a2scan(motor1, start1, stop1, motor2, start2, stop2, npoints, count_time,
                     scan object and acquisition chain
         return_scan (bool): False by default
     """
+    motor1, motor2 = session.resolve(motor1), session.resolve(motor2)
     scan_info = { 'type': kwargs.get('type', 'a2scan'),
                   'save': kwargs.get('save', True),
                   'title': kwargs.get('title'),
@@ -743,6 +749,7 @@ def pointscan(motor, positions, count_time, *counters, **kwargs):
         save (bool): save scan data to file [default: True]
         return_scan (bool): False by default
     """
+    motor = session.resolve(motor)
     scan_info = {'type': kwargs.get('type', 'pointscan'),
                  'save': kwargs.get('save', True),
                  'title': kwargs.get('title')}
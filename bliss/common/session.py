@@ -7,8 +7,13 @@
 
 import os
 import sys
+import time
 from types import ModuleType
 import functools
+import collections
+import gevent.lock
+import gevent.pool
+import gevent.queue
 from treelib import Tree
 
 from bliss import setup_globals
@@ -17,6 +22,10 @@ from bliss.config.conductor.client import get_config_file, get_python_modules, g
 
 CURRENT_SESSION = None
 
+#: default max. number of objects initialized at the same time by
+#: Session.setup (1 means one after the other)
+DEFAULT_INIT_CONCURRENCY = 8
+
 
 def get_current():
     """
@@ -121,6 +130,224 @@ def load_script(env_dict, script_module_name, session=None):
         env_dict[k] = globals_dict[k]
 
 
+class _LazyObject(object):
+    """
+    Placeholder of a session object in lazy mode: the object is created
+    from the configuration on first access, and replaces the placeholder
+    in setup_globals and in the session environment.
+    """
+
+    def __init__(self, session, name, env_dict):
+        d = self.__dict__
+        d['_LazyObject__session'] = session
+        d['_LazyObject__name'] = name
+        d['_LazyObject__env_dict'] = env_dict
+        d['_LazyObject__object'] = None
+        d['_LazyObject__lock'] = gevent.lock.RLock()
+
+    def _get_object(self):
+        with self.__lock:
+            if self.__object is None:
+                name = self.__name
+                start = time.time()
+                obj = self.__session.config.get(name)
+                self.__session.init_times[name] = time.time() - start
+                self.__dict__['_LazyObject__object'] = obj
+                if getattr(setup_globals, name, None) is self:
+                    setattr(setup_globals, name, obj)
+                if self.__env_dict.get(name) is self:
+                    self.__env_dict[name] = obj
+            return self.__object
+
+    def _may_be_instance(self, typ):
+        # axes and encoders are only created by motor controllers
+        from bliss.common.axis import Axis
+        from bliss.common.encoder import Encoder
+        config_node = self.__session.config.get_config(self.__name)
+        if config_node is None:
+            return True
+        object_type = None
+        parent = config_node.parent
+        if config_node.plugin == 'emotion' and parent is not None:
+            for key, base in (('axes', Axis), ('encoders', Encoder)):
+                if any(node is config_node for node in parent.get(key) or ()):
+                    object_type = base
+        if object_type is None:
+            return not (issubclass(typ, Axis) or issubclass(typ, Encoder))
+        return issubclass(object_type, typ) or issubclass(typ, object_type)
+
+    def __getattr__(self, name):
+        return getattr(self._get_object(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._get_object(), name, value)
+
+    def __delattr__(self, name):
+        delattr(self._get_object(), name)
+
+    def __dir__(self):
+        return dir(self._get_object())
+
+    def __repr__(self):
+        return repr(self._get_object())
+
+    def __str__(self):
+        return str(self._get_object())
+
+    def __call__(self, *args, **kwargs):
+        return self._get_object()(*args, **kwargs)
+
+    def __nonzero__(self):
+        return bool(self._get_object())
+
+    def __eq__(self, other):
+        return self._get_object() == resolve(other)
+
+    def __ne__(self, other):
+        return self._get_object() != resolve(other)
+
+    def __hash__(self):
+        return hash(self._get_object())
+
+    def __len__(self):
+        return len(self._get_object())
+
+    def __iter__(self):
+        return iter(self._get_object())
+
+    def __getitem__(self, key):
+        return self._get_object()[key]
+
+
+def resolve(obj):
+    """
+    Return the session object if **obj** is the placeholder of an object
+    not yet created (lazy session setup), **obj** otherwise
+    """
+    if isinstance(obj, _LazyObject):
+        return obj._get_object()
+    return obj
+
+
+def is_instance(obj, typ):
+    """
+    isinstance() of a session object: an object not yet created (lazy
+    session setup) is only created if its configuration tells it can be
+    an instance of **typ**
+    """
+    if isinstance(obj, _LazyObject):
+        if not obj._may_be_instance(typ):
+            return False
+        obj = obj._get_object()
+    return isinstance(obj, typ)
+
+
+def _config_references(node):
+    """
+    Return the names of the objects referenced (*$name*) in a config node
+    """
+    references = set()
+    values = [node]
+    while values:
+        value = values.pop()
+        if isinstance(value, dict):
+            values.extend(v for k, v in value.iteritems()
+                          if k != '__children__')
+        elif isinstance(value, list):
+            values.extend(value)
+        elif isinstance(value, (str, unicode)) and value.startswith('$'):
+            references.add(value.lstrip('$'))
+    return references
+
+
+class _InitUnit(object):
+    """
+    Objects of the same top level configuration node (i.e: a motor
+    controller and its axes), created one after the other
+    """
+
+    def __init__(self, node):
+        self.node = node
+        self.names = []             # session objects
+        self.required = []          # referenced objects, not exported
+        self.dependencies = set()   # units to initialize before
+        self.dependents = set()
+
+
+def _init_units(config, names):
+    """
+    Group the objects to initialize in units and find the dependencies
+    between units from the references in their configuration.
+
+    Returns:
+        list<_InitUnit>: the units, in dependency order
+    """
+    units = collections.OrderedDict()
+
+    def get_unit(node, name):
+        if node is None:
+            key = name          # not in config: fails on initialization
+        else:
+            key = node.get_node_filename()[0] or node
+        unit = units.get(key)
+        if unit is None:
+            unit = units[key] = _InitUnit(node)
+            pending.append(unit)
+        return unit
+
+    pending = []
+    for name in names:
+        get_unit(config.get_config(name), name).names.append(name)
+    while pending:
+        unit = pending.pop(0)
+        if unit.node is None:
+            continue
+        for reference in sorted(_config_references(unit.node)):
+            node = config.get_config(reference)
+            if node is None:
+                continue
+            dependency = get_unit(node, reference)
+            if dependency is unit:
+                continue
+            if reference not in dependency.names and \
+               reference not in dependency.required:
+                dependency.required.append(reference)
+            unit.dependencies.add(dependency)
+            dependency.dependents.add(unit)
+
+    # topological sort
+    ordered = []
+    waiting = dict((unit, set(unit.dependencies)) for unit in units.values())
+    while waiting:
+        ready = [unit for unit in units.values()
+                 if unit in waiting and not waiting[unit]]
+        if not ready:
+            # dependency cycle: the remaining units are initialized one
+            # after the other, in configuration order
+            remaining = [unit for unit in units.values() if unit in waiting]
+            previous = None
+            for unit in remaining:
+                unit.dependencies = set(dependency for dependency
+                                        in unit.dependencies
+                                        if dependency not in waiting)
+                if previous is not None:
+                    unit.dependencies.add(previous)
+                previous = unit
+            for unit in units.values():
+                unit.dependents = set()
+            for unit in units.values():
+                for dependency in unit.dependencies:
+                    dependency.dependents.add(unit)
+            ordered.extend(remaining)
+            break
+        for unit in ready:
+            del waiting[unit]
+            for dependent in unit.dependents:
+                waiting[dependent].discard(unit)
+        ordered.extend(ready)
+    return ordered
+
+
 class Session(object):
     """
     Bliss session.
@@ -162,6 +389,15 @@ class Session(object):
        # A svg synoptic (Web shell) can be added:
        synoptic:
          svg-file: super_mario.svg
+
+       # objects which don't reference each other are initialized
+       # concurrently, at most 'init-concurrency' at the same time
+       # (default: 8, 1 to initialize them one after the other)
+       init-concurrency: 8
+
+       # objects are only created when they are used for the first
+       # time (measurement groups are always created at setup)
+       lazy-init: False
     """
     def __init__(self, name, config_tree):
         self.__name = name
@@ -195,6 +431,10 @@ class Session(object):
         self.__objects_names = None
         self.__children_tree = None
         self.__include_sessions = config_tree.get('include-sessions')
+        self.__init_concurrency = config_tree.get('init-concurrency',
+                                                  DEFAULT_INIT_CONCURRENCY)
+        self.__lazy_init = config_tree.get('lazy-init', False)
+        self.init_times = collections.OrderedDict()
 
     @property
     def name(self):
@@ -294,11 +534,32 @@ class Session(object):
                 child._build_children_tree(tree, child, children)
         return tree
 
-    def setup(self, env_dict=None, verbose=False):
+    def setup(self, env_dict=None, verbose=False, concurrency=None,
+              lazy=None):
+        """
+        Initialize the session objects and run the setup file(s)
+
+        Keyword Args:
+            env_dict (dict): environment where to export the objects
+            verbose (bool): print the objects initialization
+            concurrency (int): max. number of objects initialized at the
+                               same time (default: *init-concurrency* of
+                               the session configuration)
+            lazy (bool): export placeholders which create the objects on
+                         first use (default: *lazy-init* of the session
+                         configuration)
+        """
         if env_dict is None:
             env_dict = self._get_global_env_dict()
 
-        self._load_config(env_dict, verbose)
+        if concurrency is None:
+            concurrency = self.__init_concurrency
+        if lazy is None:
+            lazy = self.__lazy_init
+        if lazy:
+            self._load_config_lazily(env_dict, verbose)
+        else:
+            self._load_config(env_dict, verbose, concurrency)
 
         global CURRENT_SESSION
         CURRENT_SESSION = self
@@ -340,18 +601,77 @@ class Session(object):
             raise ValueError("Session: setup-file %s cannot be found" %
                              self.setup_file)
 
-    def _load_config(self, env_dict, verbose=True):
+    def _load_config(self, env_dict, verbose=True, concurrency=1):
+        self.init_times.clear()
+        start = time.time()
+        if concurrency > 1:
+            self._load_config_concurrently(env_dict, verbose, concurrency)
+        else:
+            for item_name in self.object_names:
+                self._init_object(item_name, env_dict, verbose)
+        if verbose and self.init_times:
+            print "%d objects initialized in %.3f s" % \
+                (len(self.init_times), time.time() - start)
+
+        self._add_from_config(self.name, env_dict)
+
+    def _load_config_lazily(self, env_dict, verbose):
+        self.init_times.clear()
         for item_name in self.object_names:
             if hasattr(setup_globals, item_name):
                 env_dict[item_name] = getattr(setup_globals, item_name)
                 continue
+            config_node = self.config.get_config(item_name)
+            if config_node is not None and \
+               config_node.get('class') == 'MeasurementGroup':
+                # measurement groups are looked up by type
+                self._init_object(item_name, env_dict, verbose)
+                continue
+            lazy_object = _LazyObject(self, item_name, env_dict)
+            env_dict[item_name] = lazy_object
+            setattr(setup_globals, item_name, lazy_object)
 
-            if verbose:
-                print "Initializing '%s`" % item_name
+        self._add_from_config(self.name, env_dict)
 
-            self._add_from_config(item_name, env_dict)
+    def _load_config_concurrently(self, env_dict, verbose, concurrency):
+        units = _init_units(self.config, self.object_names)
+        done = gevent.queue.Queue()
+        pool = gevent.pool.Pool(concurrency)
 
-        self._add_from_config(self.name, env_dict)
+        def init(unit):
+            try:
+                for item_name in unit.required:
+                    try:
+                        self.config.get(item_name)
+                    except:
+                        sys.excepthook(*sys.exc_info())
+                for item_name in unit.names:
+                    self._init_object(item_name, env_dict, verbose)
+            finally:
+                done.put(unit)
+
+        waiting = dict((unit, set(unit.dependencies)) for unit in units)
+        for unit in units:
+            if not unit.dependencies:
+                pool.spawn(init, unit)
+        for i in range(len(units)):
+            unit = done.get()
+            for dependent in unit.dependents:
+                waiting[dependent].discard(unit)
+                if not waiting[dependent]:
+                    pool.spawn(init, dependent)
+
+    def _init_object(self, item_name, env_dict, verbose):
+        if hasattr(setup_globals, item_name):
+            env_dict[item_name] = getattr(setup_globals, item_name)
+            return
+
+        if verbose:
+            print "Initializing '%s`" % item_name
+
+        start = time.time()
+        self._add_from_config(item_name, env_dict)
+        self.init_times[item_name] = time.time() - start
 
     def _add_from_config(self, item_name, env_dict):
         try:
@@ -30,6 +30,7 @@ from pygments.formatters import TerminalFormatter
 from bliss import setup_globals
 from bliss.common.axis import Axis
 from bliss.config.static import get_config
+from bliss.common import session
 from bliss.common.motor_group import Group
 
 
@@ -53,8 +54,9 @@ def __get_objects_iter(*names_or_objs):
 def __get_objects_type_iter(typ):
     for name in dir(setup_globals):
         elem = getattr(setup_globals, name)
-        if isinstance(elem, typ):
-            yield elem
+        # lazy session objects which can't be of this type aren't created
+        if session.is_instance(elem, typ):
+            yield session.resolve(elem)
 
 
 __get_axes_iter = functools.partial(__get_objects_type_iter, Axis)
@@ -9,6 +9,9 @@ from .conductor import client
 from collections import namedtuple
 from functools import partial
 import cPickle
+import struct
+import socket
+import zlib
 import gevent
 import gevent.event
 import time
@@ -30,9 +33,14 @@ CHANNELS_VALUE = dict()
 CHANNELS_CBK = dict()
 BUS = dict()
 
-class ValueQuery(object):
-    def __init__(self):
-        pass
+#: number of redis channels the logical channels are multiplexed on
+#: (i.e: max. number of redis subscriptions of a process)
+NB_BUS_CHANNELS = 16
+BUS_CHANNEL_PREFIX = '__channels__:'
+#: time after which the channels not answered by an initial values query
+#: take their default value (the listeners of a bus channel don't
+#: necessarily know the queried channels)
+QUERY_TIMEOUT = 2.
 
 class NotInitialized(object):
     def __repr__(self):
@@ -44,6 +52,163 @@ class NotInitialized(object):
 
 _ChannelValue = namedtuple("_ChannelValue",['timestamp','value'])
 
+def bus_channel(name):
+    """Return the redis channel the channel **name** is multiplexed on"""
+    return '%s%d' % (BUS_CHANNEL_PREFIX,
+                     (zlib.crc32(name) & 0xffffffff) % NB_BUS_CHANNELS)
+
+# Bus messages:
+#   kind (1 byte) 'V' for values, 'Q' for an initial values query
+#   query id (short string), the query a values message answers (if any)
+#   number of entries (uint32) followed by the entries:
+#     'Q': channel name (short string)
+#     'V': channel name (short string), timestamp (double), value
+# Values are a type tag followed by the value; python objects with no
+# tag are pickled.
+VALUES_MESSAGE = 'V'
+QUERY_MESSAGE = 'Q'
+
+_HEADER = struct.Struct('!cH')
+_SHORT_STRING = struct.Struct('!H')
+_COUNT = struct.Struct('!I')
+_TIMESTAMP = struct.Struct('!d')
+_INT = struct.Struct('!q')
+_FLOAT = struct.Struct('!d')
+_LENGTH = struct.Struct('!I')
+_INT_RANGE = (-2**63, 2**63 - 1)
+
+def _encode_value(value):
+    value_type = type(value)
+    if value is None:
+        return 'N'
+    elif value_type is bool:
+        return 'T' if value else 'F'
+    elif value_type in (int, long) and \
+         _INT_RANGE[0] <= value <= _INT_RANGE[1]:
+        return 'q' + _INT.pack(value)
+    elif value_type is float:
+        return 'd' + _FLOAT.pack(value)
+    elif value_type is str:
+        return 's' + _LENGTH.pack(len(value)) + value
+    elif value_type is unicode:
+        value = value.encode('utf-8')
+        return 'u' + _LENGTH.pack(len(value)) + value
+    value = cPickle.dumps(value, protocol=-1)
+    return 'p' + _LENGTH.pack(len(value)) + value
+
+def _decode_value(data, offset):
+    tag = data[offset]
+    offset += 1
+    if tag == 'N':
+        return None, offset
+    elif tag == 'T':
+        return True, offset
+    elif tag == 'F':
+        return False, offset
+    elif tag == 'q':
+        return _INT.unpack_from(data, offset)[0], offset + _INT.size
+    elif tag == 'd':
+        return _FLOAT.unpack_from(data, offset)[0], offset + _FLOAT.size
+    length, = _LENGTH.unpack_from(data, offset)
+    offset += _LENGTH.size
+    value = data[offset:offset + length]
+    offset += length
+    if tag == 'u':
+        value = value.decode('utf-8')
+    elif tag == 'p':
+        value = cPickle.loads(value)
+    elif tag != 's':
+        raise ValueError("Channel: unknown value type %r" % tag)
+    return value, offset
+
+_FIXED_SIZES = {'N': 0, 'T': 0, 'F': 0, 'q': _INT.size, 'd': _FLOAT.size}
+
+def _value_end(data, offset):
+    """Return the offset following the value at **offset**, not decoding it"""
+    size = _FIXED_SIZES.get(data[offset])
+    if size is not None:
+        return offset + 1 + size
+    length, = _LENGTH.unpack_from(data, offset + 1)
+    return offset + 1 + _LENGTH.size + length
+
+def _pack_short_string(value):
+    return _SHORT_STRING.pack(len(value)) + value
+
+def _unpack_short_string(data, offset):
+    length, = _SHORT_STRING.unpack_from(data, offset)
+    offset += _SHORT_STRING.size
+    return data[offset:offset + length], offset + length
+
+def encode_values(channel_values, query_id=''):
+    """
+    Encode a values message
+
+    Args:
+        channel_values (list): (name, _ChannelValue) pairs
+        query_id (str): the query this message answers
+    """
+    entries = list()
+    for name, channel_value in channel_values:
+        try:
+            value = _encode_value(channel_value.value)
+        except cPickle.PicklingError:
+            exctype,value,traceback = sys.exc_info()
+            message = "Can't pickle in channel <%s> %r with values <%r> " % \
+                      (name,type(channel_value.value),channel_value.value)
+            sys.excepthook(exctype,message,traceback)
+            continue
+        entries.append(_pack_short_string(name))
+        entries.append(_TIMESTAMP.pack(channel_value.timestamp))
+        entries.append(value)
+    return ''.join([VALUES_MESSAGE, _pack_short_string(query_id),
+                    _COUNT.pack(len(entries) // 3)] + entries)
+
+def encode_query(query_id, names):
+    """Encode an initial values query of the channels **names**"""
+    return ''.join([QUERY_MESSAGE, _pack_short_string(query_id),
+                    _COUNT.pack(len(names))] +
+                   [_pack_short_string(name) for name in names])
+
+def decode_message(data, names=None):
+    """
+    Decode a bus message
+
+    Args:
+        names: if given, the values of the other channels are skipped
+               without being decoded; a value which can't be decoded is
+               reported and skipped
+    Returns:
+        (kind, query id, entries): entries are (name, _ChannelValue)
+        pairs for a values message, names for a query
+    """
+    kind = data[0]
+    query_id, offset = _unpack_short_string(data, 1)
+    count, = _COUNT.unpack_from(data, offset)
+    offset += _COUNT.size
+    entries = list()
+    for i in xrange(count):
+        name, offset = _unpack_short_string(data, offset)
+        if kind == QUERY_MESSAGE:
+            entries.append(name)
+            continue
+        timestamp, = _TIMESTAMP.unpack_from(data, offset)
+        value_offset = offset + _TIMESTAMP.size
+        offset = _value_end(data, value_offset)
+        if names is not None:
+            if name not in names:
+                continue # another channel on the same bus channel
+            try:
+                value, _ = _decode_value(data, value_offset)
+            except Exception:
+                exctype,value,traceback = sys.exc_info()
+                message = "Can't decode value of channel <%s>: %s" % (name,value)
+                sys.excepthook(exctype,message,traceback)
+                continue
+        else:
+            value, _ = _decode_value(data, value_offset)
+        entries.append((name, _ChannelValue(timestamp, value)))
+    return kind, query_id, entries
+
 class _Bus(object):
     class WaitEvent(object):
         def __init__(self,bus,name) :
@@ -73,10 +238,13 @@ class _Bus(object):
     def __init__(self, redis):
         self._redis = redis
         self._pubsub = redis.pubsub()
-        self._pending_subscribe = list()
-        self._pending_unsubscribe = list()
+        self._id = '%s:%d:%x' % (socket.gethostname(), os.getpid(), id(self))
+        self._query_nb = 0
+        self._bus_channels = dict()
         self._pending_channel_value = OrderedDict()
         self._pending_init = list()
+        self._pending_replies = list()
+        self._queries = dict()
         self._send_event = gevent.event.Event()
         self._in_recv = set()
         self._wait_event = dict()
@@ -86,20 +254,24 @@ class _Bus(object):
 
     def subscribe(self,names):
         if isinstance(names,str):
-            self._pending_subscribe.append(names)
-        else:
-            self._pending_subscribe.extend(names)
+            names = [names]
+        for name in names:
+            self._bus_channels.setdefault(bus_channel(name),set()).add(name)
         self._send_event.set()
 
+    def is_subscribed(self,name):
+        return bus_channel(name) in self._pubsub.channels
+
     def get_init_value(self,name,default_value):
         self._pending_init.append((name,default_value))
         self._send_event.set()
 
     def unsubscribe(self,names):
         if isinstance(names,str):
-            self._pending_unsubscribe.append(names)
-        else:
-            self._pending_unsubscribe.extend(names)
+            names = [names]
+        for name in names:
+            channel_names = self._bus_channels.get(bus_channel(name),set())
+            channel_names.discard(name)
         self._send_event.set()
 
     def wait_event_on(self,name):
@@ -143,81 +315,147 @@ class _Bus(object):
                 deleted_cb.add(cb_ref)
         CHANNELS_CBK.get('name',set()).difference_update(deleted_cb)
 
+    def _set_wait_events(self,names):
+        for name in names:
+            for waiting_event in self._wait_event.get(name,set()):
+                waiting_event.set()
+
+    def _set_default_values(self,defaults,timestamp=None):
+        if timestamp is None:
+            timestamp = time.time()
+        for name,default_value in defaults.iteritems():
+            if name in CHANNELS and name not in CHANNELS_VALUE:
+                CHANNELS_VALUE[name] = _ChannelValue(timestamp,default_value)
+        self._set_wait_events(defaults)
+
     def _send(self):
         while(1):
             self._send_event.wait()
             self._send_event.clear()
  
             #local transfer
-            pending_subscribe = self._pending_subscribe
-            pending_unsubscribe = self._pending_unsubscribe
             pending_channel_value = self._pending_channel_value
             pending_init = self._pending_init
+            pending_replies = self._pending_replies
             pubsub = self._pubsub
 
-            self._pending_subscribe = list()
-            self._pending_unsubscribe = list()
             self._pending_channel_value = OrderedDict()
             self._pending_init = list()
-
-            if pending_unsubscribe: pubsub.unsubscribe(pending_unsubscribe)
-
-            no_listener_4_values = set()
-            if pending_subscribe:
-                result = self._redis.execute_command('pubsub','numsub',*pending_subscribe)
-                no_listener_4_values = set((name for name,nb_listener in grouped(result,2) if int(nb_listener) == 0))
-                pubsub.subscribe(pending_subscribe)
-                for channel_name in pending_subscribe:
-                    for waiting_event in self._wait_event.get(channel_name,set()):
-                        waiting_event.set()
+            self._pending_replies = list()
+
+            # initial values are queried once per bus channel,
+            # for all the channels created since the last loop
+            init_by_bus_channel = OrderedDict()
+            for name,default_value in pending_init:
+                if name in CHANNELS_VALUE:
+                    # we got an update
+                    continue
+                defaults = init_by_bus_channel.setdefault(bus_channel(name),
+                                                          OrderedDict())
+                defaults[name] = default_value
+
+            nb_listeners = dict()
+            if init_by_bus_channel:
+                query_channels = init_by_bus_channel.keys()
+                result = self._redis.execute_command('pubsub','numsub',
+                                                     *query_channels)
+                for channel,nb_listener in grouped(result,2):
+                    nb_listener = int(nb_listener)
+                    if channel in pubsub.channels:
+                        nb_listener -= 1 # ourself
+                    nb_listeners[channel] = nb_listener
+
+            unsubscribe = [channel for channel in pubsub.channels
+                           if not self._bus_channels.get(channel)]
+            subscribe = [channel for channel,names in self._bus_channels.iteritems()
+                         if names and channel not in pubsub.channels]
+            for channel in unsubscribe:
+                self._bus_channels.pop(channel,None)
+            if unsubscribe: pubsub.unsubscribe(unsubscribe)
+            if subscribe:
+                pubsub.subscribe(subscribe)
+                for channel in subscribe:
+                    self._set_wait_events(self._bus_channels[channel])
 
                 if self._listen_task is None:
                     self._listen_task = gevent.spawn(self._listen)
 
-            if pending_channel_value:
-                pipeline = self._redis.pipeline()
-                for name,channel_value in pending_channel_value.iteritems():
-                    try:
-                        pipeline.publish(name,cPickle.dumps(channel_value,protocol=-1))
-                    except cPickle.PicklingError:
-                        exctype,value,traceback = sys.exc_info()
-                        message = "Can't pickle in channel <%s> %r with values <%r> " % \
-                        (name,type(channel_value.value),channel_value.value)
-                        sys.excepthook(exctype,message,traceback)
-                pipeline.execute()
-
-            if pending_init:
-                pipeline = self._redis.pipeline()
-                for name,default_value in pending_init:
-                    if name in CHANNELS_VALUE:
-                        # we got an update
-                        continue
-                    if name not in no_listener_4_values:
-                        pipeline.publish(name,cPickle.dumps(ValueQuery(),protocol=-1))
-                    else: # we are alone
-                        CHANNELS_VALUE[name] = _ChannelValue(time.time(),default_value)
-                        for waiting_event in self._wait_event.get(name,set()):
-                            waiting_event.set()
-                pipeline.execute()
+            pipeline = self._redis.pipeline()
+            values_by_bus_channel = OrderedDict()
+            for name,channel_value in pending_channel_value.iteritems():
+                values_by_bus_channel.setdefault(bus_channel(name),
+                                                 list()).append((name,channel_value))
+            for channel,channel_values in values_by_bus_channel.iteritems():
+                pipeline.publish(channel,encode_values(channel_values))
+
+            for channel,query_id,channel_values in pending_replies:
+                pipeline.publish(channel,encode_values(channel_values,query_id))
+
+            for channel,defaults in init_by_bus_channel.iteritems():
+                nb_listener = nb_listeners.get(channel,0)
+                if nb_listener <= 0: # we are alone
+                    self._set_default_values(defaults)
+                    continue
+                self._query_nb += 1
+                query_id = '%s:%d' % (self._id,self._query_nb)
+                self._queries[query_id] = [nb_listener,defaults]
+                gevent.spawn_later(QUERY_TIMEOUT,self._query_timeout,query_id)
+                pipeline.publish(channel,encode_query(query_id,defaults.keys()))
+            pipeline.execute()
+
+    def _reply(self,channel,query_id,names):
+        channel_values = [(name,CHANNELS_VALUE[name]) for name in names
+                          if name in CHANNELS and name in CHANNELS_VALUE]
+        # always reply, the querier counts the answers
+        self._pending_replies.append((channel,query_id,channel_values))
+        self._send_event.set()
+
+    def _end_query(self,query_id):
+        query = self._queries.get(query_id)
+        if query is None:       # not ours
+            return
+        query[0] -= 1
+        if query[0] <= 0:
+            # no one else knows the remaining channels
+            del self._queries[query_id]
+            self._set_default_values(query[1])
+
+    def _query_timeout(self,query_id):
+        query = self._queries.pop(query_id,None)
+        if query is not None:
+            # a late answer still overwrites these values
+            self._set_default_values(query[1],timestamp=0)
 
     def _listen(self):
         for event in self._pubsub.listen():
             event_type = event.get('type')
             if event_type == 'message':
-                value = cPickle.loads(event.get('data'))
-                channel_name = event.get('channel')
-                if isinstance(value,ValueQuery):
-                    channel_value = CHANNELS_VALUE.get(channel_name)
-                    if channel_value is not None:
-                        self._pending_channel_value[channel_name] = channel_value
-                        self._send_event.set()
-                else:
+                channel = event.get('channel')
+                try:
+                    kind,query_id,entries = decode_message(event.get('data'),
+                                                           CHANNELS)
+                except Exception:
+                    # display exception, but keep listening
+                    exctype,value,traceback = sys.exc_info()
+                    message = "Can't decode message of bus channel <%s>: %s" % \
+                              (channel,value)
+                    sys.excepthook(exctype,message,traceback)
+                    continue
+                if kind == QUERY_MESSAGE:
+                    if not query_id.startswith(self._id + ':'):
+                        self._reply(channel,query_id,entries)
+                    continue
+
+                for channel_name,value in entries:
                     self._in_recv.add(channel_name)
-                    self.update_channel(channel_name,value)
-                    self._in_recv.remove(channel_name)
+                    try:
+                        self.update_channel(channel_name,value)
+                    finally:
+                        self._in_recv.remove(channel_name)
+                    self._set_wait_events((channel_name,))
 
-                    for waiting_event in self._wait_event.get(channel_name,set()):
-                        waiting_event.set()
+                if query_id:
+                    self._end_query(query_id)
 
         self._listen_task = None
 
@@ -262,9 +500,9 @@ class _Channel(object):
                     with self._bus.wait_event_on(self.__name) as we:
                         we.wait()
                         value = CHANNELS_VALUE.get(self.__name)
-        elif self.__name not in self._bus._pubsub.channels: # not subscribed yet
+        elif not self._bus.is_subscribed(self.__name): # not subscribed yet
             with gevent.Timeout(self.__timeout, RuntimeError("%s: timeout to subscribe to channel" % self.__name)):
-                while self.__name not in self._bus._pubsub.channels:
+                while not self._bus.is_subscribed(self.__name):
                     with self._bus.wait_event_on(self.__name) as we:
                         we.wait()
         return value.value
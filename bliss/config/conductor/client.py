@@ -6,9 +6,11 @@
 # Distributed under the GNU LGPLv3. See LICENSE for more info.
 
 import os
+import errno
+import cPickle
 import StringIO
 from . import connection
-from .connection import StolenLockException
+from .connection import StolenLockException, UnknownMessageException
 
 _default_connection = None
 
@@ -73,6 +75,15 @@ def unlock(*devices,**params):
     params["connection"].unlock(devices_name,**params)
 
 
+@check_connection
+def get_lock_metrics(connection=None):
+    """
+    Lock manager statistics of the beacon server: number of granted,
+    contended (which had to wait) and stolen lock requests, wait times
+    (seconds), locked objects and waiting requests
+    """
+    return connection.get_lock_metrics()
+
 @check_connection
 def get_cache_address(connection=None):
     return connection.get_redis_connection_address()
@@ -136,11 +147,114 @@ def _open_file(file_path,local) :
     else:
         return _StringIO(file_content)
 
+class ConfigDbCache(object):
+    """
+    Local copy of the configuration files of the beacon servers, so only
+    the files which changed are transferred.
+
+    It is persisted in a local file (BLISS_CONFIG_DB_CACHE environment
+    variable, default: ~/.cache/bliss/config_db_cache.pickle, empty to
+    keep it in memory only).
+    """
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.environ.get('BLISS_CONFIG_DB_CACHE',
+                                      os.path.join(os.path.expanduser('~'),
+                                                   '.cache', 'bliss',
+                                                   'config_db_cache.pickle'))
+        self._filename = filename
+        self._servers = None
+        self._modified = False
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        self._servers = dict()
+        if not self._filename:
+            return
+        try:
+            with open(self._filename, 'rb') as f:
+                servers = cPickle.load(f)
+        except Exception:
+            # no cache or not readable
+            return
+        if isinstance(servers, dict):
+            self._servers = servers
+
+    def get_files(self, connection, base_path='', timeout=3.):
+        """
+        Return the [(file path, file content),...] under **base_path**,
+        downloading only the files which are not up to date in the cache
+        """
+        return [(path, content) for path, file_hash, content in
+                self.get_files_with_hashes(connection, base_path, timeout)]
+
+    def get_files_with_hashes(self, connection, base_path='', timeout=3.):
+        """
+        Return the [(file path, sha1, file content),...] under **base_path**,
+        downloading only the files which are not up to date in the cache
+        """
+        if self._servers is None:
+            self._load()
+        connection.connect()
+        files = self._servers.setdefault((connection._host, connection._port),
+                                         dict())
+        prefix = base_path.strip('/')
+        known_hashes = dict((path, file_hash)
+                            for path, (file_hash, content) in files.iteritems()
+                            if not prefix or path.startswith(prefix + '/'))
+        archive = connection.get_config_db_archive(base_path, known_hashes,
+                                                   timeout=timeout)
+        path2files = []
+        for path, file_hash, content in archive:
+            if content is None:
+                self.hits += 1
+                content = files[path][1]
+            else:
+                self.misses += 1
+                files[path] = file_hash, content
+                self._modified = True
+            known_hashes.pop(path, None)
+            path2files.append((path, file_hash, content))
+        # removed files
+        for path in known_hashes:
+            del files[path]
+            self._modified = True
+        return path2files
+
+    def save(self):
+        if not self._modified or not self._filename:
+            return
+        self._modified = False
+        try:
+            os.makedirs(os.path.dirname(self._filename))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                return
+        tmp_filename = '%s.%d' % (self._filename, os.getpid())
+        try:
+            with open(tmp_filename, 'wb') as f:
+                cPickle.dump(self._servers, f, protocol=-1)
+            os.rename(tmp_filename, self._filename)
+        except Exception:
+            # the cache is only an optimization
+            try:
+                os.unlink(tmp_filename)
+            except OSError:
+                pass
+
+CONFIG_DB_CACHE = ConfigDbCache()
+
 @check_connection
 def get_config_db_files(base_path='', timeout=3., connection=None):
     """
        Gives a sequence of pairs: (file name<str>, file content<str>)
 
+       Only the files which changed since the previous call (of this
+       process or of a previous one, see :class:`ConfigDbCache`) are
+       transferred, in one compressed message.
+
        :param base_path:
            base path to start looking for db files [default '', meaning use
 
@@ -152,7 +266,26 @@ def get_config_db_files(base_path='', timeout=3., connection=None):
        :return:
            a sequence of pairs: (file name<str>, file content<str>)
     """
-    path2files = connection.get_config_db(base_path=base_path,timeout=timeout)
+    return [(path, content) for path, file_hash, content in
+            get_config_db_files_with_hashes(base_path, timeout, connection)]
+
+@check_connection
+def get_config_db_files_with_hashes(base_path='', timeout=3., connection=None):
+    """
+       Gives a sequence of triplets:
+       (file name<str>, sha1<str>, file content<str>)
+
+       The sha1 is the one computed by the beacon server, or None if the
+       server doesn't transfer archives. See :func:`get_config_db_files`.
+    """
+    try:
+        path2files = CONFIG_DB_CACHE.get_files_with_hashes(connection,
+                                                           base_path, timeout)
+    except UnknownMessageException:
+        # beacon server without archive transfer
+        return [(path, None, content) for path, content in
+                connection.get_config_db(base_path=base_path,timeout=timeout)]
+    CONFIG_DB_CACHE.save()
     return path2files
 
 @check_connection
@@ -7,6 +7,8 @@
 
 import weakref
 import os,sys
+import json
+import zlib
 import gevent
 from gevent import socket,select,event,queue
 from . import protocol
@@ -16,6 +18,9 @@ import netifaces
 class StolenLockException(RuntimeError):
     '''This exception is raise in case of a stolen lock'''
 
+class UnknownMessageException(RuntimeError):
+    '''This exception is raise when the server doesn't know a command'''
+
 try:
     import posix_ipc
     class _PosixQueue(posix_ipc.MessageQueue):
@@ -247,6 +252,16 @@ class Connection(object):
         if max_lock <= 0:
             self._greenlet_to_lockobjects.pop(gevent.getcurrent(),None)
 
+    @check_connect
+    def get_lock_metrics(self,timeout=1.):
+        with gevent.Timeout(timeout,RuntimeError("Can't get lock metrics")):
+            with self.WaitingQueue(self) as wq:
+                self._fd.sendall(protocol.message(protocol.LOCK_METRICS,wq.message_key()))
+                value = wq.get()
+                if isinstance(value,RuntimeError):
+                    raise value
+                return json.loads(value)
+
     @check_connect
     def get_redis_connection_address(self):
         if self._redis_host is None:
@@ -328,6 +343,24 @@ class Connection(object):
                     return_files.append((file_path,file_value.decode("utf-8")))
         return return_files
 
+    @check_connect
+    def get_config_db_archive(self,base_path='',known_hashes=None,timeout = 30.):
+        """
+        Returns the [(file path, sha1, content),...] of the files under
+        *base_path*, in one compressed message. The content of the files
+        of *known_hashes* ({file path: sha1}) which didn't change is None.
+        """
+        with gevent.Timeout(timeout,RuntimeError("Can't get configuration archive")):
+            with self.WaitingQueue(self) as wq:
+                hashes = zlib.compress(json.dumps(known_hashes or {}))
+                msg = '%s|%s|%s' % (wq.message_key(),base_path,hashes)
+                self._fd.sendall(protocol.message(protocol.CONFIG_GET_DB_ARCHIVE,msg))
+                value = wq.get()
+                if isinstance(value,RuntimeError):
+                    raise value
+        return [(file_path.encode('utf-8'),file_hash,content)
+                for file_path,file_hash,content in json.loads(zlib.decompress(value))]
+
     @check_connect
     def set_config_db_file(self,file_path,content,timeout = 3.):
         with gevent.Timeout(timeout,RuntimeError("Can't set config file")):
@@ -387,23 +420,21 @@ class Connection(object):
 
     def _raw_read(self):
         try:
-            data = ''
+            decoder = protocol.MessageDecoder()
             mq_pipe = None
             while(1):
                 raw_data = self._fd.recv(16 * 1024)
                 if not raw_data: break
-                data = '%s%s' % (data,raw_data)
-                while data:
-                    try:
-                        messageType,message,data = protocol.unpack_message(data)
-                    except protocol.IncompleteMessage:
-                        break
+                decoder.feed(raw_data)
+                for messageType,message in decoder:
                     try:
                         #print 'rx',messageType
                         if self._lock_mgt(self._fd,messageType,message):
                             continue
                         elif messageType in (protocol.CONFIG_GET_FILE_OK,
                                              protocol.CONFIG_GET_DB_TREE_OK,
+                                             protocol.CONFIG_GET_DB_ARCHIVE_OK,
+                                             protocol.LOCK_METRICS_REPLY,
                                              protocol.CONFIG_DB_FILE_RX,
                                              protocol.CONFIG_GET_PYTHON_MODULE_RX):
                             message_key,value = self._get_msg_key(message)
@@ -411,6 +442,7 @@ class Connection(object):
                             if queue is not None: queue.put(value)
                         elif messageType in (protocol.CONFIG_GET_FILE_FAILED,
                                              protocol.CONFIG_DB_FAILED,
+                                             protocol.CONFIG_GET_DB_ARCHIVE_FAILED,
                                              protocol.CONFIG_SET_DB_FILE_FAILED,
                                              protocol.CONFIG_GET_DB_TREE_FAILED,
                                              protocol.CONFIG_REMOVE_FILE_FAILED,
@@ -441,7 +473,7 @@ class Connection(object):
                         elif messageType == protocol.UNKNOW_MESSAGE:
                             message_key,value = self._get_msg_key(message)
                             queue = self._message_queue.get(message_key)
-                            error = RuntimeError("Beacon server don't know this command (%s)" % value)
+                            error = UnknownMessageException("Beacon server don't know this command (%s)" % value)
                             if queue is not None: queue.put(error)
                     except:
                         sys.excepthook(*sys.exc_info())
@@ -459,7 +491,7 @@ class Connection(object):
 
     def _mq_read(self,queue,pipe):
         try:
-            data = ''
+            decoder = protocol.MessageDecoder()
             stopFlag = False
             while not stopFlag:
                 r,_,_ = select.select([queue.mqd,pipe],[],[])
@@ -468,13 +500,9 @@ class Connection(object):
                         stopFlag = True
                         break
                     else:
-                        data = '%s%s' % (data,queue.receive()[0])
-                        while data:
-                            try:
-                                messageType,message,data = protocol.unpack_message(data)
-                                self._lock_mgt(queue,messageType,message)
-                            except protocol.IncompleteMessage:
-                                pass
+                        decoder.feed(queue.receive()[0])
+                        for messageType,message in decoder:
+                            self._lock_mgt(queue,messageType,message)
         except:
             sys.excepthook(*sys.exc_info())
         finally:
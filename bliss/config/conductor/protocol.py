@@ -18,6 +18,8 @@ CONFIG = 1
 
 (LOCK,UNLOCK,LOCK_OK_REPLY,LOCK_RETRY,LOCK_STOLEN,LOCK_STOLEN_OK_REPLY) = (20,21,22,23,24,25)
 
+(LOCK_METRICS,LOCK_METRICS_REPLY) = (26,27)
+
 (REDIS_QUERY,REDIS_QUERY_ANSWER) = (30,31)
 
 (POSIX_MQ_QUERY,POSIX_MQ_OK,POSIX_MQ_FAILED,POSIX_MQ_OPENED) = (40,41,42,43)
@@ -26,6 +28,8 @@ CONFIG = 1
 
 (CONFIG_GET_DB_BASE_PATH,CONFIG_DB_FILE_RX,CONFIG_DB_END, CONFIG_DB_FAILED) = (60,61,62,63)
 
+(CONFIG_GET_DB_ARCHIVE,CONFIG_GET_DB_ARCHIVE_FAILED,CONFIG_GET_DB_ARCHIVE_OK) = (64,65,66)
+
 (CONFIG_SET_DB_FILE,CONFIG_SET_DB_FILE_FAILED,CONFIG_SET_DB_FILE_OK) = (70,71,72)
 
 (CONFIG_REMOVE_FILE, CONFIG_REMOVE_FILE_FAILED, CONFIG_REMOVE_FILE_OK) = (80,81,82)
@@ -56,3 +60,56 @@ def unpack_message(s):
     message = s[HEADER_SIZE:HEADER_SIZE+messageLen]
     remaining = s[HEADER_SIZE+messageLen:]
     return messageType, message, remaining
+
+class MessageDecoder(object):
+    """
+    Streaming decoder of the messages received on a connection
+
+    Received data is appended to a bytearray and messages are decoded in
+    place from a read offset: each byte is copied once in the buffer and
+    once in its message, whatever the number of messages per read.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offset = 0
+
+    def __len__(self):
+        """number of received bytes not decoded yet"""
+        return len(self._buffer) - self._offset
+
+    def feed(self, data):
+        if self._offset:
+            # drop the decoded messages, at most a partial message remains
+            del self._buffer[:self._offset]
+            self._offset = 0
+        self._buffer.extend(data)
+
+    def next_message(self):
+        """
+        Returns the (messageType, message) of the next complete message,
+        raises IncompleteMessage if more data is needed
+        """
+        offset = self._offset
+        if len(self._buffer) - offset < HEADER_SIZE:
+            raise IncompleteMessage
+        messageType, messageLen = struct.unpack_from('<ii', self._buffer, offset)
+        start = offset + HEADER_SIZE
+        end = start + messageLen
+        if len(self._buffer) < end:
+            raise IncompleteMessage
+        message = memoryview(self._buffer)[start:end].tobytes()
+        self._offset = end
+        return messageType, message
+
+    def __iter__(self):
+        """Iterates over the complete messages"""
+        while True:
+            try:
+                yield self.next_message()
+            except IncompleteMessage:
+                return
+
+    def clear(self):
+        del self._buffer[:]
+        self._offset = 0
@@ -10,16 +10,22 @@
 
 import os
 import sys
+import time
+import json
+import zlib
 import codecs
+import hashlib
 import shutil
 import logging
 import argparse
-import weakref
 import subprocess
 import socket
 import signal
 import traceback
 import pkgutil
+import bisect
+import itertools
+import collections
 import gevent
 from gevent import select
 
@@ -58,13 +64,17 @@ else:
             for i in xrange(0, len(msg), max_message_size):
                 self._wqueue.send(msg[i:i+max_message_size])
 
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
 # Globals
 
 _waitstolen = dict()
 _options = None
-_lock_object = {}
-_client_to_object = weakref.WeakKeyDictionary()
-_waiting_lock = weakref.WeakKeyDictionary()
+_config_store = None
+_lock_manager = None
 _log = logging.getLogger('beacon')
 _tlog = _log.getChild('tango')
 _rlog = _log.getChild('redis')
@@ -107,98 +117,280 @@ class _WaitStolenReply(object):
 
 # Methods
 
-def _releaseAllLock(client_id):
-#    print '_releaseAllLock',client_id
-    objset = _client_to_object.pop(client_id,set())
-    for obj in objset:
-#        print 'release',obj
-        _lock_object.pop(obj)
-    #Inform waiting client
-    tmp_dict = dict(_waiting_lock)
-    for client_sock,tlo in tmp_dict.iteritems():
-        try_lock_object = set(tlo)
-        if try_lock_object.intersection(objset):
-            objs = _waiting_lock.pop(client_sock)
-            client_sock.sendall(protocol.message(protocol.LOCK_RETRY))
-
-def _lock(client_id,prio,lock_obj,raw_message) :
-#    print '_lock_object',_lock_object
-#    print
-    all_free = True
-    for obj in lock_obj:
-        socket_id,compteur,lock_prio = _lock_object.get(obj,(None,None,None))
-        if socket_id and socket_id != client_id:
-            if prio > lock_prio : continue
-            all_free = False
-            break
-
-    if all_free:
-        stolen_lock = {}
-        for obj in lock_obj:
-            socket_id,compteur,lock_prio = _lock_object.get(obj,(client_id,0,prio))
-            if socket_id != client_id: # still lock
-                pre_obj = stolen_lock.get(socket_id,None)
-                if pre_obj is None:
-                    stolen_lock[socket_id] = [obj]
-                else:
-                    pre_obj.append(obj)
-                _lock_object[obj] = (client_id,1,prio)
-                objset = _client_to_object.get(socket_id,set())
-                objset.remove(obj)
-            else:
-                compteur += 1
-                new_prio = lock_prio > prio and lock_prio or prio
-                _lock_object[obj] = (client_id,compteur,new_prio)
-
-        try:
-            with _WaitStolenReply(stolen_lock) as w:
-                w.wait(3.)
-        except RuntimeError:
-            _log.warning("some client(s) didn't reply to the stolen lock")
+class _LockRequest(object):
+    __slots__ = ('client_id', 'prio', 'objects', 'raw_message', 'key',
+                 'start_time')
 
-        obj_already_locked = _client_to_object.get(client_id,set())
-        _client_to_object[client_id] = set(lock_obj).union(obj_already_locked)
-
-        client_id.sendall(protocol.message(protocol.LOCK_OK_REPLY,raw_message))
-    else:
-        _waiting_lock[client_id] = lock_obj
+    def __init__(self, client_id, prio, objects, raw_message, seq):
+        self.client_id = client_id
+        self.prio = prio
+        self.objects = list(collections.OrderedDict.fromkeys(objects))
+        self.raw_message = raw_message
+        # waiting requests are served by priority, then in arrival order
+        self.key = (-prio, seq)
+        self.start_time = time.time()
 
-#    print '_lock_object',_lock_object
 
-def _unlock(client_id,priority,unlock_obj) :
-    unlock_object = []
-    client_locked_obj = _client_to_object.get(client_id,None)
-    if client_locked_obj is None:
-        return
+class _LockManager(object):
+    """
+    Lock table of the clients
+
+    Each locked object has an owner (client, lock count, priority) and a
+    queue of the requests waiting for it. When objects are released, the
+    requests at the head of their queues are granted and their clients
+    get LOCK_OK_REPLY directly, instead of all the waiting clients being
+    told to retry. A request of higher priority than the owner steals the
+    lock, a client can lock again the objects it owns.
+    """
 
-    for obj in unlock_obj:
-        socket_id,compteur,prio = _lock_object.get(obj,(None,None,None))
-#        print socket_id,compteur,prio,obj
-        if socket_id and socket_id == client_id:
-            compteur -= 1
-            if compteur <= 0:
-                _lock_object.pop(obj)
-                try:
-                    client_locked_obj.remove(obj)
-                    _lock_object.pop(obj)
-                except KeyError:
-                    pass
-                unlock_object.append(obj)
+    def __init__(self):
+        self._owners = dict()           # object -> [client_id, count, prio]
+        self._client_objects = dict()   # client_id -> set of locked objects
+        self._queues = dict()           # object -> [(key, request), ...]
+        self._client_requests = dict()  # client_id -> [request, ...]
+        self._seq = itertools.count()
+        self.reset_metrics()
+
+    def reset_metrics(self):
+        self._metrics = dict(granted=0, contended=0, stolen=0,
+                             total_wait_time=0., max_wait_time=0.)
+
+    def metrics(self):
+        metrics = dict(self._metrics)
+        granted = metrics['granted']
+        metrics['mean_wait_time'] = \
+            metrics['total_wait_time'] / granted if granted else 0.
+        metrics['locked_objects'] = len(self._owners)
+        metrics['waiting_requests'] = \
+            sum(len(requests) for requests in self._client_requests.itervalues())
+        metrics['max_queue_length'] = \
+            max([len(queue) for queue in self._queues.itervalues()] or [0])
+        return metrics
+
+    def lock(self, client_id, prio, objects, raw_message):
+        request = _LockRequest(client_id, prio, objects, raw_message,
+                               next(self._seq))
+        for obj in request.objects:
+            bisect.insort(self._queues.setdefault(obj, []),
+                          (request.key, request))
+        self._client_requests.setdefault(client_id, []).append(request)
+        if self._blocked(request):
+            self._metrics['contended'] += 1
+        else:
+            self._grant(request)
+
+    def unlock(self, client_id, prio, objects):
+        released = []
+        for obj in objects:
+            owner = self._owners.get(obj)
+            if owner is None or owner[0] != client_id:
+                continue
+            owner[1] -= 1
+            if owner[1] <= 0:
+                del self._owners[obj]
+                self._client_objects[client_id].discard(obj)
+                released.append(obj)
+        self._handoff(released)
+
+    def release_all(self, client_id):
+        released = set()
+        for request in list(self._client_requests.get(client_id, ())):
+            self._dequeue(request)
+            released.update(request.objects)
+        for obj in self._client_objects.pop(client_id, ()):
+            owner = self._owners.get(obj)
+            if owner is not None and owner[0] == client_id:
+                del self._owners[obj]
+                released.add(obj)
+        self._handoff(released)
+
+    def _blocked(self, request):
+        for obj in request.objects:
+            owner = self._owners.get(obj)
+            if owner is not None and owner[0] == request.client_id:
+                continue
+            if self._queues[obj][0][1] is not request:
+                return True
+            if owner is not None and request.prio <= owner[2]:
+                return True
+        return False
+
+    def _dequeue(self, request):
+        for obj in request.objects:
+            queue = self._queues[obj]
+            queue.remove((request.key, request))
+            if not queue:
+                del self._queues[obj]
+        requests = self._client_requests[request.client_id]
+        requests.remove(request)
+        if not requests:
+            del self._client_requests[request.client_id]
+
+    def _grant(self, request):
+        self._dequeue(request)
+        client_id, prio = request.client_id, request.prio
+        stolen_lock = {}
+        for obj in request.objects:
+            owner = self._owners.get(obj)
+            if owner is None:
+                self._owners[obj] = [client_id, 1, prio]
+            elif owner[0] == client_id:
+                owner[1] += 1
+                owner[2] = max(owner[2], prio)
             else:
-                _lock_object[obj] = (client_id,compteur,prio)
+                stolen_lock.setdefault(owner[0], []).append(obj)
+                self._client_objects[owner[0]].discard(obj)
+                self._owners[obj] = [client_id, 1, prio]
+        self._client_objects.setdefault(client_id, set()).update(request.objects)
+
+        metrics = self._metrics
+        wait_time = time.time() - request.start_time
+        metrics['granted'] += 1
+        metrics['total_wait_time'] += wait_time
+        metrics['max_wait_time'] = max(metrics['max_wait_time'], wait_time)
+
+        if stolen_lock:
+            metrics['stolen'] += 1
+            try:
+                with _WaitStolenReply(stolen_lock) as w:
+                    w.wait(3.)
+            except RuntimeError:
+                _log.warning("some client(s) didn't reply to the stolen lock")
+        client_id.sendall(protocol.message(protocol.LOCK_OK_REPLY,
+                                           request.raw_message))
+
+    def _handoff(self, objects):
+        pending = set(objects)
+        while pending:
+            queue = self._queues.get(pending.pop())
+            if not queue:
+                continue
+            request = queue[0][1]
+            if self._blocked(request):
+                continue
+            try:
+                self._grant(request)
+            except Exception:
+                # client gone, its locks are released when its connection closes
+                _log.warning('Could not hand over the lock of %s',
+                             request.raw_message, exc_info=True)
+            # the heads of its other queues changed
+            pending.update(request.objects)
+
+def _send_lock_metrics(client_id,message):
+    metrics = _lock_manager.metrics()
+    client_id.sendall(protocol.message(protocol.LOCK_METRICS_REPLY,
+                                       '%s|%s' % (message,json.dumps(metrics))))
 
-    unlock_object = set(unlock_object)
-    tmp_dict = dict(_waiting_lock)
-    for client_sock,tlo in tmp_dict.iteritems():
-        try_lock_object = set(tlo)
-        if try_lock_object.intersection(unlock_object) :
-            objs = _waiting_lock.pop(client_sock)
-            client_sock.sendall(protocol.message(protocol.LOCK_RETRY))
+def _clean(client):
+    _lock_manager.release_all(client)
 
-#    print '_lock_object',_lock_object
+class _ConfigStore(object):
+    """
+    In memory copy of the configuration database
+
+    The yml files are kept with their sha1, indexed by relative path, with
+    the directory tree. Requests are served from the current snapshot,
+    which is replaced by :meth:`refresh` when files changed: on beacon
+    requests modifying files and, for changes made directly on disk, on
+    inotify events (if pyinotify is available) or every *poll_period*
+    seconds. Only the files whose modification time or size changed are
+    read again.
+    """
 
-def _clean(client):
-    _releaseAllLock(client)
+    _ConfigFile = collections.namedtuple('_ConfigFile',
+                                         'content sha1 stat')
+
+    def __init__(self, db_path, poll_period=2.):
+        self.db_path = db_path
+        self.poll_period = poll_period
+        self._files = collections.OrderedDict()
+        self._dirs = dict()
+        self.refresh()
+
+    def refresh(self):
+        files = collections.OrderedDict()
+        dirs = dict()
+        start = len(self.db_path) + 1
+        for root, dir_names, file_names in os.walk(self.db_path):
+            dirs[root[start:]] = list(dir_names), list(file_names)
+            for filename in file_names:
+                if not filename.endswith('.yml'):
+                    continue
+                full_path = os.path.join(root, filename)
+                rel_path = full_path[start:]
+                try:
+                    st = os.stat(full_path)
+                    stat = st.st_mtime, st.st_size
+                    config_file = self._files.get(rel_path)
+                    if config_file is None or config_file.stat != stat:
+                        config_file = self._read(full_path, stat)
+                except (IOError, OSError):
+                    # removed meanwhile
+                    continue
+                files[rel_path] = config_file
+        self._files, self._dirs = files, dirs
+
+    def _read(self, full_path, stat):
+        with open(full_path, 'rb') as f:
+            content = f.read()
+        return self._ConfigFile(content, hashlib.sha1(content).hexdigest(),
+                                stat)
+
+    def get_file(self, file_path):
+        """Returns the content of a yml file, None if not in the store"""
+        config_file = self._files.get(file_path)
+        return None if config_file is None else config_file.content
+
+    def files(self, sub_path=''):
+        """yields the (relative path, content, sha1) of the files under sub_path"""
+        prefix = sub_path.strip('/')
+        for rel_path, config_file in self._files.iteritems():
+            if not prefix or rel_path.startswith(prefix + '/'):
+                yield rel_path, config_file.content, config_file.sha1
+
+    def tree(self, sub_path=''):
+        """
+        Nested dictionaries of the directories under sub_path,
+        files are keys with a None value
+        """
+        dirs = self._dirs
+        def build(rel_dir):
+            dir_names, file_names = dirs[rel_dir]
+            result = dict.fromkeys(file_names)
+            for dir_name in dir_names:
+                child = os.path.join(rel_dir, dir_name) if rel_dir else dir_name
+                if child in dirs:
+                    result[dir_name] = build(child)
+            return result
+        sub_path = sub_path.strip('/')
+        if sub_path not in dirs:
+            raise ValueError("%s: no such directory" % sub_path)
+        return build(sub_path)
+
+    def watch(self):
+        notifier = None
+        if pyinotify is not None:
+            wm = pyinotify.WatchManager()
+            mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE | \
+                   pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM | \
+                   pyinotify.IN_MOVED_TO
+            wm.add_watch(self.db_path, mask, rec=True, auto_add=True)
+            notifier = pyinotify.Notifier(wm, pyinotify.ProcessEvent())
+        while True:
+            if notifier is None:
+                # no inotify: full rescan every poll_period
+                gevent.sleep(self.poll_period)
+            else:
+                select.select([wm.get_fd()],[],[])
+                # gather the events of a whole change (editor save...)
+                gevent.sleep(0.1)
+                notifier.read_events()
+                notifier.process_events()
+            try:
+                self.refresh()
+            except Exception:
+                sys.excepthook(*sys.exc_info())
 
 def _send_redis_info(client_id,local_connection):
     port = _options.redis_port
@@ -218,9 +410,11 @@ def _send_config_file(client_id,message):
     file_path = file_path.replace('../','') # prevent going up
     full_path = os.path.join(_options.db_path,file_path)
     try:
-        with codecs.open(full_path, "r", "utf-8") as f:
-            buffer = f.read().encode('utf-8')
-            client_id.sendall(protocol.message(protocol.CONFIG_GET_FILE_OK,'%s|%s' % (message_key,buffer)))
+        buffer = _config_store.get_file(file_path)
+        if buffer is None:
+            with codecs.open(full_path, "r", "utf-8") as f:
+                buffer = f.read().encode('utf-8')
+        client_id.sendall(protocol.message(protocol.CONFIG_GET_FILE_OK,'%s|%s' % (message_key,buffer)))
     except IOError:
         client_id.sendall(protocol.message(protocol.CONFIG_GET_FILE_FAILED,"%s|File doesn't exist" % (message_key)))
 
@@ -300,6 +494,7 @@ def _remove_config_file(client_id, message):
         msg = (protocol.CONFIG_REMOVE_FILE_FAILED,
                "%s|File/directory doesn't exist" % message_key)
     else:
+        _config_store.refresh()
         event.send(__name__, 'config_changed')
 
     client_id.sendall(protocol.message(*msg))
@@ -334,6 +529,7 @@ def _move_config_path(client_id, message):
         msg = (protocol.CONFIG_MOVE_PATH_FAILED,
                "%s|%s: %s" % (message_key, ioe.filename, ioe.strerror))
     else:
+        _config_store.refresh()
         event.send(__name__, 'config_changed')
     client_id.sendall(protocol.message(*msg))
 
@@ -344,42 +540,40 @@ def _send_config_db_files(client_id,message):
     except ValueError:          # message is bad, skip it
         return
     sub_path = sub_path.replace('../','') # prevent going up
-    look_path = sub_path and os.path.join(_options.db_path,sub_path) or _options.db_path
     try:
-        for root,dirs,files in os.walk(look_path):
-            for filename in files:
-                basename, ext = os.path.splitext(filename)
-                if ext == '.yml':
-                    full_path = os.path.join(root,filename)
-                    rel_path = full_path[len(_options.db_path) + 1:]
-                    try:
-                        with codecs.open(full_path, "r", "utf-8") as f:
-                            raw_buffer = f.read().encode('utf-8')
-                            msg = protocol.message(protocol.CONFIG_DB_FILE_RX,'%s|%s|%s' % (message_key,rel_path,raw_buffer))
-                            client_id.sendall(msg)
-                    except Exception as e:
-                        sys.excepthook(*sys.exc_info())
-                        client_id.sendall(protocol.message(protocol.CONFIG_DB_FAILED, "%s|%s" % (message_key, e)))
+        for rel_path,raw_buffer,_ in _config_store.files(sub_path):
+            msg = protocol.message(protocol.CONFIG_DB_FILE_RX,'%s|%s|%s' % (message_key,rel_path,raw_buffer))
+            client_id.sendall(msg)
     except Exception as e:
         sys.excepthook(*sys.exc_info())
         client_id.sendall(protocol.message(protocol.CONFIG_DB_FAILED, "%s|%s" % (message_key, e)))
     finally:
         client_id.sendall(protocol.message(protocol.CONFIG_DB_END,"%s|" % (message_key)))
 
-def __get_directory_structure(base_dir):
+def _send_config_db_archive(client_id,message):
     """
-    Helper that creates a nested dictionary that represents the folder structure of base_dir
+    Sends the files under a path in one compressed message:
+    [[relative path, sha1, content], ...] with a null content for the
+    files the client already has (known hashes sent in the request)
     """
-    result = {}
-    base_dir = base_dir.rstrip(os.sep)
-    start = base_dir.rfind(os.sep) + 1
-    for path, dirs, files in os.walk(base_dir):
-        folders = path[start:].split(os.sep)
-        subdir = dict.fromkeys(files)
-        parent = reduce(dict.get, folders[:-1], result)
-        parent[folders[-1]] = subdir
-    assert len(result) == 1
-    return result.popitem()
+    try:
+        message_key,sub_path,known_hashes = message.split('|',2)
+    except ValueError:          # message is bad, skip it
+        return
+    try:
+        known_hashes = json.loads(zlib.decompress(known_hashes)) if known_hashes else {}
+        sub_path = sub_path.replace('../','') # prevent going up
+        files = []
+        for rel_path,content,file_hash in _config_store.files(sub_path):
+            if known_hashes.get(rel_path) == file_hash:
+                content = None
+            files.append((rel_path,file_hash,content))
+        archive = zlib.compress(json.dumps(files))
+    except Exception as e:
+        sys.excepthook(*sys.exc_info())
+        client_id.sendall(protocol.message(protocol.CONFIG_GET_DB_ARCHIVE_FAILED, "%s|%s" % (message_key, e)))
+    else:
+        client_id.sendall(protocol.message(protocol.CONFIG_GET_DB_ARCHIVE_OK, "%s|%s" % (message_key, archive)))
 
 def _send_config_db_tree(client_id,message):
     try:
@@ -387,11 +581,9 @@ def _send_config_db_tree(client_id,message):
     except ValueError:          # message is bad, skip it
         return
     sub_path = sub_path.replace('../','') # prevent going up
-    look_path = sub_path and os.path.join(_options.db_path,sub_path) or _options.db_path
 
-    import json
     try:
-        _, tree = __get_directory_structure(look_path)
+        tree = _config_store.tree(sub_path)
         msg = (protocol.CONFIG_GET_DB_TREE_OK,'%s|%s' % (message_key, json.dumps(tree)))
     except Exception as e:
         sys.excepthook(*sys.exc_info())
@@ -425,6 +617,7 @@ def _write_config_db_file(client_id,message):
         msg = protocol.message(protocol.CONFIG_SET_DB_FILE_FAILED,
                                '%s|%s' % (message_key,traceback.format_exc()))
     else:
+        _config_store.refresh()
         event.send(__name__, 'config_changed')
     client_id.sendall(msg)
 
@@ -452,8 +645,8 @@ def _send_unknow_message(client_id,message):
     client_id.sendall(protocol.message(protocol.UNKNOW_MESSAGE,message))
 
 def _client_rx(client,local_connection):
-    tcp_data = ''
-    posix_queue_data = ''
+    tcp_decoder = protocol.MessageDecoder()
+    posix_queue_decoder = protocol.MessageDecoder()
     posix_queue = None
     r_listen = [client]
     try:
@@ -468,35 +661,37 @@ def _client_rx(client,local_connection):
                         raw_data = None
 
                     if raw_data:
-                        tcp_data = '%s%s' % (tcp_data,raw_data)
+                        tcp_decoder.feed(raw_data)
                     else:
                         stopFlag = True
                         break
 
-                    data = tcp_data
+                    decoder = tcp_decoder
                     c_id = client
                 else:
-                    posix_queue_data = '%s%s' % (posix_queue_data,posix_queue.receive()[0])
-                    data = posix_queue_data
+                    posix_queue_decoder.feed(posix_queue.receive()[0])
+                    decoder = posix_queue_decoder
                     c_id = posix_queue
 
-                while data:
+                while decoder:
                     try:
-                        messageType,message,data = protocol.unpack_message(data)
+                        messageType,message = decoder.next_message()
                         if messageType == protocol.LOCK:
                             lock_objects = message.split('|')
                             prio = int(lock_objects.pop(0))
-                            _lock(c_id,prio,lock_objects,message)
+                            _lock_manager.lock(c_id,prio,lock_objects,message)
                         elif messageType == protocol.UNLOCK:
                             lock_objects = message.split('|')
                             prio = int(lock_objects.pop(0))
-                            _unlock(c_id,prio,lock_objects)
+                            _lock_manager.unlock(c_id,prio,lock_objects)
                         elif messageType == protocol.LOCK_STOLEN_OK_REPLY:
                             client2sync = _waitstolen.get(message)
                             if client2sync is not None:
                                 sync = client2sync.get(c_id)
                                 if sync is not None:
                                     sync.set()
+                        elif messageType == protocol.LOCK_METRICS:
+                            _send_lock_metrics(c_id,message)
                         elif messageType == protocol.REDIS_QUERY:
                             _send_redis_info(c_id,local_connection)
                         elif messageType == protocol.POSIX_MQ_QUERY:
@@ -516,6 +711,8 @@ def _client_rx(client,local_connection):
                             _send_config_file(c_id,message)
                         elif messageType == protocol.CONFIG_GET_DB_BASE_PATH:
                             _send_config_db_files(c_id,message)
+                        elif messageType == protocol.CONFIG_GET_DB_ARCHIVE:
+                            _send_config_db_archive(c_id,message)
                         elif messageType == protocol.CONFIG_GET_DB_TREE:
                             _send_config_db_tree(c_id,message)
                         elif messageType == protocol.CONFIG_SET_DB_FILE:
@@ -534,18 +731,13 @@ def _client_rx(client,local_connection):
                     except protocol.IncompleteMessage:
                         r,_,_ = select.select(r_listen,[],[],.5)
                         if not r: # if timeout, something wired, close the connection
-                           data = None
+                           decoder.clear()
                            stopFlag = True
                         break
                     except:
                         sys.excepthook(*sys.exc_info())
                         _log.error('Error with client id %r, close it', client)
                         raise
-
-                if fd == client:
-                    tcp_data = data
-                else:
-                    posix_queue_data = data
     except:
         sys.excepthook(*sys.exc_info())
     finally:
@@ -597,6 +789,10 @@ def main(args=None):
         "--db_path", dest="db_path",
         default=os.environ.get("BEACON_DB_PATH", "./db"),
         help="database path")
+    parser.add_argument(
+        "--db_poll_period", dest="db_poll_period", default=2., type=float,
+        help="period (seconds) of the database changes checks when inotify "
+        "is not available (default to 2.)")
     parser.add_argument(
         "--redis_port", dest="redis_port", default=6379, type=int,
         help="redis connection port")
@@ -649,6 +845,14 @@ def main(args=None):
     # Pimp my path
     _options.db_path = os.path.abspath(os.path.expanduser(_options.db_path))
 
+    global _lock_manager
+    _lock_manager = _LockManager()
+
+    # Configuration served from memory
+    global _config_store
+    _config_store = _ConfigStore(_options.db_path, _options.db_poll_period)
+    gevent.spawn(_config_store.watch)
+
     # Posix queues
     if not _options.posix_queue:
         global posix_ipc
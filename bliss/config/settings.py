@@ -11,6 +11,11 @@ from bliss import setup_globals
 import weakref
 import pickle
 import numpy
+import gevent
+import gevent.event
+
+SETTINGS_CACHE = dict()
+INVALIDATION_CHANNEL = '__settings_invalidation__'
 
 
 class InvalidValue(Null):
@@ -134,11 +139,163 @@ def scan(match='*', count=1000, connection=None):
             break
 
 
-class SimpleSetting(object):
+def _keyspace_events_enabled(redis):
+    try:
+        events = redis.config_get('notify-keyspace-events')
+    except Exception:
+        return False
+    flags = events.get('notify-keyspace-events', '')
+    return 'K' in flags and ('A' in flags or set('g$lh').issubset(flags))
+
+
+class _SettingsCache(object):
+    """
+    Client side cache of the raw values of settings.
+
+    Entries are invalidated when their key changes in Redis, through
+    keyspace notifications (Beacon's Redis runs with
+    notify-keyspace-events "KA") or, when those are disabled, through the
+    INVALIDATION_CHANNEL where cached settings announce their writes.
+    One subscription (a pattern on the keyspace channels of the database)
+    serves all the cached settings.
+    """
+
+    def __init__(self, redis):
+        self._redis = redis
+        db = redis.connection_pool.connection_kwargs.get('db', 0)
+        self._keyspace_prefix = '__keyspace@%d__:' % db
+        self._keyspace_events = _keyspace_events_enabled(redis)
+        self._pubsub = redis.pubsub()
+        self._subscribed = None
+        self._values = dict()
+        self._generations = dict()
+        self._listen_task = None
+        self.hits = 0
+        self.misses = 0
+
+    def _watch(self, timeout=3.):
+        """
+        Return True once changes are notified
+        """
+        if self._subscribed is None:
+            self._subscribed = gevent.event.Event()
+            if self._keyspace_events:
+                self._pubsub.psubscribe(self._keyspace_prefix + '*')
+            else:
+                self._pubsub.subscribe(INVALIDATION_CHANNEL)
+            self._listen_task = gevent.spawn(self._listen)
+        return self._subscribed.wait(timeout)
+
+    def get(self, name, loader, statistics=None):
+        """
+        Return the cached raw value of **name**, calling **loader** to
+        read it from Redis on a miss
+        """
+        try:
+            value = self._values[name]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            if statistics is not None:
+                statistics['hits'] += 1
+            return value
+
+        self.misses += 1
+        if statistics is not None:
+            statistics['misses'] += 1
+        # values can only be cached once changes are notified
+        if not self._watch():
+            return loader()
+        generation = self._generations.setdefault(name, 0)
+        value = loader()
+        # don't keep a value invalidated while it was read
+        if self._generations.get(name) == generation:
+            self._values[name] = value
+        return value
+
+    def invalidate(self, name, cnx=None):
+        """
+        Drop the cached value of **name** after a write.
+
+        **cnx** is the connection (or pipeline) used for the write.
+        """
+        self._drop(name)
+        if not self._keyspace_events:
+            if cnx is None:
+                cnx = self._redis
+            cnx.publish(INVALIDATION_CHANNEL, name)
+
+    def _drop(self, name):
+        # only the names read through the cache are tracked
+        if name in self._generations:
+            self._values.pop(name, None)
+            self._generations[name] += 1
+
+    def _listen(self):
+        try:
+            for event in self._pubsub.listen():
+                event_type = event.get('type')
+                if event_type in ('subscribe', 'psubscribe'):
+                    self._subscribed.set()
+                elif event_type == 'message':
+                    self._drop(event.get('data'))
+                elif event_type == 'pmessage':
+                    channel = event.get('channel')
+                    self._drop(channel[len(self._keyspace_prefix):])
+        finally:
+            # without notifications, nothing cached can be trusted
+            self._values.clear()
+            self._subscribed = None
+            self._pubsub = self._redis.pubsub()
+            self._listen_task = None
+
+
+def SettingsCache(redis):
+    try:
+        return SETTINGS_CACHE[redis]
+    except KeyError:
+        cache = _SettingsCache(redis)
+        SETTINGS_CACHE[redis] = cache
+        return cache
+
+
+class _CachedSetting(object):
+    """
+    Optional client side cache of a setting (cache=True).
+
+    Reads are served from the process wide cache of the connection,
+    writes go to Redis and invalidate the cached value.
+    """
+
+    def _init_cache(self, connection, cache):
+        if cache:
+            self._cache = SettingsCache(connection)
+            self._cache_statistics = {'hits': 0, 'misses': 0}
+        else:
+            self._cache = None
+            self._cache_statistics = None
+
+    def _cached(self, loader):
+        return self._cache.get(self._name, loader, self._cache_statistics)
+
+    def _invalidate(self, cnx=None):
+        if self._cache is not None:
+            self._cache.invalidate(self._name, cnx)
+
+    @property
+    def cache_statistics(self):
+        """hits and misses of the setting cache (None if not cached)"""
+        if self._cache_statistics is None:
+            return None
+        return dict(self._cache_statistics)
+
+
+class SimpleSetting(_CachedSetting):
     def __init__(self, name, connection=None,
                  read_type_conversion=auto_conversion,
                  write_type_conversion=None,
-                 default_value=None):
+                 default_value=None, cache=False):
         if connection is None:
             connection = get_cache()
         self._cnx = weakref.ref(connection)
@@ -146,10 +303,13 @@ class SimpleSetting(object):
         self._read_type_conversion = read_type_conversion
         self._write_type_conversion = write_type_conversion
         self._default_value = default_value
+        self._init_cache(connection, cache)
 
     @read_decorator
     def get(self):
         cnx = self._cnx()
+        if self._cache is not None:
+            return self._cached(lambda: cnx.get(self._name))
         value = cnx.get(self._name)
         return value
 
@@ -157,6 +317,7 @@ class SimpleSetting(object):
     def set(self, value):
         cnx = self._cnx()
         cnx.set(self._name, value)
+        self._invalidate()
 
     def ttl(self, value=-1):
         return ttl_func(self._cnx(), self._name, value)
@@ -164,6 +325,7 @@ class SimpleSetting(object):
     def clear(self):
         cnx = self._cnx()
         cnx.delete(self._name)
+        self._invalidate()
 
     def __add__(self, other):
         value = self.get()
@@ -183,6 +345,7 @@ class SimpleSetting(object):
                 cnx.incrbyfloat(self._name, other)
             else:
                 cnx.append(self._name, other)
+            self._invalidate()
             return self
 
     def __isub__(self, other):
@@ -254,21 +417,32 @@ class SimpleSettingProp(object):
             self._cnx.set(name, value)
 
 
-class QueueSetting(object):
+class QueueSetting(_CachedSetting):
     def __init__(self, name, connection=None,
                  read_type_conversion=auto_conversion,
-                 write_type_conversion=None):
+                 write_type_conversion=None, cache=False):
         if connection is None:
             connection = get_cache()
         self._cnx = weakref.ref(connection)
         self._name = name
         self._read_type_conversion = read_type_conversion
         self._write_type_conversion = write_type_conversion
+        self._init_cache(connection, cache)
 
     @read_decorator
     def get(self, first=0, last=-1, cnx=None):
         if cnx is None:
             cnx = self._cnx()
+            if self._cache is not None:
+                values = self._cached(lambda: cnx.lrange(self._name, 0, -1))
+                if first == last:
+                    try:
+                        return values[first]
+                    except IndexError:
+                        return None
+                elif last == -1:
+                    return values[first:]
+                return values[first:last]
         if first == last:
             l = cnx.lindex(self._name, first)
         else:
@@ -281,29 +455,38 @@ class QueueSetting(object):
     def append(self, value, cnx=None):
         if cnx is None:
             cnx = self._cnx()
-        return cnx.rpush(self._name, value)
+        length = cnx.rpush(self._name, value)
+        self._invalidate(cnx)
+        return length
 
     def clear(self, cnx=None):
         if cnx is None:
             cnx = self._cnx()
         cnx.delete(self._name)
+        self._invalidate(cnx)
 
     @write_decorator
     def prepend(self, value, cnx=None):
         if cnx is None:
             cnx = self._cnx()
-        return cnx.lpush(self._name, value)
+        length = cnx.lpush(self._name, value)
+        self._invalidate(cnx)
+        return length
 
     @write_decorator_multiple
     def extend(self, values, cnx=None):
-        cnx = self._cnx()
-        return cnx.rpush(self._name, *values)
+        if cnx is None:
+            cnx = self._cnx()
+        length = cnx.rpush(self._name, *values)
+        self._invalidate(cnx)
+        return length
 
     @write_decorator
     def remove(self, value, cnx=None):
         if cnx is None:
             cnx = self._cnx()
         cnx.lrem(self._name, value)
+        self._invalidate(cnx)
 
     @write_decorator_multiple
     def set(self, values, cnx=None):
@@ -312,18 +495,21 @@ class QueueSetting(object):
         cnx.delete(self._name)
         if values is not None:
             cnx.rpush(self._name, *values)
+        self._invalidate(cnx)
 
     @write_decorator
     def set_item(self, value, pos=0, cnx=None):
         if cnx is None:
             cnx = self._cnx()
         cnx.lset(self._name, pos, value)
+        self._invalidate(cnx)
 
     @read_decorator
     def pop_front(self, cnx=None):
         if cnx is None:
             cnx = self._cnx()
         value = cnx.lpop(self._name)
+        self._invalidate(cnx)
         if self._read_type_conversion:
             value = self._read_type_conversion(value)
         return value
@@ -333,6 +519,7 @@ class QueueSetting(object):
         if cnx is None:
             cnx = self._cnx()
         value = cnx.rpop(self._name)
+        self._invalidate(cnx)
         if self._read_type_conversion:
             value = self._read_type_conversion(value)
         return value
@@ -345,6 +532,8 @@ class QueueSetting(object):
     def __len__(self, cnx=None):
         if cnx is None:
             cnx = self._cnx()
+            if self._cache is not None:
+                return len(self._cached(lambda: cnx.lrange(self._name, 0, -1)))
         return cnx.llen(self._name)
 
     def __repr__(self, cnx=None):
@@ -372,9 +561,7 @@ class QueueSetting(object):
             return value
 
     def __iter__(self, cnx = None):
-        if cnx is None:
-            cnx = self._cnx()
-        lsize = cnx.llen(self._name)
+        lsize = self.__len__(cnx)
         for first in xrange(0, lsize, 1024):
             last = first + 1024
             if last >= lsize:
@@ -429,11 +616,11 @@ class QueueSettingProp(object):
         proxy.set(values)
 
 
-class HashSetting(object):
+class HashSetting(_CachedSetting):
     def __init__(self, name, connection=None,
                  read_type_conversion=auto_conversion,
                  write_type_conversion=None,
-                 default_values={}):
+                 default_values={}, cache=False):
         if connection is None:
             connection = get_cache()
         self._cnx = weakref.ref(connection)
@@ -441,6 +628,7 @@ class HashSetting(object):
         self._read_type_conversion = read_type_conversion
         self._write_type_conversion = write_type_conversion
         self._default_values = default_values
+        self._init_cache(connection, cache)
 
     def __repr__(self):
         value = self.get_all()
@@ -449,15 +637,24 @@ class HashSetting(object):
     def __delitem__(self, key):
         cnx = self._cnx()
         cnx.hdel(self._name, key)
+        self._invalidate()
 
     def __len__(self):
+        if self._cache is not None:
+            return len(self._cached_all())
         cnx = self._cnx()
         return cnx.hlen(self._name)
 
     def ttl(self, value=-1):
         return ttl_func(self._cnx(), self._name, value)
 
+    def _cached_all(self):
+        cnx = self._cnx()
+        return self._cached(lambda: cnx.hgetall(self._name))
+
     def raw_get(self, *keys):
+        if self._cache is not None:
+            return self._cached_all().get(*keys)
         cnx = self._cnx()
         return cnx.hget(self._name, *keys)
 
@@ -472,6 +669,8 @@ class HashSetting(object):
         return v
 
     def _raw_get_all(self):
+        if self._cache is not None:
+            return dict(self._cached_all())
         cnx = self._cnx()
         return cnx.hgetall(self._name)
 
@@ -491,6 +690,7 @@ class HashSetting(object):
         cnx.hget(self._name, key)
         cnx.hdel(self._name, key)
         (value, worked) = cnx.execute()
+        self._invalidate()
         if not worked:
             if isinstance(default, Null):
                 raise KeyError(key)
@@ -501,6 +701,7 @@ class HashSetting(object):
     def remove(self, *keys):
         cnx = self._cnx()
         cnx.hdel(self._name, *keys)
+        self._invalidate()
 
     def keys(self):
         return list(self.iterkeys())
@@ -511,6 +712,7 @@ class HashSetting(object):
     def clear(self):
         cnx = self._cnx()
         cnx.delete(self._name)
+        self._invalidate()
 
     def copy(self):
         return self.get()
@@ -521,12 +723,14 @@ class HashSetting(object):
         cnx.delete(self._name)
         if values is not None:
             cnx.hmset(self._name, values)
+        self._invalidate()
 
     @write_decorator_dict
     def update(self, values):
         cnx = self._cnx()
         if values:
             cnx.hmset(self._name, values)
+            self._invalidate()
 
     def items(self):
         values = self.get_all()
@@ -534,10 +738,15 @@ class HashSetting(object):
 
     @read_decorator
     def fromkeys(self, *keys):
+        if self._cache is not None:
+            values = self._cached_all()
+            return [values.get(k) for k in keys]
         cnx = self._cnx()
         return cnx.hmget(self._name, *keys)
 
     def has_key(self, key):
+        if self._cache is not None:
+            return key in self._cached_all() or self._default_values.has_key(key)
         cnx = self._cnx()
         return cnx.hexists(self._name, key) or self._default_values.has_key(key)
 
@@ -554,7 +763,10 @@ class HashSetting(object):
         next_id = 0
         seen_keys = set()
         while True:
-            next_id, pd = cnx.hscan(self._name, next_id)
+            if self._cache is not None:
+                next_id, pd = 0, self._raw_get_all()
+            else:
+                next_id, pd = cnx.hscan(self._name, next_id)
             for k, v in pd.iteritems():
                 if self._read_type_conversion:
                     v = self._read_type_conversion(v)
@@ -579,10 +791,12 @@ class HashSetting(object):
         cnx = self._cnx()
         if value is None:
             cnx.hdel(self._name, key)
+            self._invalidate()
             return
         if self._write_type_conversion:
             value = self._write_type_conversion(value)
         cnx.hset(self._name, key, value)
+        self._invalidate()
 
     def __contains__(self, key):
         try:
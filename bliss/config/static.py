@@ -48,6 +48,9 @@ Accessing the configured elements from python is easy
 import os
 import gc
 import yaml
+import errno
+import cPickle
+import hashlib
 import weakref
 import functools
 
@@ -94,6 +97,8 @@ except ImportError:
     ordered_yaml = None
     NodeDict = dict
 
+from bliss.common.utils import OrderedDict
+
 CONFIG = None
 
 if hasattr(yaml, "CLoader"):
@@ -101,20 +106,141 @@ if hasattr(yaml, "CLoader"):
 else:
     yaml_load = yaml.load
 
-def load_cfg(filename):
-    cfg_string = client.get_config_file(filename)
+
+class FastLoader(getattr(yaml, "CSafeLoader", yaml.SafeLoader)):
+    """C accelerated safe YAML loader which keeps the order of mappings"""
+
+
+def _construct_ordered_mapping(loader, node):
+    loader.flatten_mapping(node)
+    return OrderedDict(loader.construct_pairs(node, deep=True))
+
+FastLoader.add_constructor(u'tag:yaml.org,2002:map', _construct_ordered_mapping)
+
+
+def round_trip_load(cfg_string):
     if ordered_yaml:
         return ordered_yaml.load(cfg_string,ordered_yaml.RoundTripLoader)
     else:
         return yaml_load(cfg_string)
 
+
+def fast_load(cfg_string):
+    return yaml.load(cfg_string, Loader=FastLoader)
+
+
+def _to_plain(value):
+    if isinstance(value, dict):
+        return OrderedDict(((k, _to_plain(v)) for k, v in value.iteritems()))
+    elif isinstance(value, list):
+        return [_to_plain(v) for v in value]
+    return value
+
+
+class ParsedConfigCache(object):
+    """
+    Cache of the parsed YAML files, keyed by file path and content hash.
+
+    It is persisted in a local file (BLISS_CONFIG_CACHE environment
+    variable, default: ~/.cache/bliss/config_cache.pickle, empty to
+    disable) so unchanged files are not parsed again by the next sessions.
+    """
+
+    def __init__(self, filename=None):
+        if filename is None:
+            filename = os.environ.get('BLISS_CONFIG_CACHE',
+                                      os.path.join(os.path.expanduser('~'),
+                                                   '.cache', 'bliss',
+                                                   'config_cache.pickle'))
+        self._filename = filename
+        self._entries = None
+        self._modified = False
+        self.hits = 0
+        self.misses = 0
+
+    def _load(self):
+        self._entries = dict()
+        if not self._filename:
+            return
+        try:
+            with open(self._filename, 'rb') as f:
+                entries = cPickle.load(f)
+        except Exception:
+            # no cache or not readable
+            return
+        if isinstance(entries, dict):
+            self._entries = entries
+
+    def get(self, path, content, loader, file_hash=None):
+        """
+        Return the parsed **content** of file **path**, parsing it with
+        **loader** if it is not in the cache.
+
+        **file_hash** is the sha1 of the file given by the beacon server,
+        computed from **content** if None.
+        """
+        if self._entries is None:
+            self._load()
+        if file_hash is None:
+            file_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()
+        key = (file_hash, loader.__name__)
+        entry = self._entries.get(path)
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        data = _to_plain(loader(content))
+        self._entries[path] = key, data
+        self._modified = True
+        return data
+
+    def prune(self, paths, base_path=''):
+        """
+        Remove the entries of the files under **base_path** which are not
+        in **paths** (deleted or renamed files)
+        """
+        if self._entries is None:
+            self._load()
+        prefix = base_path.strip('/')
+        paths = set(paths)
+        for path in self._entries.keys():
+            if path in paths:
+                continue
+            if not prefix or path.startswith(prefix + '/'):
+                del self._entries[path]
+                self._modified = True
+
+    def save(self):
+        if not self._modified or not self._filename:
+            return
+        self._modified = False
+        try:
+            os.makedirs(os.path.dirname(self._filename))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                return
+        tmp_filename = '%s.%d' % (self._filename, os.getpid())
+        try:
+            with open(tmp_filename, 'wb') as f:
+                cPickle.dump(self._entries, f, protocol=-1)
+            os.rename(tmp_filename, self._filename)
+        except Exception:
+            # the cache is only an optimization
+            try:
+                os.unlink(tmp_filename)
+            except OSError:
+                pass
+
+PARSED_CONFIG_CACHE = ParsedConfigCache()
+
+def load_cfg(filename):
+    cfg_string = client.get_config_file(filename)
+    return round_trip_load(cfg_string)
+
 def load_cfg_fromstring(cfg_string):
-    if ordered_yaml:
-        return ordered_yaml.load(cfg_string,ordered_yaml.RoundTripLoader)
-    else:
-        return yaml_load(cfg_string)
+    return round_trip_load(cfg_string)
 
-def get_config(base_path='', timeout=3.):
+def get_config(base_path='', timeout=3., fast_load=False):
     """
     Return configuration from bliss configuration server
 
@@ -141,13 +267,15 @@ def get_config(base_path='', timeout=3.):
     Args:
         base_path (str): base path to config
         timeout (float): response timeout (seconds)
+        fast_load (bool): parse the files with the C safe loader
+                          (see :class:`Config`), only used the first time
 
     Returns:
         Config: the configuration object
     """
     global CONFIG
     if CONFIG is None:
-        CONFIG = Config(base_path, timeout)
+        CONFIG = Config(base_path, timeout, fast_load=fast_load)
     return CONFIG
 
 class Node(NodeDict):
@@ -399,16 +527,32 @@ class Config(object):
 
     USER_TAG_KEY = 'user_tag'
 
-    def __init__(self, base_path, timeout=3, connection=None):
+    def __init__(self, base_path, timeout=3, connection=None,
+                 fast_load=False, cache=PARSED_CONFIG_CACHE):
+        """
+        Keyword args:
+
+            fast_load (bool): parse the files with the C accelerated safe
+                              loader (YAML 1.1) instead of the round-trip
+                              loader, for read-only sessions. Files saved
+                              from this object are still parsed with the
+                              round-trip loader [default: False]
+            cache (ParsedConfigCache): cache of the parsed files, None to
+                                       parse every file at each reload
+        """
         self._base_path = base_path
         self._connection = connection or client.get_default_connection()
+        self._fast_load = fast_load
+        self._parsed_cache = cache
+        self._edited_files = set()
         self.reload(timeout=timeout)
 
     def reload(self, base_path=None, timeout=3):
         """
         Reloads the configuration from the bliss server.
 
-        Effectively cleans any cache (bliss objects and configuration tree)
+        Effectively cleans any cache (bliss objects and configuration tree).
+        Only the files changed since they were last parsed are parsed again.
 
         Keyword args:
 
@@ -431,20 +575,20 @@ class Config(object):
 
         self._clear_instances()
 
-        path2file = client.get_config_db_files(base_path = base_path,
-                                               timeout = timeout,
-                                               connection = self._connection)
+        path2file = client.get_config_db_files_with_hashes(
+            base_path = base_path, timeout = timeout,
+            connection = self._connection)
+        if self._parsed_cache is not None:
+            self._parsed_cache.prune((path for path, _, _ in path2file),
+                                     base_path)
 
-        for path, file_content in path2file:
+        for path, file_hash, file_content in path2file:
             if not file_content:
                 continue
             base_path, file_name = os.path.split(path)
             fs_node, fs_key = self._get_or_create_path_node(base_path)
 
-            if ordered_yaml:
-                d = ordered_yaml.load(file_content,ordered_yaml.RoundTripLoader)
-            else:
-                d = yaml_load(file_content)
+            d = self._load_file(path, file_content, file_hash)
 
             is_init_file = False
             if file_name.startswith('__init__'):
@@ -522,8 +666,19 @@ class Config(object):
                         fs_node[fs_key] = [children,parents]
             else:
                 fs_node[fs_key] = parents
-        while gc.collect():
-            pass        
+        if self._parsed_cache is not None:
+            self._parsed_cache.save()
+        gc.collect()
+
+    def _load_file(self, path, file_content, file_hash=None):
+        if self._fast_load and path not in self._edited_files:
+            loader = fast_load
+        else:
+            loader = round_trip_load
+        if self._parsed_cache is None:
+            return loader(file_content)
+        return self._parsed_cache.get(path, file_content, loader, file_hash)
+
     @property
     def names_list(self):
         """
@@ -565,6 +720,7 @@ class Config(object):
         """
 
         full_filename = os.path.join(self._base_path,filename)
+        self._edited_files.add(full_filename)
         client.set_config_db_file(full_filename,content,
                                   connection=self._connection)
 
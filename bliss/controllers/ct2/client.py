@@ -22,13 +22,77 @@ Minimalistic configuration example:
 """
 
 import numpy
+import gevent.event
 
 from bliss.comm.rpc import Client
+from bliss.common.event import dispatcher
 from bliss.common.measurement import IntegratingCounter
+from bliss.controllers.ct2.device import (DataSignal, StatusSignal,
+                                         ErrorSignal)
 
 
 CT2 = Client
 
+#: max. time (s) waiting for streamed data before asking the server for it
+STREAM_TIMEOUT = 10.
+
+
+class DataStream(object):
+    """
+    Acquisition data blocks pushed by the CT2 server as they are read
+    from the card FIFO (see :data:`~bliss.controllers.ct2.device.DataSignal`)
+    """
+
+    def __init__(self, controller):
+        self.acq_id = None
+        self.__blocks = []
+        self.__event = gevent.event.Event()
+        dispatcher.connect(self.__on_data, DataSignal, controller)
+        dispatcher.connect(self.__on_event, StatusSignal, controller)
+        dispatcher.connect(self.__on_event, ErrorSignal, controller)
+
+    def __on_data(self, value):
+        acq_id, index, data = value
+        if acq_id == self.acq_id:
+            self.__blocks.append((index, data))
+            self.__event.set()
+
+    def __on_event(self, value):
+        self.__event.set()
+
+    def reset(self, acq_id):
+        self.acq_id = acq_id
+        self.__blocks = []
+        self.__event.clear()
+
+    def wakeup(self):
+        self.__event.set()
+
+    def get(self, from_index, timeout=None):
+        """
+        Points from the given index on, received from the server (waits
+        for new blocks up to *timeout* or an acquisition status change).
+        Returns None if there are no new points
+        """
+        if not self.__blocks:
+            self.__event.clear()
+            self.__event.wait(timeout)
+        blocks, self.__blocks = self.__blocks, []
+        data = []
+        for index, block in blocks:
+            if index + len(block) <= from_index:
+                continue        # already read
+            if index > from_index:
+                # missing points: put the blocks back and let the caller
+                # read them from the server
+                self.__blocks = blocks
+                return None
+            data.append(block[from_index - index:])
+            from_index = index + len(block)
+        if not data:
+            return None
+        return data[0] if len(data) == 1 else numpy.vstack(data)
+
 
 class CounterGroup(IntegratingCounter.GroupedReadHandler):
 
@@ -59,9 +123,31 @@ class CounterGroup(IntegratingCounter.GroupedReadHandler):
         # CT2AcquisitionDevice prepare, we do a "second" prepare
         # here after the acq_channels have been configured
         self.controller.prepare_acq()
+        if self.data_stream is not None:
+            self.data_stream.reset(ctrl.acq_id)
+
+    def stop(self, *counters):
+        if self.data_stream is not None:
+            self.data_stream.wakeup()
+
+    @property
+    def data_stream(self):
+        try:
+            return self.__data_stream
+        except AttributeError:
+            ctrl = self.controller
+            # servers without acq_id don't stream data
+            stream = DataStream(ctrl) if hasattr(ctrl, 'acq_id') else None
+            self.__data_stream = stream
+            return stream
 
     def get_values(self, from_index, *counters):
-        data = self.controller.get_data(from_index).T
+        data = None
+        if self.data_stream is not None:
+            data = self.data_stream.get(from_index, STREAM_TIMEOUT)
+        if data is None:
+            data = self.controller.get_data(from_index)
+        data = data.T
         if not data.size:
             return len(counters)*(numpy.array(()),)
         result = [counter.convert(data[self.counter_indexes[counter]])
@@ -44,6 +44,7 @@ from . import card
 ErrorSignal = "error"
 StatusSignal = "status"
 PointNbSignal = "point_nb"
+DataSignal = "data"
 
 
 class AcqMode(enum.IntEnum):
@@ -84,6 +85,104 @@ class AcqStatus(enum.IntEnum):
     Running = 1
 
 
+class PointBuffer(object):
+    """
+    Preallocated ring buffer of acquisition points (one row per point).
+
+    Points are indexed from the last :meth:`clear` (or :meth:`consume`).
+    Reads return a view on the buffer when the points are contiguous in the
+    ring (a copy when they wrap around): it is only valid until *capacity*
+    new points are appended.
+
+    Points overwritten before being read are counted in :attr:`overruns`.
+    """
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError('Invalid buffer capacity: %r' % capacity)
+        self.__capacity = capacity
+        self.__array = None
+        self.clear()
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    @property
+    def nb_points(self):
+        """number of points appended since the last clear/consume"""
+        return self.__end - self.__start
+
+    def __len__(self):
+        return self.__end - self.__first()
+
+    def __first(self):
+        return max(self.__start, self.__end - self.__capacity)
+
+    def clear(self):
+        self.__start = 0        # first point not consumed
+        self.__end = 0          # total number of points appended
+        self.__read = 0         # end of the last read
+        self.overruns = 0
+
+    def append(self, data):
+        data = numpy.asarray(data)
+        nb_points = len(data)
+        if not nb_points:
+            return
+        capacity = self.__capacity
+        array = self.__array
+        if array is None or array.shape[1:] != data.shape[1:] or \
+           array.dtype != data.dtype:
+            array = numpy.empty((capacity,) + data.shape[1:], dtype=data.dtype)
+            self.__array = array
+        unread = max(self.__read, self.__first())
+        end = self.__end + nb_points
+        data = data[-capacity:]
+        i = (end - len(data)) % capacity
+        n = min(len(data), capacity - i)
+        array[i:i + n] = data[:n]
+        array[:len(data) - n] = data[n:]
+        self.__end = end
+        self.overruns += max(0, self.__first() - unread)
+
+    def __get(self, first):
+        end = self.__end
+        if first >= end:
+            return None
+        capacity = self.__capacity
+        i = first % capacity
+        j = i + end - first
+        if j <= capacity:
+            data = self.__array[i:j]
+        else:
+            data = numpy.concatenate((self.__array[i:],
+                                      self.__array[:j - capacity]))
+        self.__read = max(self.__read, end)
+        return data
+
+    def get(self, from_index=0):
+        """
+        Points from the given index on (None if there are no new points).
+        Raises :exc:`IndexError` if some of them have been overwritten
+        """
+        first = self.__start + from_index
+        oldest = self.__first()
+        if first < oldest:
+            raise IndexError('points %d to %d have been overwritten (buffer '
+                             'overrun)' % (from_index, oldest - self.__start - 1))
+        return self.__get(first)
+
+    def consume(self):
+        """
+        Points not yet consumed which are still in the buffer (None if
+        there are none). Next point index restarts from 0
+        """
+        data = self.__get(self.__first())
+        self.__start = self.__end
+        return data
+
+
 class CT2(object):
     """
     Helper for a locally installed CT2 card (P201/C208).
@@ -163,11 +262,12 @@ class CT2(object):
     DefaultAcqMode = AcqMode.IntTrigReadout
     DefaultInputConfig = {'channel': None, 'polarity inverted': False, 'counter': None}
     DefaultOutputConfig = {'channel': 10, 'counter': 10}
+    DefaultBufferCapacity = 2**18
 
     def __init__(self, card):
         self._log = logging.getLogger(type(self).__name__)
         self._card = card
-        self.__buffer = []
+        self.__buffer = PointBuffer(self.DefaultBufferCapacity)
         self.__buffer_lock = lock.RLock()
         self.__acq_mode = self.DefaultAcqMode
         self.__acq_status = AcqStatus.Ready
@@ -181,6 +281,7 @@ class CT2(object):
         self.__soft_started = False
         self.__last_point_nb = -1
         self.__last_error = None
+        self.__acq_id = 0
         self.input_config = dict(self.DefaultInputConfig)
         self.output_config = dict(self.DefaultOutputConfig)
 
@@ -204,6 +305,9 @@ class CT2(object):
     def _send_status(self, status):
         dispatcher.send(StatusSignal, self, status)
 
+    def _send_data(self, index, data):
+        dispatcher.send(DataSignal, self, (self.__acq_id, index, data))
+
     def run_acq_loop(self):
         card_o = self._card
         int_trig_dead_time = self.__acq_mode in self.IntTrigDeadTimeModes
@@ -274,8 +378,10 @@ class CT2(object):
 
                 if dma:
                     with self.__buffer_lock:
+                        index = self.__buffer.nb_points
                         self.__buffer.append(data)
                     self.__last_point_nb = point_nb
+                    self._send_data(index, data)
                     self._send_point_nb(point_nb)
 
                 if acq_end:
@@ -301,7 +407,8 @@ class CT2(object):
     def reset(self):
         self._card.software_reset()
         self._card.reset()
-        self.__buffer = []
+        with self.__buffer_lock:
+            self.__buffer.clear()
 
     def __configure_std_mode(self, mode):
         card_o = self._card
@@ -537,7 +644,9 @@ class CT2(object):
         self.stop_acq()
         if self.acq_mode not in self.StdModes:
             raise NotImplementedError
-        self.__buffer = []
+        with self.__buffer_lock:
+            self.__buffer.clear()
+        self.__acq_id += 1
         self.__last_point_nb = -1
         self.__last_error = None
         self.__configure_std_mode(self.acq_mode)
@@ -762,29 +871,46 @@ class CT2(object):
     def last_error(self):
         return self.__last_error
 
-    def read_data(self):
+    @property
+    def acq_id(self):
+        """
+        identifier of the last prepared acquisition (the data blocks sent
+        with :data:`DataSignal` are tagged with it)
+        """
+        return self.__acq_id
+
+    @property
+    def buffer_capacity(self):
+        """capacity (in points) of the acquisition data buffer"""
+        return self.__buffer.capacity
+
+    @buffer_capacity.setter
+    def buffer_capacity(self, capacity):
+        if self.__acq_status == AcqStatus.Running:
+            raise RuntimeError('Cannot change buffer capacity while acquiring')
         with self.__buffer_lock:
-            return self.__read_data()
+            self.__buffer = PointBuffer(int(capacity))
 
-    def __read_data(self):
-        b = self.__buffer
-        if b:
-            self.__buffer = []
-            data = numpy.vstack(b)
-        else:
+    @property
+    def buffer_overruns(self):
+        """number of points overwritten in the buffer before being read"""
+        return self.__buffer.overruns
+
+    def read_data(self):
+        with self.__buffer_lock:
+            data = self.__buffer.consume()
+        if data is None:
             data = numpy.array([[]], dtype=numpy.uint32)
         return data
 
     def get_data(self, from_index=None):
         if from_index is None:
             from_index = 0
-        data = None
         with self.__buffer_lock:
-            if self.__buffer:
-                data = self.__buffer[from_index:]
-        if data:
-            return numpy.vstack(data)
-        return numpy.array([[]], dtype=numpy.uint32)
+            data = self.__buffer.get(from_index)
+        if data is None:
+            data = numpy.array([[]], dtype=numpy.uint32)
+        return data
 
     def configure(self, device_config):
         card_config = _build_card_config(device_config)
@@ -792,6 +918,8 @@ class CT2(object):
         external = device_config.get('external sync', {})
         self.input_config = external.get('input', self.DefaultInputConfig)
         self.output_config = external.get('output', self.DefaultOutputConfig)
+        self.buffer_capacity = device_config.get('buffer capacity',
+                                                 self.DefaultBufferCapacity)
 
 
 def __get_device_config(name):
@@ -855,4 +983,6 @@ def create_and_configure_device(config_or_name):
     device = CT2(card_obj)
     device.input_config = input_config
     device.output_config = output_config
+    device.buffer_capacity = device_config.get('buffer capacity',
+                                               CT2.DefaultBufferCapacity)
     return device
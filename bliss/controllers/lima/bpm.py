@@ -7,30 +7,32 @@
 import weakref
 import numpy
 from bliss.common.measurement import IntegratingCounter
-from bliss.common.utils import grouped
 
 class _GroupReadHandler(IntegratingCounter.GroupedReadHandler):
     def __init__(self, controller):
         IntegratingCounter.GroupedReadHandler.__init__(self, controller)
+        self._result_size = None
 
     def prepare(self, *counters):
         self.controller._proxy.On()
+        self._result_size = None
 
     def end(self, *counters):
         self.controller._proxy.Off()
 
     def get_values(self, from_index, *counters):
-        result_size = self.controller._proxy.ResultSize
-        all_result = self.controller._proxy.GetResults(from_index)
-        nb_result = len(all_result) / result_size
-        counter2index = [(numpy.zeros((nb_result,)), self.controller._name2index[cnt.name]) 
-                         for cnt in counters]
-
-        for i, raw in enumerate(grouped(all_result, result_size)):
-            for res, j in counter2index:
-                res[i] = raw[j]
-
-        return [x[0] for x in counter2index]
+        proxy = self.controller._proxy
+        # the result size doesn't change during an acquisition
+        if self._result_size is None:
+            self._result_size = proxy.ResultSize
+        result_size = self._result_size
+        all_result = numpy.asarray(proxy.GetResults(from_index),
+                                   dtype=numpy.double)
+        nb_result = len(all_result) // result_size
+        results = all_result[:nb_result * result_size]
+        results = results.reshape(nb_result, result_size)
+        name2index = self.controller._name2index
+        return [results[:, name2index[cnt.name]] for cnt in counters]
 
 class LimaBpmCounter(IntegratingCounter):
     def __init__(self, name, controller, acquisition_controller,**keys):
@@ -11,7 +11,6 @@ import functools
 import numpy
 
 from bliss.config import settings
-from bliss.common.utils import grouped, OrderedDict
 from bliss.common.measurement import IntegratingCounter
 
 
@@ -93,25 +92,48 @@ class RoiCounter(object):
 
 class RoiCounterGroupReadHandler(IntegratingCounter.GroupedReadHandler):
 
+    def __init__(self, controller):
+        IntegratingCounter.GroupedReadHandler.__init__(self, controller)
+        self._frame_roi_ids = None
+
     def prepare(self, *counters):
         self.controller.upload_rois()
+        self._frame_roi_ids = None
 
     def get_values(self, from_index, *counters):
         roi_counter_size = len(RoiStat)
         raw_data = self.controller._proxy.readCounters(from_index)
         if not raw_data.size:
             return len(counters)*(numpy.array(()),)
-        raw_data.shape = (raw_data.size) / roi_counter_size, roi_counter_size
-        result = OrderedDict([int(counter), []] for counter in counters)
-
-        for roi_counter in raw_data:
-            roi_id = int(roi_counter[0])
-            for stat in range(roi_counter_size):
-                full_id = RoiStatCounter.roi_stat_id(roi_id, stat)
-                counter_data = result.get(full_id)
-                if counter_data is not None:
-                    counter_data.append(roi_counter[stat])
-        return map(numpy.array, result.values())
+        raw_data = raw_data.reshape(-1, roi_counter_size)
+        roi_ids = raw_data[:, RoiStat.Id]
+        # ids of the rois of one frame, in the order they come from lima
+        # (the same for all the frames of an acquisition)
+        if self._frame_roi_ids is None:
+            frames = raw_data[:, RoiStat.Frame]
+            self._frame_roi_ids = roi_ids[frames == frames[0]].copy()
+        frame_roi_ids = self._frame_roi_ids
+        nb_rois = len(frame_roi_ids)
+        if roi_ids.size % nb_rois == 0 and \
+           (roi_ids.reshape(-1, nb_rois) == frame_roi_ids).all():
+            # one view per counter on the (frame, roi, stat) array
+            data = raw_data.reshape(-1, nb_rois, roi_counter_size)
+            roi_index = dict((int(roi_id), i)
+                             for i, roi_id in enumerate(frame_roi_ids))
+            result = []
+            for counter in counters:
+                full_id = int(counter)
+                i = roi_index.get(full_id >> 8)
+                if i is None:
+                    result.append(numpy.array(()))
+                else:
+                    result.append(data[:, i, full_id & 0xff])
+            return result
+        result = []
+        for counter in counters:
+            full_id = int(counter)
+            result.append(raw_data[roi_ids == (full_id >> 8), full_id & 0xff])
+        return result
 
 
 class RoiCounters(object):
@@ -256,6 +256,21 @@ class Controller(object):
     def state(self, axis):
         raise NotImplementedError
 
+    def end_of_motion(self, axis):
+        """
+        To be called by controllers notified of the end of a motion
+        (hardware event, channel...): the state of *axis* is read at once
+        instead of at the next polling.
+        """
+        axis._wakeup_move_loop()
+
+    def state_all(self, axes):
+        """
+        Returns the list of states of *axes*, read together.
+        Optional: moving axes are polled with :meth:`state` otherwise.
+        """
+        raise NotImplementedError
+
     def get_info(self, axis):
         raise NotImplementedError
 
@@ -280,6 +295,14 @@ class Controller(object):
     def read_position(self, axis):
         raise NotImplementedError
 
+    def read_position_all(self, axes):
+        """
+        Returns the list of positions of *axes* (in *steps*), read together.
+        Optional: moving axes read their position with :meth:`read_position`
+        otherwise.
+        """
+        raise NotImplementedError
+
     def set_position(self, axis, new_position):
         raise NotImplementedError
 
@@ -118,6 +118,15 @@ class Icepap(Controller):
     def read_position(self,axis,cache=True):
         pos_cmd = "FPOS" if cache else "POS"
         return int(_command(self._cnx,"?%s %s" % (pos_cmd,axis.address)))
+
+    def read_position_all(self,axes,cache=True):
+        """
+        Read the position of several axes in one round trip
+        """
+        pos_cmd = "FPOS" if cache else "POS"
+        replies = _command_pipeline(self._cnx,["?%s %s" % (pos_cmd,axis.address)
+                                               for axis in axes])
+        return [int(reply) for reply in replies]
     
     def set_position(self,axis,new_pos):
         if isinstance(axis,SlaveAxis):
@@ -148,16 +157,29 @@ class Icepap(Controller):
         _ackcommand(self._cnx,"ACCTIME %s %f" % (axis.address,new_acctime))
         return self.read_acceleration(axis)
 
-    def state(self,axis):
+    def _status_cmd(self,axis):
         last_power_time = self._last_axis_power_time.get(axis,0)
         if time.time() - last_power_time < 1.:
             status_cmd = "?STATUS"
         else:
             self._last_axis_power_time.pop(axis,None)
             status_cmd = "?FSTATUS"
+        return "%s %s" % (status_cmd,axis.address)
+
+    def state(self,axis):
+        status = int(_command(self._cnx,self._status_cmd(axis)),16)
+        return self._status2state(axis,status)
 
-        status = int(_command(self._cnx,"%s %s" %
-                              (status_cmd,axis.address)),16)
+    def state_all(self,axes):
+        """
+        Read the state of several axes in one round trip
+        """
+        replies = _command_pipeline(self._cnx,[self._status_cmd(axis)
+                                               for axis in axes])
+        return [self._status2state(axis,int(reply,16))
+                for axis,reply in zip(axes,replies)]
+
+    def _status2state(self,axis,status):
         status ^= 1<<23 #neg POWERON FLAG
         state = self._icestate.new()
         for mask,value in (((1<<9),"READY"),
@@ -505,6 +527,27 @@ def _command(cnx,cmd,data = None,pre_cmd = None):
                 raise RuntimeError(msg.replace('ERROR ',''))
             return msg.strip(' ')
 
+@protect_from_kill
+def _command_pipeline(cnx,cmds):
+    """
+    Send several queries back to back and return their replies in order.
+    Only single line replies are supported (no binary data nor '$' replies)
+    """
+    for cmd in cmds:
+        if not _check_reply.match(cmd):
+            raise ValueError("Only queries can be pipelined (%r)" % cmd)
+    replies = cnx.write_readline_pipeline(["%s\n" % cmd for cmd in cmds])
+    msgs = []
+    for cmd,msg in zip(cmds,replies):
+        cmd = cmd.strip('#').split(' ')[0]
+        msg = msg.replace(cmd + ' ','')
+        if msg.startswith('$'):
+            raise RuntimeError("%s: multi-line reply can't be pipelined" % cmd)
+        elif msg.startswith('ERROR'):
+            raise RuntimeError(msg.replace('ERROR ',''))
+        msgs.append(msg.strip(' '))
+    return msgs
+
 def _ackcommand(cnx,cmd,data = None,pre_cmd = None):
     if not cmd.startswith('#') and not cmd.startswith('?'):
         cmd = '#' + cmd
@@ -9,6 +9,8 @@ import math
 import time
 import random
 
+import gevent
+
 from bliss.controllers.motor import Controller
 from bliss.common import log as elog
 from bliss.common.axis import Axis,AxisState
@@ -29,6 +31,7 @@ config :
  'acceleration' in unit/s^2
  'steps_per_unit' in unit^-1  (default 1)
  'backlash' in unit
+ 'notify_end_of_motion' to push the end of the motions (default False)
 """
 
 class Mockup(Controller):
@@ -48,6 +51,10 @@ class Mockup(Controller):
 
         self._hw_state.create_state("PARKED", "mot au parking")
 
+        self.notify_end_of_motion = self.config.get("notify_end_of_motion",
+                                                    bool, False)
+        self.__end_of_motion_tasks = {}
+
         # Access to the config.
         try:
             self.host = self.config.get("host")
@@ -151,6 +158,17 @@ class Mockup(Controller):
             "end_t": t0 + math.fabs(delta) / float(v),
             "target": end_pos,
             "t0": t0})
+        self._cancel_end_of_motion(axis)
+        if self.notify_end_of_motion:
+            end_t = self._axis_moves[axis]["end_t"]
+            self.__end_of_motion_tasks[axis] = \
+                gevent.spawn_later(max(end_t - time.time(), 0),
+                                   self.end_of_motion, axis)
+
+    def _cancel_end_of_motion(self, axis):
+        task = self.__end_of_motion_tasks.pop(axis, None)
+        if task is not None:
+            task.kill()
 
     def start_jog(self, axis, velocity, direction):
         t0 = time.time() 
@@ -190,6 +208,10 @@ class Mockup(Controller):
 
         return int(round(pos))
 
+    def read_position_all(self, axes):
+        t = time.time()
+        return [self.read_position(axis, t=t) for axis in axes]
+
     def read_encoder(self, encoder):
         """
         returns encoder position.
@@ -295,10 +317,14 @@ class Mockup(Controller):
            self._axis_moves[axis]["delta"] = 0
            return self._check_hw_limits(axis)
 
+    def state_all(self, axes):
+        return [self.state(axis) for axis in axes]
+
     """
     Must send a command to the controller to abort the motion of given axis.
     """
     def stop(self, axis, t=None):
+        self._cancel_end_of_motion(axis)
         if self._axis_moves[axis]["end_t"]:
             self._axis_moves[axis]["target"] = self.read_position(axis, t=t)
             self._axis_moves[axis]["end_t"] = None
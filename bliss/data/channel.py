@@ -12,6 +12,10 @@ import redis
 import functools
 import cPickle
 
+PICKLE_STORAGE, BINARY_STORAGE = 'pickle', 'binary'
+DEFAULT_BLOCK_SIZE = 65536
+
+
 def data_to_bytes(data):
     if isinstance(data, numpy.ndarray):
         return data.dumps()
@@ -35,10 +39,54 @@ def data_from_bytes(data, shape=None, dtype=None):
     except cPickle.UnpicklingError:
         return float(data)
 
+def data_from_list(data, shape=None, dtype=None):
+    """Decode a list of Redis values into one (npoints,)+shape array"""
+    shape = tuple(shape)
+    if not shape:
+        # 0D points are stored as text
+        try:
+            return numpy.array(data, dtype=numpy.float64).astype(dtype, copy=False)
+        except (ValueError, TypeError):
+            pass
+    a = numpy.empty((len(data),)+shape, dtype=dtype)
+    for i, x in enumerate(data):
+        a[i] = data_from_bytes(x)
+    return a
+
+def data_from_chunks(chunks, shape=None, dtype=None, first=0, last=None):
+    """Decode raw binary chunks into one (npoints,)+shape array
+
+    The chunks are concatenated once and decoded with numpy.frombuffer,
+    so the returned array is a read-only view on the joined buffer.
+    **first** and **last** are point indexes relative to the first chunk.
+    """
+    if not chunks:
+        return numpy.empty((0,)+tuple(shape), dtype=dtype)
+    a = numpy.frombuffer(''.join(chunks), dtype=dtype)
+    a.shape = (-1,)+tuple(shape)
+    return a[first:last]
+
+
 class ChannelDataNode(DataNode):
+    """
+    Data node for an acquisition channel.
+
+    Two storage modes are available, chosen when the node is created
+    (*storage* keyword argument, saved in the node info):
+
+    - 'pickle' (default): one Redis list element per point, numpy
+      arrays are pickled
+    - 'binary': each stored block of points is pushed as one raw,
+      contiguous bytes chunk in {db_name}_data, while {db_name}_data_index
+      holds the cumulative number of points at the end of each chunk.
+      dtype and shape are taken from the node info.
+    """
+    default_storage = PICKLE_STORAGE
+
     def __init__(self, name, **keys):
         shape = keys.pop('shape', None)
         dtype = keys.pop('dtype', None)
+        storage = keys.pop('storage', None)
 
         DataNode.__init__(self, 'channel', name, **keys)
     
@@ -47,30 +95,164 @@ class ChannelDataNode(DataNode):
                 self.info["shape"] = shape
             if dtype is not None:
                 self.info["dtype"] = dtype
+            storage = storage or self.default_storage
+            if storage not in (PICKLE_STORAGE, BINARY_STORAGE):
+                raise ValueError("Unknown channel storage '%s`" % storage)
+            self.info["storage"] = storage
+            self._nb_points = 0
+        else:
+            self._nb_points = None
+
+        self._storage = storage
+        self._shape = tuple(shape) if shape is not None else None
+        self._dtype = dtype
 
         cnx = self.db_connection
         self._queue = QueueSetting("%s_data" % self.db_name, connection=cnx,
                                    read_type_conversion=functools.partial(data_from_bytes, shape=shape, dtype=dtype),
                                    write_type_conversion=data_to_bytes)
+        self._index = QueueSetting("%s_data_index" % self.db_name, connection=cnx,
+                                   read_type_conversion=int)
+
+    @property
+    def storage(self):
+        if self._storage is None:
+            self._storage = self.info.get("storage") or PICKLE_STORAGE
+        return self._storage
+
+    def _get_format(self):
+        if self._shape is None:
+            self._shape = tuple(self.shape or ())
+        if self._dtype is None:
+            self._dtype = self.dtype
+        return self._shape, numpy.dtype(self._dtype)
 
     def store(self, signal, event_dict, cnx=None):
         if signal == "new_data":
             data = event_dict.get("data")
             channel = event_dict.get("channel")
-            if len(channel.shape) == data.ndim:
-                self._queue.append(data, cnx=cnx)
+            if self._nb_points is None:
+                self._nb_points = len(self)
+            first_index = self._nb_points
+
+            pipeline = self.db_connection.pipeline() if cnx is None else cnx
+            if self.storage == BINARY_STORAGE:
+                self._store_block(data, cnx=pipeline)
+            elif len(channel.shape) == data.ndim:
+                self._queue.append(data, cnx=pipeline)
+                self._nb_points += 1
             else:
-                self._queue.extend(data, cnx=cnx)
+                self._queue.extend(data, cnx=pipeline)
+                self._nb_points += len(data)
+            if self._nb_points > first_index:
+                self._publish_event('data', cnx=pipeline,
+                                    first=first_index, last=self._nb_points)
+            if cnx is None:
+                pipeline.execute()
+
+    def _store_block(self, data, cnx):
+        shape, dtype = self._get_format()
+        data = numpy.ascontiguousarray(data, dtype=dtype)
+        data = data.reshape((-1,)+shape)
+        if not len(data):
+            return
+        self._nb_points += len(data)
+        self._queue.append(data.tostring(), cnx=cnx)
+        self._index.append(self._nb_points, cnx=cnx)
 
     def get(self, from_index, to_index=None, cnx=None):
+        if self.storage == BINARY_STORAGE:
+            return self._get_block(from_index, to_index, cnx=cnx)
         if to_index is None:
             return self._queue.get(from_index, from_index, cnx=cnx)
         else:
             return self._queue.get(from_index, to_index, cnx=cnx)
 
+    def _get_block(self, from_index, to_index=None, cnx=None):
+        shape, dtype = self._get_format()
+        single_point = to_index is None
+        if single_point:
+            to_index = from_index + 1
+        elif to_index == -1:
+            to_index = None
+
+        if isinstance(cnx, redis.client.Pipeline):
+            # only one command can be queued: all chunks are read
+            # and the point range is selected at decoding time
+            self._queue.get(0, -1, cnx=cnx)
+            return functools.partial(data_from_chunks, shape=shape, dtype=dtype,
+                                     first=from_index, last=to_index)
+        if cnx is None:
+            cnx = self.db_connection
+
+        if from_index == 0 and to_index is None:
+            chunks = cnx.lrange(self._queue._name, 0, -1)
+            return data_from_chunks(chunks, shape, dtype)
+
+        index = numpy.array(self._index.get(0, -1, cnx=cnx), dtype=numpy.int64)
+        if to_index is None:
+            to_index = index[-1] if len(index) else 0
+        if from_index >= to_index:
+            if single_point:
+                return None
+            return numpy.empty((0,)+shape, dtype=dtype)
+
+        first_chunk = numpy.searchsorted(index, from_index, side='right')
+        last_chunk = numpy.searchsorted(index, to_index - 1, side='right')
+        chunks = cnx.lrange(self._queue._name, first_chunk, last_chunk)
+        first_point = index[first_chunk - 1] if first_chunk > 0 else 0
+        data = data_from_chunks(chunks, shape, dtype,
+                                from_index - first_point, to_index - first_point)
+        if single_point:
+            return data[0] if len(data) else None
+        return data
+
+    def iter_blocks(self, first=0, last=None, block_size=DEFAULT_BLOCK_SIZE,
+                    cnx=None):
+        """
+        Iterate over the channel data by blocks of points
+
+        Yield (index of the first point of the block, numpy array) for the
+        points from **first** to **last** (excluded, None for all).
+        Binary chunks are never split, so a block can be bigger than
+        **block_size** when a chunk is.
+        """
+        if cnx is None:
+            cnx = self.db_connection
+        shape, dtype = self._get_format()
+        if self.storage == BINARY_STORAGE:
+            index = numpy.array(self._index.get(0, -1, cnx=cnx), dtype=numpy.int64)
+            nb_points = index[-1] if len(index) else 0
+            last = nb_points if last is None else min(last, nb_points)
+            while first < last:
+                chunk = numpy.searchsorted(index, first, side='right')
+                chunk_start = index[chunk - 1] if chunk > 0 else 0
+                end = min(last, max(first + block_size, index[chunk]))
+                last_chunk = numpy.searchsorted(index, end - 1, side='right')
+                chunks = cnx.lrange(self._queue._name, chunk, last_chunk)
+                yield first, data_from_chunks(chunks, shape, dtype,
+                                              first - chunk_start, end - chunk_start)
+                first = end
+        else:
+            nb_points = self.__len__(cnx=cnx)
+            last = nb_points if last is None else min(last, nb_points)
+            for start in xrange(first, last, block_size):
+                end = min(last, start + block_size)
+                raw = cnx.lrange(self._queue._name, start, end - 1)
+                yield start, data_from_list(raw, shape, dtype)
+
     def __len__(self, cnx=None):
+        if self.storage == BINARY_STORAGE:
+            if cnx is None:
+                cnx = self.db_connection
+            nb_points = cnx.lindex(self._index._name, -1)
+            return int(nb_points) if nb_points is not None else 0
         return self._queue.__len__(cnx=cnx)
 
+    def get_reader(self, from_index=0):
+        """Return a reader which returns the new points at each read"""
+        return ChannelDataNodeReader(self, from_index)
+
     @property
     def shape(self):
         return self.info.get("shape")
@@ -82,5 +264,96 @@ class ChannelDataNode(DataNode):
     def _get_db_names(self):
         db_names = DataNode._get_db_names(self)
         db_names.append(self.db_name+"_data")
+        db_names.append(self.db_name+"_data_index")
         return db_names
 
+
+class ChannelDataNodeReader(object):
+    """
+    Incremental reader of a channel data node.
+
+    The reader keeps a cursor on the channel data: each :meth:`read`
+    returns, as one numpy array, all the points published since the
+    previous call, in one Redis round trip. Use :func:`read_channels`
+    to read many channels in one pipeline.
+    """
+
+    def __init__(self, node, from_index=0):
+        self._node = node
+        self._index = from_index
+        self._chunk_index = 0 if from_index == 0 else None
+        self._skip = 0
+
+    @property
+    def node(self):
+        return self._node
+
+    @property
+    def index(self):
+        """index of the next point to read"""
+        return self._index
+
+    def _locate_chunk(self, cnx):
+        # binary storage: find the chunk holding the first point to read
+        index = numpy.array(self._node._index.get(0, -1, cnx=cnx), dtype=numpy.int64)
+        chunk_index = numpy.searchsorted(index, self._index, side='right')
+        first_point = index[chunk_index - 1] if chunk_index > 0 else 0
+        self._chunk_index = int(chunk_index)
+        self._skip = self._index - first_point
+
+    def _queue_read(self, pipeline):
+        """queue the read commands, return the number of queued commands"""
+        node = self._node
+        if node.storage == BINARY_STORAGE:
+            if self._chunk_index is None:
+                self._locate_chunk(node.db_connection)
+            pipeline.lrange(node._index._name, self._chunk_index, -1)
+            pipeline.lrange(node._queue._name, self._chunk_index, -1)
+            return 2
+        pipeline.lrange(node._queue._name, self._index, -1)
+        return 1
+
+    def _decode(self, replies):
+        shape, dtype = self._node._get_format()
+        if self._node.storage == BINARY_STORAGE:
+            index, chunks = replies
+            # only take the chunks which are already indexed
+            nb_chunks = min(len(index), len(chunks))
+            chunks_data = data_from_chunks(chunks[:nb_chunks], shape, dtype)
+            data = chunks_data[self._skip:]
+            self._chunk_index += nb_chunks
+            self._skip = max(0, self._skip - len(chunks_data))
+        else:
+            data = data_from_list(replies[0], shape, dtype)
+        self._index += len(data)
+        return data
+
+    def read(self, cnx=None):
+        """Return the new points as a (npoints,)+shape numpy array"""
+        if cnx is None:
+            cnx = self._node.db_connection
+        pipeline = cnx.pipeline()
+        self._queue_read(pipeline)
+        return self._decode(pipeline.execute())
+
+
+def read_channels(readers, cnx=None):
+    """
+    Read the new points of several channel readers in one Redis pipeline.
+
+    Return the list of numpy arrays, in the order of the **readers**.
+    """
+    readers = list(readers)
+    if not readers:
+        return []
+    if cnx is None:
+        cnx = readers[0].node.db_connection
+    pipeline = cnx.pipeline()
+    nb_replies = [reader._queue_read(pipeline) for reader in readers]
+    replies = pipeline.execute()
+    result = list()
+    first = 0
+    for reader, nb in zip(readers, nb_replies):
+        result.append(reader._decode(replies[first:first+nb]))
+        first += nb
+    return result
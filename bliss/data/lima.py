@@ -6,9 +6,12 @@
 # Distributed under the GNU LGPLv3. See LICENSE for more info.
 
 import os
+import re
 import struct
 import math
 import weakref
+import itertools
+import collections
 import numpy
 import gevent
 from bliss.common.tango import DeviceProxy
@@ -25,15 +28,108 @@ except ImportError:
     h5py = None
 
 
+_EDF_DATA_TYPES = {
+    'unsignedbyte': numpy.uint8, 'unsignedchar': numpy.uint8,
+    'signedbyte': numpy.int8, 'signedchar': numpy.int8,
+    'unsignedshort': numpy.uint16, 'signedshort': numpy.int16,
+    'unsignedinteger': numpy.uint32, 'unsignedlong': numpy.uint32,
+    'signedinteger': numpy.int32, 'signedlong': numpy.int32,
+    'unsigned64': numpy.uint64, 'signed64': numpy.int64,
+    'floatvalue': numpy.float32, 'float': numpy.float32,
+    'doublevalue': numpy.float64, 'double': numpy.float64,
+}
+
+_EDF_HEADER_ITEM = re.compile(r'\s*([^=;]+?)\s*=\s*([^;]*?)\s*;')
+
+
+def edf_frames(filename):
+    """
+    Parse the headers of an uncompressed EDF file.
+
+    Returns:
+        a list of (data offset, dtype, shape) for each frame of the file
+    """
+    frames = []
+    with open(filename, 'rb') as f:
+        offset = 0
+        while True:
+            f.seek(offset)
+            header = ''
+            while '}' not in header:
+                block = f.read(512)
+                if not block:
+                    return frames
+                header += block
+            end = header.index('}') + 1
+            if header[end:end + 1] == '\n':
+                end += 1
+            start = header.index('{') + 1
+            items = dict((key.lower(), value) for key, value in
+                         _EDF_HEADER_ITEM.findall(header[start:end]))
+            if items.get('compression', 'none').lower() not in ('none', ''):
+                raise ValueError('%s: compressed EDF frames' % filename)
+            dtype = numpy.dtype(_EDF_DATA_TYPES[items['datatype'].lower()])
+            if items.get('byteorder', 'LowByteFirst') == 'HighByteFirst':
+                dtype = dtype.newbyteorder('>')
+            else:
+                dtype = dtype.newbyteorder('<')
+            shape = int(items['dim_2']), int(items['dim_1'])
+            size = int(items['size'])
+            frames.append((offset + end, dtype, shape))
+            offset += end + size
+
+
+class _FileCache(object):
+    """
+    LRU of open image files
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._files = collections.OrderedDict()
+
+    def get(self, filename, opener):
+        f = self._files.pop(filename, None)
+        if f is None:
+            f = opener(filename)
+            while len(self._files) >= self.max_size:
+                self._close(self._files.popitem(last=False)[1])
+        self._files[filename] = f
+        return f
+
+    def discard(self, filename):
+        f = self._files.pop(filename, None)
+        if f is not None:
+            self._close(f)
+
+    def clear(self):
+        while self._files:
+            self._close(self._files.popitem()[1])
+
+    @staticmethod
+    def _close(f):
+        close = getattr(f, 'close', None)
+        if close is not None:
+            close()
+
+
 class LimaImageChannelDataNode(DataNode):
     class _GetView(object):
         DataArrayMagic = struct.unpack('>I', 'DTAY')[0]
 
+        #: number of images fetched at once
+        batch_size = 32
+        #: fetch the next batch of images while the current one is consumed
+        read_ahead = True
+        #: max. number of image files kept open
+        max_open_files = 16
+
         def __init__(self, data, from_index, to_index):
             self.data = data
             self._update()
             self.from_index = from_index
             self.to_index = to_index
+            self._files = _FileCache(self.max_open_files)
             self._image_mode = {
                 0: numpy.uint8,
                 1: numpy.uint16,
@@ -73,13 +169,107 @@ class LimaImageChannelDataNode(DataNode):
                 proxy = DeviceProxy(self.server_url) if self.server_url else None
             except Exception:
                 proxy = None
-            for image_nb in range(self.from_index, self.last_index):
-                data = self._get_from_server_memory(proxy, image_nb)
-                if data is None:
-                    yield self._get_from_file(image_nb)
-                else:
-                    yield data
-                self._update()
+            image_nb = self.from_index
+            next_batch = None
+            try:
+                while image_nb < self.last_index:
+                    images = None
+                    if next_batch is not None:
+                        images = next_batch.get()
+                        next_batch = None
+                    if images is None:
+                        images = self._get_images(proxy, image_nb)
+                    if not len(images):
+                        raise RuntimeError("Can't retrieve image %d" % image_nb)
+                    image_nb += len(images)
+                    self._update()
+                    if self.read_ahead and image_nb < self.last_index:
+                        next_batch = gevent.spawn(self._read_ahead, proxy,
+                                                  image_nb)
+                    for image in images:
+                        yield image
+            finally:
+                if next_batch is not None:
+                    next_batch.kill()
+
+        def as_array(self):
+            """
+            Return the images of the view stacked in a 3D numpy array
+            """
+            nb_images = self.last_index - self.from_index
+            result = None
+            i = -1
+            images = iter(self)
+            try:
+                for i, image in enumerate(itertools.islice(images, nb_images)):
+                    if result is None:
+                        result = numpy.empty((nb_images,) + image.shape,
+                                             dtype=image.dtype)
+                    result[i] = image
+            finally:
+                images.close()
+            if result is None:
+                return numpy.empty((0, 0, 0))
+            return result[:i + 1]
+
+        def memmap(self):
+            """
+            Return a memory mapped 3D numpy array of the images of the view.
+
+            The images must be saved in the same uncompressed EDF file.
+            """
+            self._update()
+            image_nbs = range(self.from_index, self.last_index)
+            if not image_nbs:
+                raise RuntimeError('No image in view')
+            files = self._get_filenames(self.ref_data[0], *image_nbs)
+            filenames = set(values[0] for values in files)
+            file_formats = set(values[3] for values in files)
+            if len(filenames) > 1 or file_formats != set(['EDF']):
+                raise RuntimeError('Images are not in a single uncompressed '
+                                   'EDF file')
+            filename = files[0][0]
+            first, last = files[0][2], files[-1][2]
+            frames = edf_frames(filename)[first:last + 1]
+            if len(frames) != len(image_nbs):
+                raise RuntimeError('Image %d was not saved' % image_nbs[-1])
+            offset, dtype, shape = frames[0]
+            stride = frames[1][0] - offset if len(frames) > 1 else 0
+            for i, (frame_offset, frame_dtype, frame_shape) in \
+                    enumerate(frames):
+                if (frame_offset, frame_dtype, frame_shape) != \
+                   (offset + i * stride, dtype, shape):
+                    raise RuntimeError('EDF frames of %s are not evenly '
+                                       'spaced' % filename)
+            mapped = numpy.memmap(filename, dtype=numpy.uint8, mode='r')
+            return numpy.ndarray((len(frames),) + shape, dtype=dtype,
+                                 buffer=mapped, offset=offset,
+                                 strides=(stride, shape[1] * dtype.itemsize,
+                                          dtype.itemsize))
+
+        def close(self):
+            """
+            Close the image files kept open by the view
+            """
+            self._files.clear()
+
+        def _get_images(self, proxy, first):
+            """
+            Return the next batch of images from **first**, from the server
+            memory if they are still there, from the files otherwise
+            """
+            last = min(first + self.batch_size, self.last_index)
+            images = self._get_from_server_memory(proxy, first, last)
+            if images is None:
+                images = self._get_from_file(first, last)
+            return images
+
+        def _read_ahead(self, proxy, first):
+            try:
+                return self._get_images(proxy, first)
+            except Exception:
+                # may be fetched too early: fetched again when needed
+                return None
 
         def __len__(self):
             self._update()
@@ -93,23 +283,36 @@ class LimaImageChannelDataNode(DataNode):
                  'last_image_ready', 'last_counter_ready', 'last_image_saved'):
                 setattr(self, key, ref_status[key])
 
-        def _get_from_server_memory(self, proxy, image_nb):
+        def _get_from_server_memory(self, proxy, first, last):
             if not proxy:
                 return None
 
             if self.current_lima_acq == self.lima_acq_nb:  # current acquisition is this one
-                if self.last_image_ready < image_nb:      # image not yet available
+                if self.last_image_ready < first:      # image not yet available
                     raise RuntimeError('image is not available yet')
+                last = min(last, self.last_image_ready + 1)
                 # should be in memory
-                if self.buffer_max_number > (self.last_image_ready - image_nb):
-                    try:
-                        raw_msg = proxy.readImage(image_nb)
-                    except Exception:
-                        # As it's asynchronous, image seams to be no
-                        # more available so read it from file
-                        return None
-                    else:
-                        return self._tango_unpack(raw_msg[-1])
+                if self.buffer_max_number > (self.last_image_ready - first):
+                    if last - first > 1:
+                        try:
+                            raw_msg = proxy.readImageSeq([first, last])
+                            images = self._tango_unpack(raw_msg[-1])
+                        except Exception:
+                            pass
+                        else:
+                            if images.ndim == 3 and len(images) == last - first:
+                                return images
+                    images = []
+                    for image_nb in range(first, last):
+                        try:
+                            raw_msg = proxy.readImage(image_nb)
+                        except Exception:
+                            # As it's asynchronous, image seams to be no
+                            # more available so read it from file
+                            break
+                        else:
+                            images.append(self._tango_unpack(raw_msg[-1]))
+                    return images or None
 
         def _get_filenames(self, ref_data, *image_nbs):
             saving_mode = ref_data.get('saving_mode', 'MANUAL')
@@ -136,7 +339,7 @@ class LimaImageChannelDataNode(DataNode):
                     raise RuntimeError("Image %d was not saved" % image_nb)
 
                 image_index_in_file = image_nb % nb_image_per_file
-                file_nb = first_file_number + image_index_in_file
+                file_nb = first_file_number + image_nb // nb_image_per_file
                 file_path = path_format % file_nb
                 if file_format == 'HDF5':
                     returned_params.append((file_path, "/entry_%04d" % 1,
@@ -146,30 +349,63 @@ class LimaImageChannelDataNode(DataNode):
                                             image_index_in_file, file_format))
             return returned_params
 
-        def _get_from_file(self, image_nb):
+        def _get_from_file(self, first, last):
             for ref_data in self.ref_data:
-                values = self._get_filenames(ref_data, image_nb)
-                filename, path_in_file, image_index, file_format = values[0]
-
-                if file_format in ('EDF', 'EDFGZ', 'EDFConcat'):
-                    if file_format == 'EDFConcat':
-                        image_index = 0
-                    if EdfFile is not None:
-                        f = EdfFile.EdfFile(filename)
-                        return f.GetData(image_index)
-                    else:
-                        raise RuntimeError("EdfFile module is not available, "
-                                           "cannot return image data.")
-                elif file_format == 'HDF5':
-                    if h5py is not None:
-                        with h5py.File(filename) as f:
-                            dataset = f[path_in_file]
-                            return dataset[image_index]
-                else:
-                    raise RuntimeError("Format net yet managed")
+                if first > self.last_image_saved:
+                    raise RuntimeError("Image %d was not saved" % first)
+                last = min(last, self.last_image_saved + 1)
+                values = self._get_filenames(ref_data, *range(first, last))
+                images = []
+                # images of the same file are read together
+                for (filename, path_in_file, file_format), group in \
+                        itertools.groupby(values, lambda v: (v[0], v[1], v[3])):
+                    image_indexes = [v[2] for v in group]
+                    images.extend(self._read_file(filename, path_in_file,
+                                                  file_format, image_indexes))
+                return images
             else:
                 raise RuntimeError(
-                    "Can't retrieved image %d from file" % image_nb)
+                    "Can't retrieved image %d from file" % first)
+
+        def _read_file(self, filename, path_in_file, file_format,
+                       image_indexes):
+            if file_format in ('EDF', 'EDFGZ', 'EDFConcat'):
+                if file_format == 'EDFConcat':
+                    image_indexes = [0] * len(image_indexes)
+                if EdfFile is None:
+                    raise RuntimeError("EdfFile module is not available, "
+                                       "cannot return image data.")
+                try:
+                    f = self._files.get(filename, EdfFile.EdfFile)
+                    return [f.GetData(index) for index in image_indexes]
+                except Exception:
+                    # the file may have grown since it was opened
+                    self._files.discard(filename)
+                    f = self._files.get(filename, EdfFile.EdfFile)
+                    return [f.GetData(index) for index in image_indexes]
+            elif file_format == 'HDF5':
+                if h5py is None:
+                    raise RuntimeError("h5py module is not available, "
+                                       "cannot return image data.")
+                open_file = lambda filename: h5py.File(filename, 'r')
+                f = self._files.get(filename, open_file)
+                try:
+                    dataset = f[path_in_file]
+                    complete = len(dataset) > max(image_indexes)
+                except KeyError:
+                    complete = False
+                if not complete:
+                    # the file is still written (no SWMR): a file opened
+                    # before doesn't see the last images
+                    self._files.discard(filename)
+                    f = self._files.get(filename, open_file)
+                    dataset = f[path_in_file]
+                first, last = image_indexes[0], image_indexes[-1] + 1
+                if image_indexes == range(first, last):
+                    return dataset[first:last]
+                return [dataset[index] for index in image_indexes]
+            else:
+                raise RuntimeError("Format net yet managed")
 
         def _tango_unpack(self, msg):
             struct_format = '<IHHIIHHHHHHHHHHHHHHHHHHIII'
@@ -180,7 +416,9 @@ class LimaImageChannelDataNode(DataNode):
             header_offset = values[2]
             data = numpy.fromstring(
                 msg[header_offset:], dtype=self._image_mode.get(values[4]))
-            data.shape = values[8], values[7]
+            # image (2 dimensions) or sequence of images (3 dimensions)
+            nb_dim = values[6]
+            data.shape = tuple(reversed(values[7:7 + nb_dim]))
             return data
 
     class MergeB4Store(object):
@@ -216,6 +454,7 @@ class LimaImageChannelDataNode(DataNode):
                     ref_data = self._cnt.data[0]
                     ref_data.update(local_dict)
                     self._cnt.data[0] = ref_data
+                    self._cnt._publish_event('data')
                 if self._stop_flag:
                     break
                 gevent.idle()
@@ -273,6 +512,7 @@ class LimaImageChannelDataNode(DataNode):
             ref_data['lima_acq_nb'] = self.db_connection.incr(data['server_url'])
             self.data.append(ref_data)
             self.add_reference_data(desc)
+            self._publish_event('data')
         else:
             self._merge_store.update_status(data)
             
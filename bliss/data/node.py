@@ -21,10 +21,19 @@ A data node has 3 Redis keys to represent it:
 {db_name} -> Struct { name, db_name, node_type, parent=(parent db_name) }
 {db_name}_info -> HashObjSetting, free dictionary
 {db_name}_children -> QueueSetting, list of db names
+{db_name}_events -> Redis stream of the events of this node and of all
+                    the nodes below it, except the data events which only
+                    go to the streams of the channel and of its scan
+                    (see DataNodeIterator)
 
 The channel data node extends the structure above with:
 
-{db_name}_channel -> QueueSetting, list of channel values
+{db_name}_data -> QueueSetting, list of channel values
+
+or, when the channel node is created with the 'binary' storage:
+
+{db_name}_data -> QueueSetting, list of raw numpy blocks (dtype and shape in info)
+{db_name}_data_index -> QueueSetting, cumulative number of points after each block
 
 When a Lima channel is published:
 
@@ -41,7 +50,6 @@ When a Lima channel is published:
 """
 import pkgutil
 import inspect
-import re
 import datetime
 import os
 
@@ -111,14 +119,48 @@ def _get_or_create_node(name, node_type=None, parent=None, connection=None, **ke
         return _create_node(name, node_type, parent, connection, **keys)
 
 
+def _stream_id_key(event_id):
+    """Sort key of a Redis stream id (<milliseconds>-<sequence>)"""
+    return tuple(int(x) for x in event_id.split('-'))
+
+
+def _stream_entries(reply):
+    """Normalize a XREAD/XRANGE reply to a list of (id, fields dict)"""
+    entries = list()
+    for event_id, fields in reply or ():
+        if not isinstance(fields, dict):
+            fields = dict(zip(fields[::2], fields[1::2]))
+        entries.append((event_id, fields))
+    return entries
+
+
 class DataNodeIterator(object):
-    NEW_CHILD_REGEX = re.compile("^__keyspace@.*?:(.*)_children_list$")
-    NEW_DATA_IN_CHANNEL_REGEX = re.compile("^__keyspace@.*?:(.*)_data$")
-    NEW_CHILD_EVENT, NEW_DATA_IN_CHANNEL_EVENT = range(2)
+    """
+    Walk a data node tree and follow its events.
+
+    Events are read from the Redis stream of the walked node
+    ({db_name}_events), which receives the events of all the nodes
+    below it. Data events are only in the streams of the channel and of
+    its scan: the streams of the scans below the walked node (the running
+    ones when walking, the new ones when following) are read too.
+    Each event carries the node db_name and type (and the
+    index range of new data), so no node lookup is needed per event.
+    END_SCAN_EVENT is yielded, whatever the filter, when a scan
+    below the walked node ends.
+    The stream position of the last consumed event is kept in
+    **last_event_id**; it can be given back to :meth:`walk_events`
+    to resume from there.
+    """
+    NEW_CHILD_EVENT, NEW_DATA_IN_CHANNEL_EVENT, END_SCAN_EVENT = range(3)
 
     def __init__(self, node, last_child_id=None):
         self.node = node
         self.last_child_id = dict() if last_child_id is None else last_child_id
+        self.last_event_id = None
+        self.last_event = None
+        self._nodes = dict()
+        # followed scan streams -> last read id
+        self._scan_streams = dict()
 
     def walk(self, filter=None, wait=True):
         """Iterate over child nodes that match the `filter` argument
@@ -134,10 +176,11 @@ class DataNodeIterator(object):
             filter = tuple(filter)
 
         if wait:
-            pubsub = self.children_event_register()
+            event_id = self.children_event_register()
 
         db_name = self.node.db_name
         self.last_child_id[db_name] = 0
+        self._nodes[db_name] = self.node
 
         if filter is None or self.node.type in filter:
             yield self.node
@@ -146,20 +189,21 @@ class DataNodeIterator(object):
             for i, child in enumerate(self.node.children()):
                 iterator = DataNodeIterator(
                     child, last_child_id=self.last_child_id)
+                iterator._nodes = self._nodes
                 for n in iterator.walk(filter, wait=False):
                     self.last_child_id[db_name] = i + 1
                     if filter is None or n.type in filter:
                         yield n
         if wait:
-            # yield from self.wait_for_event(pubsub)
-            for event_type, value in self.wait_for_event(pubsub, filter):
+            # yield from self.wait_for_event(event_id)
+            for event_type, value in self.wait_for_event(event_id, filter):
                 if event_type is self.NEW_CHILD_EVENT:
                     yield value
 
     def walk_from_last(self, filter=None, wait=True):
         """Walk from the last child node (see walk)
         """
-        pubsub = self.children_event_register()
+        event_id = self.children_event_register()
         last_node = None
         for last_node in self.walk(filter, wait=False):
             pass
@@ -168,72 +212,173 @@ class DataNodeIterator(object):
             yield last_node
 
         if wait:
-            for event_type, node in self.wait_for_event(pubsub, filter=filter):
+            for event_type, node in self.wait_for_event(event_id, filter=filter):
                 if event_type is self.NEW_CHILD_EVENT:
                     yield node
 
-    def walk_events(self, filter=None):
+    def walk_events(self, filter=None, from_id=None):
         """Walk through child nodes, just like `walk` function, yielding node events
         (like NEW_CHILD_EVENT or NEW_DATA_IN_CHANNEL_EVENT) instead of node objects
+
+        If **from_id** is given (i.e a previous **last_event_id**, or '0'
+        for all the events), existing nodes are not walked and events are
+        replayed from this stream position, including the data events of
+        the scans which were running at this position.
         """
-        pubsub = self.children_event_register()
+        if from_id is None:
+            event_id = self.children_event_register()
 
-        for node in self.walk(filter, wait=False):
-            yield self.NEW_CHILD_EVENT, node
+            for node in self.walk(filter, wait=False):
+                yield self.NEW_CHILD_EVENT, node
+        else:
+            event_id = from_id
+            # the data events of the scans running at from_id are in
+            # their own streams
+            scans = DataNodeIterator(self.node).walk(filter='scan', wait=False)
+            self._follow_running_scans(scans, from_id)
 
-        for event_type, event_data in self.wait_for_event(pubsub, filter=filter):
+        for event_type, event_data in self.wait_for_event(event_id, filter=filter):
             yield event_type, event_data
 
     def children_event_register(self):
+        """Return the current position in the node events stream"""
+        scan_stream = self.node._get_scan_event_stream()
+        if scan_stream not in (None, self.node._event_stream_name) and \
+           isinstance(self.node, DataNodeContainer):
+            # data events of the channels below are in the scan stream
+            self._scan_streams[scan_stream] = self._last_id(scan_stream)
+        return self._last_id(self.node._event_stream_name)
+
+    def _last_id(self, stream_name, count=1):
+        redis = self.node.db_connection
+        last = redis.execute_command('XREVRANGE', stream_name,
+                                     '+', '-', 'COUNT', count)
+        entries = _stream_entries(last)
+        return entries[0][0] if entries else '0'
+
+    def _follow_running_scans(self, nodes, from_id=None):
+        """Follow the data events of the scans among **nodes** which are
+        running, or which were running at stream position **from_id**"""
+        if self.node._get_scan_event_stream() is not None:
+            return
+        redis = self.node.db_connection
+        for node in nodes:
+            stream_name = node._event_stream_name
+            if node._node_type != 'scan' or stream_name in self._scan_streams:
+                continue
+            # 'end' is the last event of a scan, or is followed by 'written'
+            last = _stream_entries(redis.execute_command(
+                'XREVRANGE', stream_name, '+', '-', 'COUNT', 2))
+            end_ids = [event_id for event_id, event in last
+                       if event.get('event') == 'end']
+            if from_id is None:
+                if end_ids:
+                    continue
+                self._scan_streams[stream_name] = last[0][0] if last else '0'
+            else:
+                if end_ids and _stream_id_key(end_ids[0]) <= _stream_id_key(from_id):
+                    continue
+                # stream ids are timestamps: same position in all streams
+                self._scan_streams[stream_name] = from_id
+
+    def _read_all_events(self, event_id):
+        """Read the events of the node stream after **event_id** and the
+        data events of the followed scan streams, ordered by stream id
+
+        Return a list of (stream name, event id, event)
+        """
         redis = self.node.db_connection
-        pubsub = redis.pubsub()
-        pubsub.psubscribe("__keyspace@1__:%s*_children_list" %
-                          self.node.db_name)
-        pubsub.psubscribe("__keyspace@1__:%s*_data" % self.node.db_name)
-        pubsub.psubscribe("__keyspace@1__:%s*_ref" % self.node.db_name)
-        return pubsub
-
-    def wait_for_event(self, pubsub, filter=None):
+        own_stream = self.node._event_stream_name
+        streams = [own_stream] + self._scan_streams.keys()
+        ids = [event_id] + self._scan_streams.values()
+        reply = redis.execute_command('XREAD', 'BLOCK', 0,
+                                      'STREAMS', *(streams + ids))
+        prefix = self.node.db_name + ':'
+        entries = list()
+        for stream_name, stream_entries in reply or ():
+            for entry_id, event in _stream_entries(stream_entries):
+                if stream_name != own_stream:
+                    self._scan_streams[stream_name] = entry_id
+                    if event.get('event') != 'data' or \
+                       not event.get('db_name', '').startswith(prefix):
+                        continue
+                entries.append((stream_name, entry_id, event))
+        entries.sort(key=lambda entry: _stream_id_key(entry[1]))
+        return entries
+
+    def read_events(self, event_id, block=None, count=None):
+        """Read the events published after **event_id**
+
+        block -- wait at most this time (in seconds) for new events,
+        0 means forever and None means no wait
+        count -- maximum number of events to return
+        """
+        redis = self.node.db_connection
+        args = ['XREAD']
+        if count is not None:
+            args += ['COUNT', count]
+        if block is not None:
+            args += ['BLOCK', int(block * 1000)]
+        args += ['STREAMS', self.node._event_stream_name, event_id]
+        reply = redis.execute_command(*args)
+        entries = list()
+        for stream_name, stream_entries in reply or ():
+            entries.extend(_stream_entries(stream_entries))
+        return entries
+
+    def _event_node(self, event):
+        db_name = event['db_name']
+        node = self._nodes.get(db_name)
+        if node is None:
+            node = _get_node_object(event['node_type'], db_name, None,
+                                    self.node.db_connection)
+            self._nodes[db_name] = node
+        return node
+
+    def wait_for_event(self, event_id, filter=None):
         if isinstance(filter, (str, unicode)):
             filter = (filter, )
         elif filter:
             filter = tuple(filter)
 
-        for msg in pubsub.listen():
-            if msg['data'] == 'rpush':
-                channel = msg['channel']
-                new_child_event = DataNodeIterator.NEW_CHILD_REGEX.match(
-                    channel)
-                if new_child_event:
-                    parent_db_name = new_child_event.groups()[0]
-                    parent_node = get_node(parent_db_name)
-                    first_child = self.last_child_id.setdefault(
-                        parent_db_name, 0)
-                    for i, child in enumerate(parent_node.children(first_child, -1)):
-                        self.last_child_id[parent_db_name] = first_child + i + 1
-                        if filter is None or child.type in filter:
-                            yield self.NEW_CHILD_EVENT, child
-                        if child.type in ('channel', 'lima'):
-                            yield self.NEW_DATA_IN_CHANNEL_EVENT, child
-                else:
-                    new_channel_event = DataNodeIterator.NEW_DATA_IN_CHANNEL_REGEX.match(
-                        channel)
-                    if new_channel_event:
-                        channel_db_name = new_channel_event.group(1)
-                        channel_node = get_node(channel_db_name)
-                        if channel_node and \
-                           (filter is None or channel_node.type in filter):
-                            yield self.NEW_DATA_IN_CHANNEL_EVENT, channel_node
-            elif msg['data'] == 'lset':
-                channel = msg['channel']
-                new_channel_event = DataNodeIterator.\
-                NEW_DATA_IN_CHANNEL_REGEX.match(channel)
-                if new_channel_event:
-                    channel_db_name = new_channel_event.group(1)
-                    channel_node = get_node(channel_db_name)
-                    if channel_node and \
-                       (filter is None or channel_node.type in filter):
+        own_stream = self.node._event_stream_name
+        above_scans = self.node._get_scan_event_stream() is None
+        self._follow_running_scans(self._nodes.values())
+        while True:
+            for stream_name, entry_id, event in self._read_all_events(event_id):
+                if stream_name == own_stream:
+                    event_id = entry_id
+                # events are consumed in stream id order (timestamps):
+                # resuming from it skips exactly the consumed events
+                self.last_event_id = entry_id
+                event['id'] = entry_id
+                self.last_event = event
+                event_name = event['event']
+                if event_name == 'child':
+                    if event['db_name'] in self._nodes:
+                        # already walked
+                        continue
+                    child = self._event_node(event)
+                    if above_scans and event['node_type'] == 'scan':
+                        # data events of the new scan are in its stream
+                        self._scan_streams.setdefault(
+                            '%s_events' % event['db_name'], '0')
+                    parent_db_name = event['parent']
+                    self.last_child_id[parent_db_name] = \
+                        self.last_child_id.get(parent_db_name, 0) + 1
+                    if filter is None or child.type in filter:
+                        yield self.NEW_CHILD_EVENT, child
+                    if child.type in ('channel', 'lima'):
+                        yield self.NEW_DATA_IN_CHANNEL_EVENT, child
+                elif event_name == 'data':
+                    channel_node = self._event_node(event)
+                    if filter is None or channel_node.type in filter:
                         yield self.NEW_DATA_IN_CHANNEL_EVENT, channel_node
+                elif event_name == 'end':
+                    self._scan_streams.pop('%s_events' % event['db_name'],
+                                           None)
+                    # end of scan events are not filtered
+                    yield self.END_SCAN_EVENT, self._event_node(event)
 
 class _TTL_setter(object):
     def __init__(self, db_name):
@@ -252,6 +397,7 @@ class _TTL_setter(object):
 
 class DataNode(object):
     default_time_to_live = 24 * 3600  # 1 day
+    events_stream_maxlen = 100000
 
     @staticmethod
     def exists(name, parent=None, connection=None):
@@ -278,6 +424,16 @@ class DataNode(object):
         self._info = HashObjSetting(info_hash_name,
                                     connection=connection)
         self.db_connection = connection
+        self._db_name = db_name
+        self._node_type = node_type
+        if parent:
+            self._event_streams = parent._get_event_streams() + \
+                [self._event_stream_name]
+            self._scan_event_stream = self._event_stream_name \
+                if node_type == 'scan' else parent._get_scan_event_stream()
+        else:
+            self._event_streams = None
+            self._scan_event_stream = False  # not known yet
 
         if create:
             self._data.name = name
@@ -319,6 +475,57 @@ class DataNode(object):
     def info(self):
         return self._info
 
+    @property
+    def _event_stream_name(self):
+        return '%s_events' % self._db_name
+
+    def _get_event_streams(self):
+        """Name of the events streams of this node and of all its parents"""
+        if self._event_streams is None:
+            parent = self.parent
+            streams = parent._get_event_streams() if parent else []
+            self._event_streams = streams + [self._event_stream_name]
+        return self._event_streams
+
+    def _get_scan_event_stream(self):
+        """Name of the events stream of the scan of this node
+        (None if the node is not in a scan)"""
+        if self._scan_event_stream is False:
+            if self._node_type == 'scan':
+                stream = self._event_stream_name
+            else:
+                parent = self.parent
+                stream = parent._get_scan_event_stream() if parent else None
+            self._scan_event_stream = stream
+        return self._scan_event_stream
+
+    def _publish_event(self, event, cnx=None, **fields):
+        """Add an event to the events stream of this node and of all its
+        parents ('data' events: of this node and of its scan only)
+
+        event -- 'child', 'data', 'end' or 'written'
+        fields -- extra event fields (i.e *first* and *last* point index)
+        """
+        pipeline = self.db_connection.pipeline() if cnx is None else cnx
+        args = ['event', event, 'db_name', self._db_name,
+                'node_type', self._node_type]
+        for key, value in fields.iteritems():
+            args.extend((key, value))
+        if event == 'data':
+            # a data event per tree level would fill the upper streams
+            stream_names = [self._event_stream_name]
+            scan_stream = self._get_scan_event_stream()
+            if scan_stream not in (None, self._event_stream_name):
+                stream_names.append(scan_stream)
+        else:
+            stream_names = self._get_event_streams()
+        for stream_name in stream_names:
+            pipeline.execute_command('XADD', stream_name,
+                                     'MAXLEN', '~', self.events_stream_maxlen,
+                                     '*', *args)
+        if cnx is None:
+            pipeline.execute()
+
     def connect(self, signal, callback):
         dispatcher.connect(callback, signal, self)
 
@@ -332,7 +539,8 @@ class DataNode(object):
         db_name = self.db_name
         children_queue_name = '%s_children_list' % db_name
         info_hash_name = '%s_info' % db_name
-        db_names = [db_name, children_queue_name, info_hash_name]
+        db_names = [db_name, children_queue_name, info_hash_name,
+                    self._event_stream_name]
         parent = self.parent
         if parent:
             db_names.extend(parent._get_db_names())
@@ -349,10 +557,14 @@ class DataNodeContainer(DataNode):
             children_queue_name, connection=connection)
 
     def add_children(self, *child):
+        pipeline = self.db_connection.pipeline()
         if len(child) > 1:
-            self._children.extend([c.db_name for c in child])
+            self._children.extend([c.db_name for c in child], cnx=pipeline)
         else:
-            self._children.append(child[0].db_name)
+            self._children.append(child[0].db_name, cnx=pipeline)
+        for c in child:
+            c._publish_event('child', cnx=pipeline, parent=self.db_name)
+        pipeline.execute()
 
     def children(self, from_id=0, to_id=-1):
         """Iter over children.
@@ -7,10 +7,14 @@
 
 import time
 import datetime
+import tempfile
 import numpy
 import pickle
 
-from bliss.data.node import DataNodeContainer, is_zerod
+from bliss.data.node import DataNodeContainer, DataNodeIterator, is_zerod
+from bliss.data.channel import DEFAULT_BLOCK_SIZE
+
+DEFAULT_MEMMAP_THRESHOLD = 1024 ** 3
 
 
 def _transform_dict_obj(dict_object):
@@ -68,44 +72,61 @@ class Scan(DataNodeContainer):
             self._data.end_time_stamp = end_time_stamp
 
 
-def get_data(scan):
+def _get_channel_nodes(scan):
+    if isinstance(scan, Scan):
+        return list(DataNodeIterator(scan).walk(filter='channel', wait=False))
+    return [node for node in scan.nodes.itervalues() if node.type == 'channel']
+
+
+def get_data(scan, channels=None, first=0, last=None,
+             block_size=DEFAULT_BLOCK_SIZE,
+             memmap_threshold=DEFAULT_MEMMAP_THRESHOLD, memmap_file=None):
     """
     Return a numpy structured arrays
 
     tips: to get the list of channels (data.dtype.names)
           to get datas of a channel data["channel_name"]
 
+    scan -- a scan object or a scan data node
+    channels -- names of the channels to return (default: all)
+    first, last -- range of points to return (last excluded, None for all)
+    block_size -- channels are read from Redis by blocks of this number
+    of points and decoded straight into the returned array
+    memmap_threshold -- when the result is bigger than this number of
+    bytes, it is a numpy.memmap on disk (in **memmap_file** or in a
+    temporary file)
     """
-    dtype = list()
-    chanlist = list()
-    max_channel_len = 0
-    connection = scan.node.db_connection
-    pipeline = connection.pipeline()
-    for device, node in scan.nodes.iteritems():
-        if node.type == 'channel':
-            channel_name = node.name
-            chan = node
-            # append channel name and get all data from channel;
-            # as it is in a Redis pipeline, get returns the
-            # conversion function only - data will be received
-            # after .execute()
-            chanlist.append((channel_name,
-                             chan.get(0, -1, cnx=pipeline)))
-
-    result = pipeline.execute()
+    nodes = _get_channel_nodes(scan)
+    if channels is not None:
+        channels = set(channels)
+        nodes = [node for node in nodes if node.name in channels]
+        missing = channels.difference(node.name for node in nodes)
+        if missing:
+            raise ValueError("Unknown channel(s): %s" % ', '.join(sorted(missing)))
 
     structured_array_dtype = []
-    for i, (channel_name, get_data_func) in enumerate(chanlist):
-        channel_data = get_data_func(result[i])
-        result[i] = channel_data
-        structured_array_dtype.append(
-            (channel_name, channel_data.dtype, channel_data.shape[1:]))
-
-    max_channel_len = max((len(values) for values in result))
-
-    data = numpy.zeros(max_channel_len, dtype=structured_array_dtype)
+    channels_len = []
+    for node in nodes:
+        shape, dtype = node._get_format()
+        structured_array_dtype.append((node.name, dtype, shape))
+        channels_len.append(len(node))
+
+    max_channel_len = max(channels_len) if channels_len else 0
+    if last is None or last > max_channel_len:
+        last = max_channel_len
+    npoints = max(0, last - first)
+
+    dtype = numpy.dtype(structured_array_dtype)
+    if npoints * dtype.itemsize > memmap_threshold:
+        if memmap_file is None:
+            memmap_file = tempfile.NamedTemporaryFile(prefix='bliss_data_')
+        data = numpy.memmap(memmap_file, dtype=dtype, mode='w+', shape=(npoints,))
+    else:
+        data = numpy.zeros(npoints, dtype=dtype)
 
-    for i, (channel_name, _) in enumerate(chanlist):
-        data[channel_name] = result[i]
+    for node in nodes:
+        channel_data = data[node.name]
+        for index, block in node.iter_blocks(first, last, block_size):
+            channel_data[index - first:index - first + len(block)] = block
 
     return data
@@ -59,6 +59,7 @@ class Dataset0D(DataNode):
                     queue.append(data)
                 else:
                     queue.extend(data)
+            self._publish_event('data')
 
     #@brief get data channel object
     def get_channel(self, channel_name=None, check_exists=True, cnx=None):
@@ -34,13 +34,15 @@ class AcquisitionChannelList(list):
 class AcquisitionChannel(object):
 
     def __init__(self, name, dtype, shape,
-                 description=None, reference=False, data_node_type="channel"):
+                 description=None, reference=False, data_node_type="channel",
+                 storage=None):
         self.__name = name
         self.__dtype = dtype
         self.__shape = shape
         self.__reference = reference
         self.__description = {'reference': reference}
         self.__data_node_type = data_node_type
+        self.__storage = storage
 
         if isinstance(description, dict):
             self.__description.update(description)
@@ -87,9 +89,11 @@ class AcquisitionChannel(object):
         dispatcher.send("new_data", self, data_dct)
 
     def data_node(self, parent_node):
+        keys = dict(shape=self.shape, dtype=self.dtype)
+        if self.__storage is not None:
+            keys['storage'] = self.__storage
         return _get_or_create_node(
-            self.name, self.__data_node_type, parent_node,
-            shape=self.shape, dtype=self.dtype)
+            self.name, self.__data_node_type, parent_node, **keys)
 
     def _check_and_reshape(self, data):
         ndim = len(self.shape)
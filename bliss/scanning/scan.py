@@ -5,6 +5,7 @@
 # Copyright (c) 2016 Beamline Control Unit, ESRF
 # Distributed under the GNU LGPLv3. See LICENSE for more info.
 import errno
+import functools
 import getpass
 import gevent
 import os
@@ -14,12 +15,15 @@ import sys
 from treelib import Tree
 import time
 import logging
+import numpy
+import gevent.lock
 
 from bliss.common.event import connect, send
 from bliss.common.utils import periodic_exec
 from bliss.config.conductor import client
 from bliss.config.settings import Parameters, _change_to_obj_marshalling
 from bliss.data.node import _get_or_create_node, _create_node, DataNodeContainer, is_zerod
+from bliss.data.channel import ChannelDataNode, read_channels
 from bliss.common.session import get_current as _current_session
 from .chain import AcquisitionDevice, AcquisitionMaster
 
@@ -38,6 +42,8 @@ class StepScanDataWatch(object):
         self._motors_name = [x.name for x in self._motors]
         self._last_point_display = -1
         self._channel_name_2_channel = dict()
+        self._channel_readers = dict()
+        self._pending_data = dict()
         self._scan_info = scan_info
         self._init_done = False
 
@@ -47,27 +53,163 @@ class StepScanDataWatch(object):
                 if is_zerod(data_node):
                     channel = data_node
                     self._channel_name_2_channel[channel.name] = channel
+                    self._channel_readers[channel.name] = channel.get_reader()
             self._init_done = True
 
         if self._last_point_display == -1:
             self._last_point_display += 1
 
-        min_nb_points = None
-        for channels_name, channel in self._channel_name_2_channel.iteritems():
-            nb_points = len(channel)
-            if min_nb_points is None:
-                min_nb_points = nb_points
-            elif min_nb_points > nb_points:
-                min_nb_points = nb_points
-
-        point_nb = self._last_point_display
-        for point_nb in range(self._last_point_display, min_nb_points):
-            values = dict([(ch_name, ch.get(point_nb))
-                           for ch_name, ch in self._channel_name_2_channel.iteritems()])
+        channels_name = self._channel_readers.keys()
+        new_data = read_channels(self._channel_readers[name] for name in channels_name)
+        for channel_name, data in zip(channels_name, new_data):
+            pending = self._pending_data.get(channel_name)
+            if pending is not None and len(pending):
+                data = numpy.concatenate((pending, data))
+            self._pending_data[channel_name] = data
+
+        if not self._pending_data:
+            return
+        min_nb_points = min(len(data) for data in self._pending_data.itervalues())
+
+        for point_nb in range(min_nb_points):
+            values = dict([(ch_name, data[point_nb])
+                           for ch_name, data in self._pending_data.iteritems()])
             send(current_module, "scan_data",
                  self._scan_info, values)
-        if min_nb_points is not None:
-            self._last_point_display = min_nb_points
+        for channel_name, data in self._pending_data.items():
+            self._pending_data[channel_name] = data[min_nb_points:]
+        self._last_point_display += min_nb_points
+
+
+class ScanDataPublisher(object):
+    """
+    This class buffers the *new_data* events of channel data nodes and
+    publishes them to Redis in batches.
+
+    Buffered points of a same channel node are concatenated and stored in
+    one go, and all nodes are stored through a single Redis pipeline.
+    A flush happens when the buffered data reach **max_bytes**, when the
+    oldest buffered event is **max_delay** seconds old, or when
+    :meth:`flush` is called explicitly (i.e on the *end* signal).
+
+    **flush_callback** is called after each flush with the list
+    of (signal, sender) which were published.
+    """
+
+    def __init__(self, connection=None, max_bytes=1024 * 1024, max_delay=0.1,
+                 flush_callback=None):
+        self._cnx = connection or client.get_cache(db=1)
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self._flush_callback = flush_callback
+        self._lock = gevent.lock.Semaphore()
+        self._timer = None
+        self._error = None
+        self._reset_buffer()
+        self._statistics = {'flushes': 0, 'events': 0, 'bytes': 0,
+                            'max_latency': 0., 'total_latency': 0.,
+                            'total_flush_time': 0.}
+
+    def _reset_buffer(self):
+        self._buffer = dict()
+        self._senders = list()
+        self._buffer_events = 0
+        self._buffer_bytes = 0
+        self._first_event_time = None
+
+    @property
+    def statistics(self):
+        """
+        Flush statistics:
+
+        - flushes -- number of pipeline executions
+        - events -- number of published new_data events
+        - bytes -- number of published data bytes
+        - max_latency/mean_latency -- time between the first buffered
+          event and the end of the flush (seconds)
+        - mean_flush_time -- mean pipeline execution time (seconds)
+        """
+        stats = dict(self._statistics)
+        nb_flushes = stats['flushes'] or 1
+        stats['mean_latency'] = stats['total_latency'] / nb_flushes
+        stats['mean_flush_time'] = stats['total_flush_time'] / nb_flushes
+        return stats
+
+    def push(self, node, signal, event_dict, sender=None):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+        data = event_dict.get('data')
+        if signal != 'new_data' or not isinstance(node, ChannelDataNode) or \
+           not isinstance(data, numpy.ndarray):
+            # not a channel data: store it straight away
+            node.store(signal, event_dict)
+            if self._flush_callback is not None:
+                self._flush_callback([(signal, sender)])
+            return
+
+        channel = event_dict.get('channel')
+        node_buffer = self._buffer.get(node)
+        if node_buffer is None:
+            node_buffer = self._buffer[node] = (channel, list())
+        node_buffer[1].append(data.reshape((-1,) + tuple(channel.shape)))
+        self._senders.append((signal, sender))
+        self._buffer_events += 1
+        self._buffer_bytes += data.nbytes
+
+        if self._first_event_time is None:
+            self._first_event_time = time.time()
+        if self._buffer_bytes >= self.max_bytes:
+            self.flush()
+        elif self._timer is None:
+            self._timer = gevent.spawn_later(self.max_delay, self._timer_flush)
+
+    def _timer_flush(self):
+        try:
+            self.flush()
+        except Exception as e:
+            self._error = e
+
+    def flush(self):
+        with self._lock:
+            timer, self._timer = self._timer, None
+            if timer is not None and timer is not gevent.getcurrent():
+                timer.kill(block=False)
+            if not self._buffer:
+                return
+
+            buffer, senders = self._buffer, self._senders
+            nb_events, nb_bytes = self._buffer_events, self._buffer_bytes
+            first_event_time = self._first_event_time
+            self._reset_buffer()
+
+            t0 = time.time()
+            pipeline = self._cnx.pipeline()
+            for node, (channel, blocks) in buffer.iteritems():
+                data = blocks[0] if len(blocks) == 1 else numpy.concatenate(blocks)
+                node.store('new_data', {'data': data, 'channel': channel},
+                           cnx=pipeline)
+            pipeline.execute()
+            end_time = time.time()
+
+            latency = end_time - first_event_time
+            stats = self._statistics
+            stats['flushes'] += 1
+            stats['events'] += nb_events
+            stats['bytes'] += nb_bytes
+            stats['total_flush_time'] += end_time - t0
+            stats['total_latency'] += latency
+            stats['max_latency'] = max(stats['max_latency'], latency)
+
+        if self._flush_callback is not None:
+            self._flush_callback(senders)
+
+    def stop(self):
+        self.flush()
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
 
 
 class ScanSaving(Parameters):
@@ -91,6 +233,11 @@ class ScanSaving(Parameters):
              scan_data.add('date',get_date)
 
         The *parent* node should be use as parameters for the Scan.
+
+        The *writer* attribute selects who writes the scan files: 'hdf5'
+        (default) writes from the acquisition process, 'external' leaves
+        the writing to the HDF5 writer service
+        (see bliss.scanning.writer.service).
         """
 
         keys = dict()
@@ -99,8 +246,9 @@ class ScanSaving(Parameters):
                             default_values={'base_path': '/tmp/scans',
                                             'user_name': getpass.getuser(),
                                             'template': '{session}/',
-                                            'date_format': '%Y%m%d'},
-                            **keys)
+                                            'date_format': '%Y%m%d',
+                                            'writer': 'hdf5'},
+                            cache=True, **keys)
 
     def __dir__(self):
         keys = Parameters.__dir__(self)
@@ -172,7 +320,7 @@ class Scan(object):
 
     def __init__(self, chain, name=None,
                  parent=None, scan_info=None, writer=None,
-                 data_watch_callback=None):
+                 data_watch_callback=None, publisher_options=None):
         """
         This class publish data and trig the writer if any.
 
@@ -192,6 +340,8 @@ class Scan(object):
         if the callback is a class and have a method **on_state**, it will be called on each
         scan transition state. The return of this method will activate/deactivate
         the calling of the callback during this stage.
+        publisher_options -- keyword arguments of the ScanDataPublisher
+        (max_bytes, max_delay), to tune the batching of data publication.
         """
         if parent is None:
             self.root_node = None
@@ -224,6 +374,10 @@ class Scan(object):
             self._node._info.update(dict(scan_info))
         self._data_watch_callback = data_watch_callback
         self._data_events = dict()
+        self._publisher = ScanDataPublisher(
+            flush_callback=functools.partial(Scan._data_published,
+                                             weakref.proxy(self)),
+            **(publisher_options or dict()))
 
         if data_watch_callback is not None:
             if not callable(data_watch_callback):
@@ -268,6 +422,10 @@ class Scan(object):
     def nodes(self):
         return self._nodes
 
+    @property
+    def publisher(self):
+        return self._publisher
+
     @property
     def acq_chain(self):
         return self._acq_chain
@@ -294,12 +452,15 @@ class Scan(object):
     def _channel_event(self, event_dict, signal=None, sender=None):
         node = self._nodes[sender]
 
-        node.store(signal, event_dict)
+        self._publisher.push(node, signal, event_dict, sender)
 
-        self.__trigger_data_watch_callback(signal, sender)
+    def _data_published(self, events):
+        for signal, sender in events:
+            self.__trigger_data_watch_callback(signal, sender)
 
     def _device_event(self, event_dict=None, signal=None, sender=None):
         if signal == 'end':
+            self._publisher.flush()
             for node in self._nodes.itervalues():
                 node.set_ttl()
             self._node.set_ttl()
@@ -367,6 +528,10 @@ class Scan(object):
                 with periodic_exec(0.1 if call_on_stop else 0, set_watch_event):
                     i.stop()
         finally:
+            try:
+                self._publisher.stop()
+            finally:
+                self._node._publish_event('end')
             self._state = self.IDLE_STATE
             send(current_module, "scan_end", self.scan_info)
             if self._writer:
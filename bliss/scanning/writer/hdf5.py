@@ -1,24 +1,118 @@
 import os
 import errno
+import functools
 import h5py
 import numpy
 from ..scan import FileWriter, \
     AcquisitionMasterEventReceiver, AcquisitionDeviceEventReceiver
 
+try:
+    # registers the lz4 and bitshuffle HDF5 filters
+    import hdf5plugin
+except ImportError:
+    hdf5plugin = None
+
+LZ4_FILTER_ID = 32004
+BITSHUFFLE_FILTER_ID = 32008
+BITSHUFFLE_LZ4 = 2
+
+DEFAULT_CHUNK_BYTES = 1024 * 1024
+DEFAULT_GROWTH_FACTOR = 2
+
+
+def _filter_available(filter_id):
+    try:
+        return h5py.h5z.filter_avail(filter_id)
+    except Exception:
+        return False
+
+
+def compression_options(compression='auto'):
+    """
+    Return the create_dataset keyword arguments for a compression
+
+    compression -- 'auto' (fastest available: bitshuffle+lz4, lz4 or none),
+    'bitshuffle', 'lz4', 'gzip' or None (no compression)
+    """
+    if compression == 'auto':
+        if _filter_available(BITSHUFFLE_FILTER_ID):
+            compression = 'bitshuffle'
+        elif _filter_available(LZ4_FILTER_ID):
+            compression = 'lz4'
+        else:
+            compression = None
+
+    if compression is None:
+        return dict()
+    elif compression == 'gzip':
+        return dict(compression='gzip')
+    elif compression == 'lz4':
+        filter_id, options = LZ4_FILTER_ID, None
+    elif compression == 'bitshuffle':
+        filter_id, options = BITSHUFFLE_FILTER_ID, (0, BITSHUFFLE_LZ4)
+    else:
+        raise ValueError("Unknown compression '%s`" % compression)
+
+    if not _filter_available(filter_id):
+        raise RuntimeError("HDF5 filter for %s compression is not "
+                           "available (hdf5plugin is needed)" % compression)
+    keys = dict(compression=filter_id)
+    if options is not None:
+        keys['compression_opts'] = options
+    return keys
+
+
+def chunk_shape(shape, dtype, npoints=0, rate=None,
+                chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    Return the chunk shape of a dataset of points of shape **shape**
+
+    A chunk holds whole points, up to **chunk_bytes**. It is not bigger
+    than the expected number of points (**npoints**, 0 if unknown) and
+    holds at most one second of data at the expected **rate**
+    (points per second).
+    """
+    shape = tuple(shape)
+    point_bytes = numpy.dtype(dtype).itemsize * int(numpy.prod(shape))
+    nb_points = max(1, chunk_bytes // max(1, point_bytes))
+    if rate:
+        nb_points = min(nb_points, max(1, int(rate)))
+    if npoints:
+        nb_points = min(nb_points, npoints)
+    return (nb_points,) + shape
+
+
+def grow_dataset(dataset, nb_points, growth_factor=DEFAULT_GROWTH_FACTOR):
+    """Make **dataset** hold at least **nb_points**, growing geometrically"""
+    size = dataset.shape[0]
+    if size < nb_points:
+        dataset.resize(max(nb_points, int(size * growth_factor)), axis=0)
+
+
+def trim_dataset(dataset, nb_points):
+    """Trim **dataset** to the **nb_points** really written"""
+    if dataset.id.valid and dataset.shape[0] != nb_points:
+        dataset.resize(nb_points, axis=0)
+
 
 def _on_event(obj, event_dict, signal, device):
     if signal == 'start':
+        count_time = getattr(device, 'count_time', None)
+        rate = 1. / count_time if count_time else None
         for channel in device.channels:
             maxshape = tuple([None] + list(channel.shape))
-            npoints = device.npoints or 1
-            shape = tuple([npoints] + list(channel.shape))
+            npoints = device.npoints or 0
+            chunks = chunk_shape(channel.shape, channel.dtype, npoints, rate,
+                                 obj.options.get('chunk_bytes', DEFAULT_CHUNK_BYTES))
+            shape = tuple([npoints or chunks[0]] + list(channel.shape))
             if not channel.reference and channel.name not in obj.dataset:
                 obj.dataset[channel.name] = obj.parent.create_dataset(device.name.replace('/', '_') +
                                                                       ':' + channel.name,
                                                                       shape=shape,
                                                                       dtype=channel.dtype,
-                                                                      compression='gzip',
-                                                                      maxshape=maxshape)
+                                                                      chunks=chunks,
+                                                                      maxshape=maxshape,
+                                                                      **obj.compression)
                 obj.dataset[channel.name].last_point_index = 0
     elif signal == 'new_data':
         data = event_dict.get('data')
@@ -43,8 +137,8 @@ def _on_event(obj, event_dict, signal, device):
         data_len = data.shape[0]
         new_point_index = dataset.last_point_index + data_len
 
-        if dataset.shape[0] < new_point_index:
-            dataset.resize(new_point_index, axis=0)
+        grow_dataset(dataset, new_point_index,
+                     obj.options.get('growth_factor', DEFAULT_GROWTH_FACTOR))
 
         dataset[last_point_index:new_point_index] = data
 
@@ -53,9 +147,11 @@ def _on_event(obj, event_dict, signal, device):
 
 class Hdf5MasterEventReceiver(AcquisitionMasterEventReceiver):
     def __init__(self, *args, **kwargs):
+        self.options = kwargs.pop('options', dict())
         AcquisitionMasterEventReceiver.__init__(self, *args, **kwargs)
 
         self.dataset = dict()
+        self.compression = compression_options(self.options.get('compression', 'auto'))
 
     def on_event(self, event_dict, signal, device):
         return _on_event(self, event_dict, signal, device)
@@ -63,19 +159,36 @@ class Hdf5MasterEventReceiver(AcquisitionMasterEventReceiver):
 
 class Hdf5DeviceEventReceiver(AcquisitionDeviceEventReceiver):
     def __init__(self, *args, **kwargs):
+        self.options = kwargs.pop('options', dict())
         AcquisitionDeviceEventReceiver.__init__(self, *args, **kwargs)
 
         self.dataset = dict()
+        self.compression = compression_options(self.options.get('compression', 'auto'))
 
     def on_event(self, event_dict, signal, device):
         return _on_event(self, event_dict, signal, device)
 
 
 class Writer(FileWriter):
-    def __init__(self, root_path, **keys):
+    def __init__(self, root_path, compression='auto',
+                 chunk_bytes=DEFAULT_CHUNK_BYTES,
+                 growth_factor=DEFAULT_GROWTH_FACTOR, **keys):
+        """
+        compression -- 'auto' (fastest available compressor), 'bitshuffle',
+        'lz4', 'gzip' or None
+        chunk_bytes -- maximum size of a dataset chunk
+        growth_factor -- datasets are resized by this factor when full,
+        and trimmed to the number of written points on close
+        """
+        options = dict(compression=compression, chunk_bytes=chunk_bytes,
+                       growth_factor=growth_factor)
+        # check the compression now
+        compression_options(compression)
         FileWriter.__init__(self, root_path,
-                            master_event_receiver=Hdf5MasterEventReceiver,
-                            device_event_receiver=Hdf5DeviceEventReceiver,
+                            master_event_receiver=functools.partial(Hdf5MasterEventReceiver,
+                                                                    options=options),
+                            device_event_receiver=functools.partial(Hdf5DeviceEventReceiver,
+                                                                    options=options),
                             **keys)
 
         self.file = None
@@ -95,6 +208,9 @@ class Writer(FileWriter):
     def close(self):
         super(Writer, self).close()
         if self.file is not None:
+            for receiver in self._event_receivers:
+                for dataset in receiver.dataset.itervalues():
+                    trim_dataset(dataset, dataset.last_point_index)
             self.file.close()
             self.file = None
         self.scan_entry = None
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+HDF5 writer service.
+
+Writes the scans of one or several sessions in NeXus HDF5 files, out of
+the acquisition process. The service follows the data nodes published in
+Redis (see :class:`bliss.data.node.DataNodeIterator`) and reads the
+channels data in large blocks with channel readers.
+
+Only scans with *save* enabled and done with SCAN_SAVING.writer set to
+'external' are written, with the same file layout than
+:class:`bliss.scanning.writer.hdf5.Writer`.
+
+Usage:
+
+    $ bliss-hdf5-writer --session <name> [--session <name> ...]
+
+The writer status of a scan (state, file name, number of points
+published and written) is kept in the {scan_db_name}_writer Redis hash.
+Use :func:`wait_written` to wait until the file of a scan is complete.
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+
+import gevent
+import h5py
+
+from bliss.config.settings import HashSetting
+from bliss.data.node import DataNodeIterator, DataNode, _get_or_create_node
+from bliss.scanning.writer.hdf5 import compression_options, chunk_shape, \
+    grow_dataset, trim_dataset
+
+RUNNING, DONE, FAILED, NOT_SAVED = 'RUNNING', 'DONE', 'FAILED', 'NOT_SAVED'
+DEFAULT_CHUNK_POINTS = 1000
+DEFAULT_MAX_DELAY = 1.
+DEFAULT_START_TIMEOUT = 10.
+DEFAULT_LOG_LEVEL = 'INFO'
+
+log = logging.getLogger('Hdf5WriterService')
+
+
+class _NotSaved(Exception):
+    pass
+
+
+def get_writer_status(scan_node):
+    """Return the writer status of a scan as a dictionary"""
+    return HashSetting('%s_writer' % scan_node.db_name,
+                       connection=scan_node.db_connection).get_all()
+
+
+def wait_written(scan_node, timeout=None,
+                 start_timeout=DEFAULT_START_TIMEOUT):
+    """
+    Wait until the writer service has completed the file of **scan_node**.
+
+    Return the writer status (state NOT_SAVED if the scan is not saved by
+    the service), raise RuntimeError if the writing failed.
+
+    The state is NOT_SAVED at once for scans not saved with the 'external'
+    writer, and after **start_timeout** seconds if no writer service
+    started to write the scan (None to wait for it forever).
+    """
+    scan_info = scan_node.info.get_all()
+    if not scan_info.get('save') or scan_info.get('writer') != 'external':
+        return {'state': NOT_SAVED}
+    if start_timeout is not None:
+        start_deadline = time.time() + start_timeout
+    iterator = DataNodeIterator(scan_node)
+    event_id = iterator.children_event_register()
+    with gevent.Timeout(timeout, RuntimeError("Scan %s not written" %
+                                              scan_node.db_name)):
+        status = get_writer_status(scan_node)
+        while status.get('state') not in (DONE, FAILED, NOT_SAVED):
+            block = 0
+            if not status and start_timeout is not None:
+                remaining = start_deadline - time.time()
+                if remaining <= 0:
+                    # no writer service follows the scan
+                    return {'state': NOT_SAVED}
+                block = max(remaining, 0.001)
+            for event_id, event in iterator.read_events(event_id, block=block):
+                if event['event'] == 'written':
+                    break
+            status = get_writer_status(scan_node)
+    if status.get('state') == FAILED:
+        raise RuntimeError("Scan %s: writing failed (%s)" %
+                           (scan_node.db_name, status.get('error')))
+    return status
+
+
+class _ChannelWriter(object):
+    def __init__(self, channel_node, group, dataset_name, compression,
+                 npoints=0):
+        self.reader = channel_node.get_reader()
+        shape, dtype = channel_node._get_format()
+        chunks = chunk_shape(shape, dtype, npoints)
+        self.dataset = group.create_dataset(dataset_name,
+                                            shape=(npoints or chunks[0],) + shape,
+                                            dtype=dtype,
+                                            chunks=chunks,
+                                            maxshape=(None,) + shape,
+                                            **compression)
+        self.available = 0
+        self.written = 0
+        self.last_write = time.time()
+
+    def pending(self):
+        return self.available - self.written
+
+    def write(self):
+        data = self.reader.read()
+        if len(data):
+            new_written = self.written + len(data)
+            grow_dataset(self.dataset, new_written)
+            self.dataset[self.written:new_written] = data
+            self.written = new_written
+        self.available = max(self.available, self.written)
+        self.last_write = time.time()
+
+    def close(self):
+        trim_dataset(self.dataset, self.written)
+
+
+class ScanWriter(object):
+    """
+    Write one scan, following its data nodes until the end of the scan.
+
+    chunk_points -- number of points buffered in Redis before writing
+    a channel
+    max_delay -- maximum time (in seconds) a published point waits before
+    being written
+    compression -- see :func:`bliss.scanning.writer.hdf5.compression_options`
+    """
+
+    def __init__(self, scan_node, chunk_points=DEFAULT_CHUNK_POINTS,
+                 max_delay=DEFAULT_MAX_DELAY, compression='auto'):
+        self._scan_node = scan_node
+        self._chunk_points = chunk_points
+        self._max_delay = max_delay
+        self._compression = compression_options(compression)
+        self._npoints = 0
+        self._status = HashSetting('%s_writer' % scan_node.db_name,
+                                   connection=scan_node.db_connection)
+        self._channels = dict()
+        self._file = None
+        self._measurement = None
+        self._masters = dict()
+        self._filename = None
+
+    def _open(self):
+        scan_info = self._scan_node.info.get_all()
+        if not scan_info.get('save') or scan_info.get('writer') != 'external':
+            return False
+        self._filename = os.path.join(scan_info['root_path'], 'data.h5')
+        self._npoints = scan_info.get('npoints') or 0
+        try:
+            os.makedirs(scan_info['root_path'])
+        except OSError:
+            if not os.path.isdir(scan_info['root_path']):
+                raise
+        self._file = h5py.File(self._filename)
+        scan_entry = self._file.create_group(self._scan_node.name)
+        scan_entry.attrs['NX_class'] = 'NXentry'
+        self._measurement = scan_entry.create_group('measurement')
+        self._status.set({'state': RUNNING, 'filename': self._filename})
+        self._status.ttl(DataNode.default_time_to_live)
+        return True
+
+    def _add_channel(self, channel_node):
+        if channel_node.db_name in self._channels:
+            return
+        if self._file is None and not self._open():
+            raise _NotSaved()
+        # same layout as the in-process writer:
+        # measurement/<master>_master/<device>:<channel>
+        relative_name = channel_node.db_name[len(self._scan_node.db_name) + 1:]
+        master_name = relative_name.split(':', 1)[0].replace('/', '_')
+        channel_name = channel_node.name
+        device_path = relative_name[:-(len(channel_name) + 1)]
+        device_name = device_path.rsplit(':', 1)[-1].replace('/', '_')
+        group = self._masters.get(master_name)
+        if group is None:
+            group = self._measurement.create_group(master_name + '_master')
+            self._masters[master_name] = group
+        self._channels[channel_node.db_name] = \
+            _ChannelWriter(channel_node, group,
+                           '%s:%s' % (device_name, channel_name),
+                           self._compression, self._npoints)
+
+    def _write(self, force=False):
+        now = time.time()
+        written = False
+        for channel in self._channels.itervalues():
+            pending = channel.pending()
+            if pending <= 0 and not force:
+                continue
+            if force or pending >= self._chunk_points or \
+               now - channel.last_write >= self._max_delay:
+                channel.write()
+                written = True
+        if written:
+            self._update_status()
+
+    def _update_status(self, state=RUNNING, **keys):
+        available = sum(c.available for c in self._channels.itervalues())
+        written = sum(c.written for c in self._channels.itervalues())
+        status = {'state': state,
+                  'points_available': available,
+                  'points_written': written,
+                  'lag': available - written,
+                  'last_update': time.time()}
+        status.update(keys)
+        self._status.update(status)
+        if status['lag'] > 10 * self._chunk_points:
+            log.warning('Scan %s: writer is %d points behind',
+                        self._scan_node.db_name, status['lag'])
+
+    def run(self):
+        iterator = DataNodeIterator(self._scan_node)
+        try:
+            for event_type, node in iterator.walk_events(filter='channel'):
+                if event_type == iterator.END_SCAN_EVENT:
+                    if node.db_name == self._scan_node.db_name:
+                        break
+                elif event_type == iterator.NEW_CHILD_EVENT:
+                    if node.type == 'channel':
+                        self._add_channel(node)
+                elif event_type == iterator.NEW_DATA_IN_CHANNEL_EVENT:
+                    self._add_channel(node)
+                    event = iterator.last_event
+                    if event is not None and event.get('db_name') == node.db_name \
+                       and 'last' in event:
+                        channel = self._channels[node.db_name]
+                        channel.available = max(channel.available,
+                                                int(event['last']))
+                    self._write()
+            if self._file is not None:
+                self._write(force=True)
+                for channel in self._channels.itervalues():
+                    channel.close()
+                self._file.close()
+                self._file = None
+                self._update_status(DONE)
+        except _NotSaved:
+            # scan not saved by the writer service
+            self._not_saved()
+        except Exception as e:
+            log.exception('Error while writing scan %s',
+                          self._scan_node.db_name)
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._update_status(FAILED, error=str(e))
+        else:
+            if self._filename is None:
+                self._not_saved()
+            else:
+                log.info('Scan %s written in %s', self._scan_node.db_name,
+                         self._filename)
+        # always sent, wait_written returns on any final state
+        self._scan_node._publish_event('written')
+
+    def _not_saved(self):
+        self._status.set({'state': NOT_SAVED, 'last_update': time.time()})
+        self._status.ttl(DataNode.default_time_to_live)
+
+
+def follow_session(session_name, **keys):
+    """Write all the new scans of a session"""
+    session_node = _get_or_create_node(session_name, node_type='session')
+    iterator = DataNodeIterator(session_node)
+    event_id = iterator.children_event_register()
+    log.info('Following session %s', session_name)
+    for event_type, scan_node in iterator.wait_for_event(event_id, filter='scan'):
+        if event_type == iterator.NEW_CHILD_EVENT:
+            gevent.spawn(ScanWriter(scan_node, **keys).run)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    parser = argparse.ArgumentParser(description='HDF5 writer service')
+    parser.add_argument('--session', action='append', required=True,
+                        dest='sessions', help='session to follow')
+    parser.add_argument('--chunk-points', default=DEFAULT_CHUNK_POINTS,
+                        type=int, dest='chunk_points',
+                        help='number of points written at once')
+    parser.add_argument('--max-delay', default=DEFAULT_MAX_DELAY, type=float,
+                        dest='max_delay',
+                        help='maximum delay (s) before writing new points')
+    parser.add_argument('--compression', default='auto', type=str,
+                        help='dataset compression',
+                        choices=['auto', 'bitshuffle', 'lz4', 'gzip'])
+    parser.add_argument('--log-level', default=DEFAULT_LOG_LEVEL, type=str,
+                        help='log level',
+                        choices=['DEBUG', 'INFO', 'WARN', 'ERROR'])
+    arguments = vars(parser.parse_args(args))
+
+    log_level = arguments.pop('log_level', DEFAULT_LOG_LEVEL).upper()
+    fmt = '%(levelname)s %(asctime)-15s %(name)s: %(message)s'
+    logging.basicConfig(level=getattr(logging, log_level), format=fmt)
+    sessions = arguments.pop('sessions')
+    tasks = [gevent.spawn(follow_session, session, **arguments)
+             for session in sessions]
+    try:
+        gevent.joinall(tasks, raise_error=True)
+    except KeyboardInterrupt:
+        log.info('Interrupted. Bailing out!')
+
+
+if __name__ == '__main__':
+    main()
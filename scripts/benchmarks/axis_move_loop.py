@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+Measure the number of move loop iterations per second of a mockup axis.
+
+Each iteration reads the controller state and updates the axis settings
+(state, dial and user positions), like Axis._move_loop does while the
+axis is moving.
+
+Needs a running beacon (BEACON_HOST environment variable) with a mockup
+axis in its configuration (i.e: tests/test_configuration).
+
+    python scripts/benchmarks/axis_move_loop.py --axis roby --iterations 2000
+"""
+
+import sys
+import time
+import argparse
+
+from bliss.config import static
+
+
+def run(axis, iterations):
+    controller = axis.controller
+    axis.position()         # initializes the axis and its settings
+    t0 = time.time()
+    for i in xrange(iterations):
+        state = controller.state(axis)
+        axis.settings.set("state", state)
+        axis._read_dial_and_update()
+    return time.time() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--axis', default='roby',
+                        help='name of a mockup axis in the configuration')
+    parser.add_argument('--iterations', type=int, default=2000)
+    args = parser.parse_args(argv)
+
+    axis = static.get_config().get(args.axis)
+    duration = run(axis, args.iterations)
+    print "%d move loop iterations in %.3f s: %.0f iterations/s" % \
+        (args.iterations, duration, args.iterations / duration)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
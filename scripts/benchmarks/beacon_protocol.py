@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+Compare the decoding of a full configuration download (the stream of
+CONFIG_DB_FILE_RX messages sent by beacon for get_config_db) by
+string concatenation and protocol.unpack_message, and by
+protocol.MessageDecoder.
+
+The synthetic configuration has --files files of --size bytes, the
+stream is received in --read-size blocks, like a socket recv.
+
+    python scripts/benchmarks/beacon_protocol.py --files 5000 --size 2000
+"""
+
+import sys
+import time
+import argparse
+
+from bliss.config.conductor import protocol
+
+
+def config_download(nb_files, size):
+    content = ('- name: axis\n  velocity: 1\n' * (size // 29 + 1))[:size]
+    messages = [protocol.message(protocol.CONFIG_DB_FILE_RX,
+                                 '1|motors/file%d.yml|%s' % (i, content))
+                for i in xrange(nb_files)]
+    messages.append(protocol.message(protocol.CONFIG_DB_END, '1|'))
+    return ''.join(messages)
+
+
+def reads(stream, read_size):
+    for i in xrange(0, len(stream), read_size):
+        yield stream[i:i + read_size]
+
+
+def decode_strings(stream, read_size):
+    nb_messages = 0
+    data = ''
+    for raw_data in reads(stream, read_size):
+        data = '%s%s' % (data, raw_data)
+        while data:
+            try:
+                messageType, message, data = protocol.unpack_message(data)
+            except protocol.IncompleteMessage:
+                break
+            nb_messages += 1
+    return nb_messages
+
+
+def decode_buffer(stream, read_size):
+    nb_messages = 0
+    decoder = protocol.MessageDecoder()
+    for raw_data in reads(stream, read_size):
+        decoder.feed(raw_data)
+        for messageType, message in decoder:
+            nb_messages += 1
+    return nb_messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--files', type=int, default=5000)
+    parser.add_argument('--size', type=int, default=2000,
+                        help='size of a configuration file (bytes)')
+    parser.add_argument('--read-size', type=int, default=16 * 1024,
+                        dest='read_size')
+    args = parser.parse_args(argv)
+
+    stream = config_download(args.files, args.size)
+    print "%d messages, %.1f MB" % (args.files + 1, len(stream) / 1e6)
+    for name, decode in (('string concatenation', decode_strings),
+                         ('MessageDecoder', decode_buffer)):
+        t0 = time.time()
+        nb_messages = decode(stream, args.read_size)
+        duration = time.time() - t0
+        assert nb_messages == args.files + 1
+        print "%-24s %8.3f s %10.1f MB/s" % (name, duration,
+                                             len(stream) / duration / 1e6)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
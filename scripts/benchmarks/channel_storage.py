@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+Compare the 'pickle' and 'binary' storage of ChannelDataNode.
+
+Needs a running beacon (BEACON_HOST environment variable).
+
+    python scripts/benchmarks/channel_storage.py --npoints 10000 \
+        --shape 1024 --block 100
+"""
+
+import sys
+import time
+import argparse
+import numpy
+
+from bliss.config.conductor import client
+from bliss.data.node import _create_node
+from bliss.scanning.channel import AcquisitionChannel
+
+
+def run(storage, npoints, shape, block_size):
+    cnx = client.get_cache(db=1)
+    name = 'benchmark_channel_storage_%s' % storage
+    channel = AcquisitionChannel(name, numpy.float64, shape)
+    node = _create_node(name, 'channel', shape=shape, dtype=numpy.float64,
+                        storage=storage, connection=cnx)
+    block = numpy.random.random((block_size,) + shape)
+    memory_before = cnx.info('memory')['used_memory']
+
+    t0 = time.time()
+    for i in xrange(npoints / block_size):
+        node.store('new_data', {'data': block, 'channel': channel})
+    write_time = time.time() - t0
+
+    t0 = time.time()
+    data = node.get(0, -1)
+    if storage != 'binary':
+        data = numpy.array(data)
+    read_time = time.time() - t0
+
+    memory = cnx.info('memory')['used_memory'] - memory_before
+    assert len(data) == npoints
+    for db_name in node._get_db_names():
+        cnx.delete(db_name)
+    return write_time, read_time, memory
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--npoints', type=int, default=10000)
+    parser.add_argument('--shape', type=int, nargs='*', default=[1024],
+                        help='shape of one point (nothing for 0D)')
+    parser.add_argument('--block', type=int, default=100,
+                        help='number of points per new_data event')
+    args = parser.parse_args(argv)
+    shape = tuple(args.shape)
+
+    print "%d points of shape %s, %d points per event" % (args.npoints, shape,
+                                                          args.block)
+    print "%-8s %12s %12s %12s %14s" % ('storage', 'write (s)', 'points/s',
+                                        'read (s)', 'redis (bytes)')
+    for storage in ('pickle', 'binary'):
+        write_time, read_time, memory = run(storage, args.npoints, shape,
+                                            args.block)
+        print "%-8s %12.3f %12.0f %12.3f %14d" % (storage, write_time,
+                                                  args.npoints / write_time,
+                                                  read_time, memory)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
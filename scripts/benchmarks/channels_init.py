@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+Measure the creation of the beacon channels of --axes axes (the 9
+settings channels of bliss.common.motor_settings per axis), up to the
+reception of their initial values, and the number of redis subscriptions
+it takes.
+
+With --peer, the values are first set by another process, so the initial
+values are queried on the bus instead of taking the default values.
+
+Needs a running beacon (BEACON_HOST environment variable).
+
+    python scripts/benchmarks/channels_init.py --axes 300 --peer
+"""
+
+import sys
+import time
+import argparse
+import multiprocessing
+
+import gevent
+
+from bliss.config import channels
+from bliss.config.conductor import client
+
+SETTINGS = ("velocity", "position", "dial_position", "_set_position",
+            "state", "offset", "acceleration", "low_limit", "high_limit")
+
+
+def channel_names(nb_axes):
+    return ["axis.bench%d.%s" % (i, setting)
+            for i in xrange(nb_axes) for setting in SETTINGS]
+
+
+def peer(names, pipe):
+    chans = [channels.Channel(name, 1.) for name in names]
+    gevent.sleep(0.5)
+    pipe.send('|')
+    pipe.recv()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--axes', type=int, default=300)
+    parser.add_argument('--peer', action='store_true',
+                        help='channels values set by another process')
+    args = parser.parse_args(argv)
+
+    names = channel_names(args.axes)
+    if args.peer:
+        pipe, peer_pipe = multiprocessing.Pipe()
+        process = multiprocessing.Process(target=peer,
+                                          args=(names, peer_pipe))
+        process.start()
+        pipe.recv()
+
+    t0 = time.time()
+    chans = [channels.Channel(name, default_value=0.) for name in names]
+    values = [chan.value for chan in chans]
+    duration = time.time() - t0
+    bus = channels.Bus(client.get_cache())
+    print "%d channels %8.3f s %6d redis subscriptions" % \
+        (len(chans), duration, len(bus._pubsub.channels))
+    assert values == [1. if args.peer else 0.] * len(chans)
+
+    if args.peer:
+        pipe.send('|')
+        process.join()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+Measure the HDF5 writer throughput (points/s) for 0D, 1D and 2D channels.
+
+Data are written through the writer event receivers, as during a scan,
+with the writer default policy (chunk shape from the channel, geometric
+growth, fastest available compression) and with the former one (gzip,
+one resize per data block).
+
+    python scripts/benchmarks/hdf5_writer.py --npoints 10000 --block 1
+"""
+
+import os
+import sys
+import time
+import tempfile
+import argparse
+
+import h5py
+import numpy
+
+from bliss.scanning.channel import AcquisitionChannel
+from bliss.scanning.writer.hdf5 import Hdf5DeviceEventReceiver, trim_dataset
+
+POLICIES = (('default', dict()),
+            ('former', dict(compression='gzip', growth_factor=1)))
+
+CHANNELS = (('0D', ()), ('1D', (1024,)), ('2D', (256, 256)))
+
+
+class _Device(object):
+    def __init__(self, channel, npoints):
+        self.name = 'benchmark'
+        self.channels = [channel]
+        self.npoints = npoints
+
+
+def run(filename, options, shape, npoints, block_size):
+    channel = AcquisitionChannel('data', numpy.uint16, shape)
+    device = _Device(channel, 0)  # unknown number of points, as in timescans
+    block = numpy.random.randint(0, 1000, (block_size,) + shape).astype(numpy.uint16)
+    with h5py.File(filename, 'w') as f:
+        receiver = Hdf5DeviceEventReceiver(device, f, options=options)
+        t0 = time.time()
+        receiver.on_event(None, 'start', device)
+        for i in xrange(npoints / block_size):
+            receiver.on_event({'data': block.copy(), 'channel': channel},
+                              'new_data', device)
+        dataset = receiver.dataset['data']
+        trim_dataset(dataset, dataset.last_point_index)
+        f.flush()
+        return time.time() - t0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--npoints', type=int, default=10000)
+    parser.add_argument('--block', type=int, default=1,
+                        help='number of points per new_data event')
+    parser.add_argument('--dir', default=tempfile.gettempdir(),
+                        help='directory of the written file')
+    args = parser.parse_args(argv)
+
+    filename = os.path.join(args.dir, 'bliss_hdf5_writer_benchmark.h5')
+    print "%-8s %-4s %12s %12s" % ('policy', 'dim', 'time (s)', 'points/s')
+    try:
+        for channel_dim, shape in CHANNELS:
+            npoints = args.npoints if shape != (256, 256) else args.npoints / 10
+            for policy, options in POLICIES:
+                duration = run(filename, options, shape, npoints, args.block)
+                print "%-8s %-4s %12.3f %12.0f" % (policy, channel_dim, duration,
+                                                   npoints / duration)
+    finally:
+        if os.path.exists(filename):
+            os.remove(filename)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+Compare sequential and pipelined status/position queries of many axes
+on the IcePAP emulator (bliss.controllers.emulators.icepap).
+
+The emulator runs in the same process, use --baudrate to emulate a slow
+link or --host/--port to query an emulator (or a real IcePAP) elsewhere.
+
+    python scripts/benchmarks/icepap_pipeline.py --axes 30 --repeat 100
+"""
+
+import sys
+import time
+import argparse
+
+from bliss.comm.tcp import Command
+from bliss.controllers.emulator import create_device
+from bliss.controllers.emulators.icepap import iter_axis
+from bliss.controllers.motors.icepap import _command, _command_pipeline
+
+
+def run(name, func, nb_axes, repeat):
+    t0 = time.time()
+    for i in xrange(repeat):
+        func()
+    duration = time.time() - t0
+    print "%-24s %8.3f s %10.1f polls/s %10.0f axes/s" % \
+        (name, duration, repeat / duration, nb_axes * repeat / duration)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--axes', type=int, default=30,
+                        help='number of axes polled at once')
+    parser.add_argument('--repeat', type=int, default=100)
+    parser.add_argument('--baudrate', type=int, default=None,
+                        help='emulated link speed')
+    parser.add_argument('--host', default=None)
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    addresses = list(iter_axis())[:args.axes]
+    transports = ()
+    if args.host is None:
+        device_info = {'class': 'IcePAP',
+                       'axes': [dict(address=addr) for addr in addresses],
+                       'transports': [{'type': 'tcp',
+                                       'url': ('127.0.0.1', 0),
+                                       'baudrate': args.baudrate}]}
+        device, transports = create_device(device_info)
+        for transport in transports:
+            transport.start()
+        host, port = '127.0.0.1', transports[0].address[1]
+    else:
+        host, port = args.host, args.port
+
+    cnx = Command(host, port, eol='\n')
+    try:
+        for query in ('?FSTATUS', '?FPOS'):
+            cmds = ['%s %d' % (query, addr) for addr in addresses]
+            print "%s of %d axes" % (query, len(cmds))
+            run('sequential', lambda: [_command(cnx, cmd) for cmd in cmds],
+                len(cmds), args.repeat)
+            run('pipelined', lambda: _command_pipeline(cnx, cmds),
+                len(cmds), args.repeat)
+    finally:
+        cnx.close()
+        for transport in transports:
+            transport.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+Compare the decoding of Lima BPM (GetResults) and ROI counters
+(readCounters) results by the former per point python loops and by the
+bliss.controllers.lima grouped read handlers.
+
+The results are synthetic (no Lima server needed): --results BPM results
+and --results frames of --rois ROIs.
+
+    python scripts/benchmarks/lima_counters.py --results 100000 --rois 4
+"""
+
+import sys
+import time
+import argparse
+
+import numpy
+
+from bliss.common.utils import grouped
+from bliss.controllers.lima.bpm import Bpm
+from bliss.controllers.lima.roi import (RoiStat, RoiStatCounter,
+                                        RoiCounterGroupReadHandler)
+
+
+class BpmProxy(object):
+
+    def __init__(self, nb_results):
+        self.ResultSize = 6
+        self.results = numpy.random.random(nb_results * self.ResultSize)
+
+    def On(self):
+        pass
+
+    def GetResults(self, from_index):
+        return self.results
+
+
+class RoiProxy(object):
+
+    def __init__(self, nb_frames, nb_rois):
+        data = numpy.random.random((nb_frames, nb_rois, len(RoiStat)))
+        data[:, :, RoiStat.Id] = numpy.arange(nb_rois)
+        data[:, :, RoiStat.Frame] = numpy.arange(nb_frames)[:, None]
+        self.counters = data.ravel()
+
+    def readCounters(self, from_index):
+        return self.counters.copy()
+
+
+class RoiController(object):
+
+    def __init__(self, proxy, nb_rois):
+        self._proxy = proxy
+        self._roi_ids = dict(('roi%d' % i, i) for i in range(nb_rois))
+
+    def upload_rois(self):
+        pass
+
+
+def bpm_loop(controller, counters):
+    result_size = controller._proxy.ResultSize
+    all_result = controller._proxy.GetResults(0)
+    nb_result = len(all_result) / result_size
+    counter2index = [(numpy.zeros((nb_result,)),
+                      controller._name2index[cnt.name]) for cnt in counters]
+    for i, raw in enumerate(grouped(all_result, result_size)):
+        for res, j in counter2index:
+            res[i] = raw[j]
+    return [x[0] for x in counter2index]
+
+
+def roi_loop(controller, counters):
+    roi_counter_size = len(RoiStat)
+    raw_data = controller._proxy.readCounters(0)
+    raw_data.shape = (raw_data.size) / roi_counter_size, roi_counter_size
+    result = dict([int(counter), []] for counter in counters)
+    for roi_counter in raw_data:
+        roi_id = int(roi_counter[0])
+        for stat in range(roi_counter_size):
+            full_id = RoiStatCounter.roi_stat_id(roi_id, stat)
+            counter_data = result.get(full_id)
+            if counter_data is not None:
+                counter_data.append(roi_counter[stat])
+    return [numpy.array(result[int(counter)]) for counter in counters]
+
+
+def run(name, func, nb_results):
+    t0 = time.time()
+    values = func()
+    duration = time.time() - t0
+    print "%-24s %8.3f s %12.0f results/s" % (name, duration,
+                                              nb_results / duration)
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--results', type=int, default=100000)
+    parser.add_argument('--rois', type=int, default=4)
+    args = parser.parse_args(argv)
+
+    print "BPM: %d results" % args.results
+    bpm_proxy = BpmProxy(args.results)
+    bpm = Bpm('bench', bpm_proxy, bpm_proxy)
+    counters = [bpm.x, bpm.y, bpm.intensity]
+    handler = bpm._grouped_read_handler
+    handler.prepare(*counters)
+    ref = run('python loop', lambda: bpm_loop(bpm, counters), args.results)
+    new = run('handler', lambda: handler.get_values(0, *counters),
+              args.results)
+    assert all(numpy.array_equal(a, b) for a, b in zip(ref, new))
+
+    print "ROI: %d frames x %d rois" % (args.results, args.rois)
+    roi_ctrl = RoiController(RoiProxy(args.results, args.rois), args.rois)
+    counters = [RoiStatCounter(roi_name, stat, controller=roi_ctrl,
+                               acquisition_controller=roi_ctrl)
+                for roi_name in sorted(roi_ctrl._roi_ids)
+                for stat in (RoiStat.Sum, RoiStat.Avg)]
+    handler = RoiCounterGroupReadHandler(roi_ctrl)
+    handler.prepare(*counters)
+    ref = run('python loop', lambda: roi_loop(roi_ctrl, counters),
+              args.results)
+    new = run('handler', lambda: handler.get_values(0, *counters),
+              args.results)
+    assert all(numpy.array_equal(a, b) for a, b in zip(ref, new))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
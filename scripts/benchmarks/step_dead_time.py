@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+Measure the dead time per point of step moves of a mockup axis, i.e. the
+time Axis.move() takes on top of the motion time of the mockup controller
+(displacement / velocity), with:
+
+* fixed period polling (bliss.common.axis.ADAPTIVE_POLLING disabled)
+* adaptive polling
+* end of motion notified by the controller (notify_end_of_motion)
+
+Needs a running beacon (BEACON_HOST environment variable) with a mockup
+axis in its configuration (i.e: tests/test_configuration).
+
+    python scripts/benchmarks/step_dead_time.py --axis robz --points 50
+"""
+
+import sys
+import time
+import argparse
+
+from bliss.common import axis as axis_module
+from bliss.config import static
+
+
+def run(name, axis, step, points, polling_time):
+    motion_time = abs(step) / axis.velocity()
+    axis.position()         # initializes the axis and its settings
+    t0 = time.time()
+    for i in xrange(points):
+        axis.rmove(step, polling_time=polling_time)
+    duration = time.time() - t0
+    dead_time = duration / points - motion_time
+    print "%-16s %8.3f s %10.2f ms dead time/point" % \
+        (name, duration, dead_time * 1000)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--axis', default='robz',
+                        help='name of a mockup axis in the configuration')
+    parser.add_argument('--points', type=int, default=50)
+    parser.add_argument('--step', type=float, default=1.,
+                        help='step size (user units)')
+    parser.add_argument('--polling-time', type=float, dest='polling_time',
+                        default=axis_module.DEFAULT_POLLING_TIME)
+    args = parser.parse_args(argv)
+
+    axis = static.get_config().get(args.axis)
+    controller = axis.controller
+    try:
+        axis_module.ADAPTIVE_POLLING = False
+        run('fixed polling', axis, args.step, args.points, args.polling_time)
+        axis_module.ADAPTIVE_POLLING = True
+        run('adaptive', axis, -args.step, args.points, args.polling_time)
+        controller.notify_end_of_motion = True
+        axis_module.ADAPTIVE_POLLING = False
+        run('notified', axis, args.step, args.points, args.polling_time)
+    finally:
+        axis_module.ADAPTIVE_POLLING = True
+        controller.notify_end_of_motion = False
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+Measure the receive throughput of bliss.comm.tcp Socket and Command.
+
+A local server answers "?DATA <nbytes>" with a binary block of <nbytes>
+bytes (like MUSST "?*EDAT"), read with read(size) and with read_into()
+in a preallocated numpy array.
+
+    python scripts/benchmarks/tcp_throughput.py --size 10000000 --repeat 10
+"""
+
+import sys
+import time
+import argparse
+
+import numpy
+from gevent.server import StreamServer
+
+from bliss.comm import tcp
+
+
+def data_server(sock, address):
+    fd = sock.makefile()
+    while True:
+        line = fd.readline()
+        if not line:
+            return
+        nbytes = int(line.split()[1])
+        block = '\xaa' * min(nbytes, 1024 * 1024)
+        while nbytes > 0:
+            sock.sendall(block[:nbytes])
+            nbytes -= len(block)
+
+
+def run(name, func, size, repeat):
+    t0 = time.time()
+    for i in xrange(repeat):
+        func()
+    duration = time.time() - t0
+    print "%-32s %10.3f s %10.1f MB/s" % (name, duration,
+                                          size * repeat / duration / 1e6)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=10 * 1000 * 1000,
+                        help='number of bytes of an answer')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args(argv)
+    size = args.size
+
+    server = StreamServer(('127.0.0.1', 0), handle=data_server)
+    server.start()
+    port = server.address[1]
+    request = '?DATA %d\n' % size
+    array = numpy.empty(size, dtype=numpy.uint8)
+    try:
+        sock = tcp.Socket('127.0.0.1', port, timeout=60)
+        run('Socket.write_read', lambda: sock.write_read(request, size=size),
+            size, args.repeat)
+        run('Socket.write_read_into',
+            lambda: sock.write_read_into(request, array), size, args.repeat)
+        sock.close()
+
+        cmd = tcp.Command('127.0.0.1', port, timeout=60)
+        run('Command.write_read', lambda: cmd.write_read(request, size=size),
+            size, args.repeat)
+        run('Command.write_read_into',
+            lambda: cmd.write_read_into(request, array), size, args.repeat)
+        cmd.close()
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,6 +8,7 @@
 import time
 import pytest
 import gevent
+import numpy
 from bliss.comm import tcp
 
 
@@ -117,3 +118,45 @@ def test_tryconnect_socket(server_port):
     s.connect()
     s.close()
     assert s.write_read("X") == "X"
+
+def test_read_into_socket(server_port):
+    s = tcp.Socket("127.0.0.1", server_port)
+    data = numpy.arange(100000, dtype=numpy.float64)
+    result = numpy.zeros_like(data)
+    assert s.write_read_into(data.tostring(), result) == data.nbytes
+    numpy.testing.assert_array_equal(result, data)
+    # data after the buffer is kept
+    s.write("ABCDEF\n")
+    buf = bytearray(3)
+    assert s.read_into(buf) == 3
+    assert buf == "ABC"
+    assert s.readline() == "DEF"
+
+def test_read_into_command(server_port):
+    s = tcp.Command("127.0.0.1", server_port)
+    data = numpy.arange(100000, dtype=numpy.int32)
+    result = numpy.zeros_like(data)
+    assert s.write_read_into(data.tostring(), result) == data.nbytes
+    numpy.testing.assert_array_equal(result, data)
+
+def test_rx_buffer():
+    buf = tcp.RxBuffer(size=8)
+    buf.append("HELLO")
+    assert buf.find("\n") == -1
+    buf.append(" WORLD\nNEXT")
+    assert buf.find("\n") == 11
+    assert buf.read(11) == "HELLO WORLD"
+    buf.skip(1)
+    assert len(buf) == 4
+    buf.append("X" * 100 + "\n")
+    assert buf.find("\n") == 104
+    assert buf.read() == "NEXT" + "X" * 100 + "\n"
+    assert not buf
+
+def test_write_readline_pipeline(server_port):
+    msgs = ["HELLO\n", "WORLD\n", "AGAIN\n"]
+    s = tcp.Socket("127.0.0.1", server_port)
+    assert s.write_readline_pipeline(msgs) == ["HELLO", "WORLD", "AGAIN"]
+    c = tcp.Command("127.0.0.1", server_port)
+    assert c.write_readline_pipeline(msgs) == ["HELLO", "WORLD", "AGAIN"]
+    assert c.write_readline("NEXT\n") == "NEXT"
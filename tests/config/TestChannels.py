@@ -23,6 +23,13 @@ def _ext_channel(keep_alive_delay, pipe, queue, *args, **kwargs):
     queue.put(c.value)
 
 
+def _ext_channels(keep_alive_delay, pipe, names_values):
+    chans = [channels.Channel(name, value) for name, value in names_values]
+    gevent.sleep(0.1)
+    pipe.send('|')
+    gevent.sleep(keep_alive_delay)
+
+
 def test_ext_channel(keep_alive_delay, *args, **kwargs):
     r, w = Pipe(False)
     q = Queue()
@@ -90,6 +97,50 @@ class TestBeacon(unittest.TestCase):
         self.assertTrue(received_value['value'] == 'hello')
         p.join()
 
+    def testEncoding(self):
+        values = [('none', None), ('true', True), ('int', -3),
+                  ('long', 2**70), ('float', 1.5), ('str', 'hello'),
+                  ('unicode', u'\xe9'), ('dict', {'a': [1, 2]})]
+        channel_values = [(name, channels._ChannelValue(i, value))
+                          for i, (name, value) in enumerate(values)]
+        message = channels.encode_values(channel_values, 'query:1')
+        kind, query_id, entries = channels.decode_message(message)
+        self.assertEquals(kind, channels.VALUES_MESSAGE)
+        self.assertEquals(query_id, 'query:1')
+        self.assertEquals(entries, channel_values)
+        message = channels.encode_query('query:2', ['a', 'b'])
+        self.assertEquals(channels.decode_message(message),
+                          (channels.QUERY_MESSAGE, 'query:2', ['a', 'b']))
+
+    def testDecodeFilter(self):
+        message = channels.encode_values(
+            [('bad', channels._ChannelValue(1, {'a': 1})),
+             ('good', channels._ChannelValue(2, 'hello'))])
+        # corrupt the pickled value
+        start = message.index('p', message.index('bad')) + 5
+        message = message[:start] + 'x' * 4 + message[start + 4:]
+        kind, query_id, entries = channels.decode_message(message, ['good'])
+        self.assertEquals(entries,
+                          [('good', channels._ChannelValue(2, 'hello'))])
+        kind, query_id, entries = channels.decode_message(message,
+                                                          ['bad', 'good'])
+        self.assertEquals(entries,
+                          [('good', channels._ChannelValue(2, 'hello'))])
+
+    def testBatchedInit(self):
+        names_values = [('batch%d' % i, i) for i in range(50)]
+        r, w = Pipe(False)
+        p = Process(target=_ext_channels, args=(2, w, names_values))
+        p.start()
+        r.recv()
+        chans = [channels.Channel(name, default_value=-1)
+                 for name, value in names_values]
+        unknown = channels.Channel('batch_unknown', default_value=-1)
+        self.assertEquals([c.value for c in chans],
+                          [value for name, value in names_values])
+        self.assertEquals(unknown.value, -1)
+        p.join()
+
     def testRaiseExceptionInCallback(self):
         c = channels.Channel("test_exception")
         exception_raised = {"exc": False}
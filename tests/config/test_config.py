@@ -69,3 +69,75 @@ def test_references(beacon):
   assert refs_cfg['m0'].__repr__() == repr(m0)
 
 
+
+def test_fast_load(beacon):
+  from bliss.config import static
+  cache = static.ParsedConfigCache(filename='')
+  fast_cfg = static.Config('', fast_load=True, cache=cache)
+  assert sorted(fast_cfg.names_list) == sorted(beacon.names_list)
+  assert fast_cfg.get_config("roby").to_dict() == beacon.get_config("roby").to_dict()
+  assert cache.hits == 0
+
+  # unchanged files are not parsed again
+  misses = cache.misses
+  fast_cfg.reload()
+  assert cache.misses == misses
+  assert cache.hits == misses
+
+def test_parsed_cache_prune(beacon):
+  from bliss.config import static
+  cache = static.ParsedConfigCache(filename='')
+  cfg = static.Config('', fast_load=True, cache=cache)
+  nb_entries = len(cache._entries)
+  cache._entries['removed_dir/removed.yml'] = ('0', 'yml'), {}
+
+  # entries of the files which are not in the beacon database any more
+  # are removed on reload
+  cfg.reload()
+  assert 'removed_dir/removed.yml' not in cache._entries
+  assert len(cache._entries) == nb_entries
+
+  # only under the reloaded path
+  cache._entries['removed_dir/removed.yml'] = ('0', 'yml'), {}
+  cfg.reload(base_path='motors')
+  assert 'removed_dir/removed.yml' in cache._entries
+
+def test_config_db_cache(beacon):
+  from bliss.config.conductor import client
+  connection = client.get_default_connection()
+  cache = client.ConfigDbCache(filename='')
+  files = dict(cache.get_files(connection))
+  assert files == dict(connection.get_config_db())
+  assert cache.hits == 0
+
+  # unchanged files are not transferred again
+  misses = cache.misses
+  assert dict(cache.get_files(connection)) == files
+  assert cache.misses == misses
+  assert cache.hits == misses
+
+  motor_files = dict(cache.get_files(connection, 'motors'))
+  assert motor_files
+  assert all(path.startswith('motors/') for path in motor_files)
+  assert cache.misses == misses
+
+def test_config_changed_on_disk(beacon):
+  import gevent
+  from bliss.config.conductor import client
+  file_path = os.path.join(os.path.dirname(TEST_FILE_PATH), "disk_test.yml")
+  def file_content():
+    return dict(client.get_config_db_files()).get("disk_test.yml")
+
+  with open(file_path, "w") as f:
+    f.write("name: disk_test\n")
+  try:
+    with gevent.Timeout(5):
+      while file_content() is None:
+        gevent.sleep(0.1)
+    assert file_content() == "name: disk_test\n"
+    assert "disk_test.yml" in client.get_config_db_tree()
+  finally:
+    os.unlink(file_path)
+  with gevent.Timeout(5):
+    while file_content() is not None:
+      gevent.sleep(0.1)
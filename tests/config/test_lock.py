@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+import random
+
+import gevent
+
+from bliss.config.conductor import client, connection
+
+
+def _new_connection():
+    port = client.get_default_connection()._port
+    return connection.Connection("localhost", port)
+
+
+def test_lock_handoff(beacon):
+    cnx1 = _new_connection()
+    cnx2 = _new_connection()
+    try:
+        cnx1.lock(['test_m1', 'test_m2'])
+        waiter = gevent.spawn(cnx2.lock, ['test_m1'], timeout=3)
+        gevent.sleep(0.1)
+        assert not waiter.ready()
+        cnx1.unlock(['test_m1', 'test_m2'])
+        waiter.get(timeout=1)
+        cnx2.unlock(['test_m1'])
+    finally:
+        cnx1.close()
+        cnx2.close()
+
+
+def test_lock_stress(beacon):
+    motors = ['stress_m%d' % i for i in range(10)]
+    users = dict()
+    nb_locks = []
+
+    def lock_loop(cnx, nb_iter):
+        for i in range(nb_iter):
+            objects = random.sample(motors, 2)
+            cnx.lock(objects, timeout=60)
+            try:
+                for obj in objects:
+                    assert users.setdefault(obj, cnx) is cnx
+                gevent.sleep(0.001)
+                nb_locks.append(objects)
+            finally:
+                for obj in objects:
+                    users.pop(obj)
+                cnx.unlock(objects)
+
+    connections = [_new_connection() for i in range(200)]
+    try:
+        before = client.get_lock_metrics()
+        tasks = [gevent.spawn(lock_loop, cnx, 5) for cnx in connections]
+        gevent.joinall(tasks, raise_error=True, timeout=120)
+        assert len(nb_locks) == 200 * 5
+        metrics = client.get_lock_metrics()
+        assert metrics['granted'] - before['granted'] == 200 * 5
+        assert metrics['contended'] > before['contended']
+        assert metrics['waiting_requests'] == 0
+        assert metrics['max_wait_time'] > 0
+    finally:
+        for cnx in connections:
+            cnx.close()
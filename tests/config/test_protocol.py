@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+import pytest
+
+from bliss.config.conductor import protocol
+
+
+def test_message_decoder():
+    messages = [(protocol.CONFIG_DB_FILE_RX, 'key|file%d.yml|%s' % (i, 'x' * i))
+                for i in range(100)]
+    messages.append((protocol.CONFIG_DB_END, 'key|'))
+    data = ''.join(protocol.message(*msg) for msg in messages)
+
+    decoder = protocol.MessageDecoder()
+    received = []
+    # split messages (and headers) over several reads
+    for i in range(0, len(data), 7):
+        decoder.feed(data[i:i + 7])
+        received.extend(decoder)
+    assert received == messages
+    assert len(decoder) == 0
+
+    decoder.feed(protocol.message(protocol.CONFIG_GET_FILE, 'a|b')[:-1])
+    assert len(decoder) == protocol.HEADER_SIZE + 2
+    with pytest.raises(protocol.IncompleteMessage):
+        decoder.next_message()
+    decoder.feed('b')
+    assert decoder.next_message() == (protocol.CONFIG_GET_FILE, 'a|b')
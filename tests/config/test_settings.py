@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+import gevent
+
+from bliss.config import settings
+
+
+def _wait_value(get, value, timeout=3):
+    with gevent.Timeout(timeout):
+        while get() != value:
+            gevent.sleep(0.01)
+
+
+def test_hash_setting_cache(beacon):
+    cached = settings.HashSetting('test_hash_cache', cache=True)
+    other = settings.HashSetting('test_hash_cache')
+    cached.set({'a': 1, 'b': 'hello'})
+
+    assert cached.get_all() == {'a': 1, 'b': 'hello'}
+    assert cached['a'] == 1
+    assert len(cached) == 2
+    assert cached.cache_statistics == {'hits': 2, 'misses': 1}
+    assert other.cache_statistics is None
+
+    # writes from this object go through
+    cached['a'] = 2
+    assert other['a'] == 2
+    assert cached['a'] == 2
+
+    # writes from elsewhere invalidate the cached value
+    other['b'] = 'world'
+    _wait_value(lambda: cached['b'], 'world')
+    del other['a']
+    _wait_value(lambda: cached.has_key('a'), False)
+
+
+def test_queue_setting_cache(beacon):
+    cached = settings.QueueSetting('test_queue_cache', cache=True)
+    other = settings.QueueSetting('test_queue_cache')
+    cached.set([1, 2, 3, 4])
+
+    assert cached.get() == [1, 2, 3, 4]
+    assert cached.get(1, 3) == [2, 3]
+    assert cached.get(2, 2) == 3
+    assert cached.get(10, 10) is None
+    assert len(cached) == 4
+    assert list(cached) == [1, 2, 3, 4]
+
+    other.append(5)
+    _wait_value(lambda: len(cached), 5)
+    assert cached[-1] == 5
+    assert cached.cache_statistics['hits'] > 0
+
+
+def test_settings_cache_subscription(beacon):
+    cache = settings.SettingsCache(settings.get_cache())
+    for i in range(3):
+        cached = settings.SimpleSetting('test_cache_subscription%d' % i,
+                                        cache=True)
+        cached.set(i)
+        assert cached.get() == i
+    # one subscription for all the cached settings
+    assert len(cache._pubsub.channels) + len(cache._pubsub.patterns) == 1
+
+
+def test_settings_cache_not_subscribed(beacon):
+    cache = settings._SettingsCache(settings.get_cache())
+    # invalidations can't be received: values are not cached
+    cache._watch = lambda timeout=3.: False
+    loads = []
+    def loader():
+        loads.append(1)
+        return 'value'
+    assert cache.get('test_not_subscribed', loader) == 'value'
+    assert cache.get('test_not_subscribed', loader) == 'value'
+    assert len(loads) == 2
+    assert cache.misses == 2
@@ -9,6 +9,12 @@
 CT2 pure software tests (no hardware required)
 """
 
+import numpy
+import pytest
+
+from bliss.common.event import dispatcher
+from bliss.controllers.ct2.device import PointBuffer, DataSignal
+from bliss.controllers.ct2.client import DataStream
 from bliss.controllers.ct2.card import CtConfig, CtClockSrc, CtGateSrc
 from bliss.controllers.ct2.card import CtHardStartSrc, CtHardStopSrc
 
@@ -64,3 +70,72 @@ def test_ctconfig_set():
     assert CtConfig.toint(cfg) == reg
 
 
+def points(first, nb_points, nb_columns=3):
+    data = numpy.arange(first, first + nb_points, dtype=numpy.uint32)
+    return numpy.repeat(data, nb_columns).reshape(nb_points, nb_columns)
+
+
+def test_point_buffer():
+    buff = PointBuffer(10)
+    assert buff.get(0) is None
+
+    buff.append(points(0, 4))
+    buff.append(points(4, 3))
+    assert len(buff) == 7
+    data = buff.get(0)
+    assert (data == points(0, 7)).all()
+    # contiguous points are a view on the buffer
+    assert data.base is not None
+    assert (buff.get(5) == points(5, 2)).all()
+    assert buff.get(7) is None
+
+    # wrap around the end of the buffer
+    buff.append(points(7, 5))
+    assert buff.overruns == 0
+    assert (buff.get(7) == points(7, 5)).all()
+    with pytest.raises(IndexError):
+        buff.get(0)
+    assert buff.overruns == 0
+
+    # more points than the capacity: overwritten points never read
+    buff.append(points(12, 13))
+    assert buff.overruns == 3
+    assert len(buff) == 10
+    assert (buff.get(15) == points(15, 10)).all()
+
+    # consume restarts the point index
+    assert (buff.consume() == points(15, 10)).all()
+    assert len(buff) == 0
+    assert buff.consume() is None
+    buff.append(points(25, 2))
+    assert (buff.get(0) == points(25, 2)).all()
+
+    buff.clear()
+    assert len(buff) == 0
+    assert buff.overruns == 0
+
+
+def test_data_stream():
+    class Controller(object):
+        pass
+    ctrl = Controller()
+    stream = DataStream(ctrl)
+    stream.reset(2)
+
+    # blocks of an other acquisition are ignored
+    dispatcher.send(DataSignal, ctrl, (1, 0, points(100, 3)))
+    assert stream.get(0, timeout=0) is None
+
+    dispatcher.send(DataSignal, ctrl, (2, 0, points(0, 3)))
+    dispatcher.send(DataSignal, ctrl, (2, 3, points(3, 2)))
+    assert (stream.get(0, timeout=0) == points(0, 5)).all()
+    assert stream.get(5, timeout=0) is None
+
+    # points already read (ex: from the server) are skipped
+    dispatcher.send(DataSignal, ctrl, (2, 5, points(5, 4)))
+    assert (stream.get(7, timeout=0) == points(7, 2)).all()
+
+    # missing points must be read from the server
+    dispatcher.send(DataSignal, ctrl, (2, 12, points(12, 1)))
+    assert stream.get(9, timeout=0) is None
+    assert (stream.get(12, timeout=0) == points(12, 1)).all()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+IcePAP controller tests against the IcePAP emulator (no hardware required)
+"""
+
+import pytest
+
+from bliss.comm.tcp import Command
+from bliss.controllers.emulator import create_device
+from bliss.controllers.motors.icepap import Icepap, _ackcommand, _command_pipeline
+
+
+class FakeAxis(object):
+    def __init__(self, address):
+        self.address = address
+
+
+@pytest.fixture
+def icepap_port():
+    device_info = {'class': 'IcePAP',
+                   'axes': [dict(address=addr) for addr in (1, 2, 3)],
+                   'transports': [{'type': 'tcp', 'url': ('127.0.0.1', 0)}]}
+    device, transports = create_device(device_info)
+    for transport in transports:
+        transport.start()
+    yield transports[0].address[1]
+    for transport in transports:
+        transport.stop()
+
+
+@pytest.fixture
+def icepap(beacon, icepap_port):
+    ice = Icepap("ice", {"host": "127.0.0.1"}, [], [], [], [])
+    ice.initialize()
+    ice._cnx = Command("127.0.0.1", icepap_port, eol='\n')
+    yield ice
+    ice.finalize()
+
+
+def test_state_all(icepap):
+    axes = [FakeAxis(addr) for addr in (1, 2, 3)]
+    states = icepap.state_all(axes)
+    assert len(states) == 3
+    assert all(state.READY for state in states)
+    assert [str(state) for state in states] == \
+        [str(icepap.state(axis)) for axis in axes]
+
+
+def test_read_position_all(icepap):
+    axes = [FakeAxis(addr) for addr in (1, 2, 3)]
+    _ackcommand(icepap._cnx, "MOVE 1 10 2 20 3 30")
+    assert icepap.read_position_all(axes) == [10, 20, 30]
+    assert icepap.read_position_all(axes, cache=False) == [10, 20, 30]
+    assert icepap.read_position_all(axes[1:2]) == [icepap.read_position(axes[1])]
+
+
+def test_empty_pipeline(icepap):
+    assert icepap.state_all([]) == []
+    assert icepap.read_position_all([]) == []
+    # no transaction left waiting for a reply
+    assert icepap.read_position(FakeAxis(1)) == 0
+
+
+def test_command_pipeline_errors(icepap):
+    cnx = icepap._cnx
+    with pytest.raises(ValueError):
+        _command_pipeline(cnx, ["?FPOS 1", "POWER ON 1"])
+
+    # axis 4 is not in the emulated rack
+    with pytest.raises(RuntimeError):
+        _command_pipeline(cnx, ["?FPOS 1", "?FPOS 4", "?FPOS 2"])
+    with pytest.raises(RuntimeError):
+        icepap.read_position_all([FakeAxis(1), FakeAxis(4)])
+
+    # all the replies were read: the next requests get their own reply
+    assert _command_pipeline(cnx, ["?FPOS 1", "?FPOS 2"]) == ["0", "0"]
+    assert icepap.read_position(FakeAxis(3)) == 0
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+"""
+Lima BPM and ROI counters decoding tests (no Lima server required)
+"""
+
+import numpy
+
+from bliss.controllers.lima.bpm import Bpm
+from bliss.controllers.lima.roi import (RoiStat, RoiStatCounter,
+                                        RoiCounterGroupReadHandler)
+
+
+class BpmProxy(object):
+
+    def __init__(self, results):
+        self.results = results
+        self.result_size_reads = 0
+
+    @property
+    def ResultSize(self):
+        self.result_size_reads += 1
+        return 6
+
+    def On(self):
+        pass
+
+    def Off(self):
+        pass
+
+    def GetResults(self, from_index):
+        return self.results
+
+
+class RoiProxy(object):
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def readCounters(self, from_index):
+        return numpy.array([stat_values(frame, roi_id)
+                            for frame, roi_ids in enumerate(self.frames)
+                            for roi_id in roi_ids],
+                           dtype=numpy.double).ravel()
+
+
+class RoiController(object):
+
+    def __init__(self, proxy):
+        self._proxy = proxy
+        self._roi_ids = {'roi0': 0, 'roi1': 1, 'missing': 5}
+
+    def upload_rois(self):
+        pass
+
+
+def stat_values(frame, roi_id):
+    return [roi_id, frame] + [frame * 100 + roi_id * 10 + stat
+                              for stat in range(RoiStat.Sum, len(RoiStat))]
+
+
+def roi_counters(controller):
+    return [RoiStatCounter(roi_name, stat, controller=controller,
+                           acquisition_controller=controller)
+            for roi_name in ('roi0', 'roi1', 'missing')
+            for stat in (RoiStat.Sum, RoiStat.Max)]
+
+
+def expected_roi_values(frames, counters):
+    values = []
+    for counter in counters:
+        roi_id = counter.controller._roi_ids[counter.roi_name]
+        values.append([frame * 100 + roi_id * 10 + counter.stat
+                       for frame, roi_ids in enumerate(frames)
+                       if roi_id in roi_ids])
+    return values
+
+
+def test_bpm_get_values():
+    # 3 results of 6 values and an incomplete one
+    results = numpy.arange(3 * 6 + 2)
+    proxy = BpmProxy(results)
+    bpm = Bpm('test', proxy, proxy)
+    counters = [bpm.x, bpm.intensity, bpm.fwhm_y]
+    handler = bpm._grouped_read_handler
+    handler.prepare(*counters)
+    values = handler.get_values(0, *counters)
+    assert [list(v) for v in values] == [[2, 8, 14], [1, 7, 13], [5, 11, 17]]
+    assert all(v.dtype == numpy.double for v in values)
+
+    # the result size is read once per acquisition
+    proxy.results = numpy.array(())
+    assert [len(v) for v in handler.get_values(3, *counters)] == [0, 0, 0]
+    assert proxy.result_size_reads == 1
+    handler.prepare(*counters)
+    handler.get_values(0, *counters)
+    assert proxy.result_size_reads == 2
+
+
+def test_roi_get_values():
+    frames = [(0, 1), (0, 1), (0, 1)]
+    controller = RoiController(RoiProxy(frames))
+    counters = roi_counters(controller)
+    handler = RoiCounterGroupReadHandler(controller)
+    handler.prepare(*counters)
+    values = handler.get_values(0, *counters)
+    assert [list(v) for v in values] == expected_roi_values(frames, counters)
+    # missing roi
+    assert values[-1].size == 0
+
+    # next block of frames, in the order of the first one
+    controller._proxy.frames = [(0, 1)]
+    values = handler.get_values(3, *counters)
+    assert [list(v) for v in values] == \
+        expected_roi_values([(0, 1)], counters)
+
+    # no data
+    controller._proxy.frames = []
+    values = handler.get_values(4, *counters)
+    assert [v.size for v in values] == [0] * len(counters)
+
+
+def test_roi_get_values_order_change():
+    # the rois don't come in the same order in all the frames
+    frames = [(0, 1), (1, 0), (0, 1)]
+    controller = RoiController(RoiProxy(frames))
+    counters = roi_counters(controller)
+    handler = RoiCounterGroupReadHandler(controller)
+    handler.prepare(*counters)
+    values = handler.get_values(0, *counters)
+    assert [list(v) for v in values] == expected_roi_values(frames, counters)
+    assert values[-1].size == 0
+
+    # a roi missing in some frames
+    frames = [(0, 1), (1,), (0, 1)]
+    controller._proxy.frames = frames
+    handler.prepare(*counters)
+    values = handler.get_values(0, *counters)
+    assert [list(v) for v in values] == expected_roi_values(frames, counters)
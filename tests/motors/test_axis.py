@@ -486,3 +486,100 @@ def test_measured_position(m1, roby):
     assert m1.measured_position() == m1.position()
     with pytest.raises(RuntimeError):
       roby.measured_position()
+
+def test_settings_written_in_redis(roby):
+    from bliss.config import settings
+    from bliss.common import motor_settings
+    roby.velocity(3)
+    roby.limits(None, 10)
+    motor_settings.SETTINGS_WRITER.flush()
+    redis_settings = settings.HashSetting("axis.roby")
+    assert redis_settings['velocity'] == 3
+    assert redis_settings['high_limit'] == 10
+    assert 'low_limit' not in redis_settings
+    roby.velocity(2500)
+    roby.limits(None, None)
+
+def test_settings_writer_error(roby, monkeypatch):
+    from bliss.config import settings
+    from bliss.common import motor_settings
+    writer = motor_settings._SettingsWriter()
+    monkeypatch.setattr(writer, 'RETRY_DELAY', 0.1)
+    class FailingPipeline(object):
+      def __getattr__(self, name):
+        return lambda *args: None
+      def execute(self):
+        raise RuntimeError("redis error")
+    get_cache = settings.get_cache
+    monkeypatch.setattr(settings, 'get_cache',
+                        lambda: type('Cache', (object,), {'pipeline': lambda self: FailingPipeline()})())
+    writer.set('axis.roby', 'velocity', 3)
+    with pytest.raises(RuntimeError):
+      writer.flush()
+    # values kept for the next write, retried in the background
+    monkeypatch.setattr(settings, 'get_cache', get_cache)
+    gevent.sleep(0.3)
+    redis_settings = settings.HashSetting("axis.roby")
+    assert redis_settings['velocity'] == 3
+    roby.velocity(2500)
+
+def test_adaptive_polling(robz):
+    # 0.1s motion, much shorter than the polling time
+    robz.position(0)
+    start_time = time.time()
+    robz.move(10, polling_time=1)
+    assert time.time() - start_time < 0.5
+    assert robz.position() == 10
+
+def test_polling_schedule():
+    from bliss.common.axis import _PollingSchedule, FAST_POLLING_TIME
+    class FakeAxis(object):
+      steps_per_unit = 1
+      def velocity(self):
+        return 10.
+      def acceleration(self):
+        return 1000.
+    class FakeMotion(object):
+      delta = 10
+    # 1.01s motion, polled every 20ms
+    schedule = _PollingSchedule(FakeAxis(), FakeMotion(), 0.02)
+    assert schedule.delay() == 0.02
+    # fast polling only from 2 periods before to 1 period after the end
+    assert schedule.fast_end - schedule.fast_start == pytest.approx(0.06)
+    schedule.fast_start -= 1
+    assert schedule.delay() == FAST_POLLING_TIME
+    schedule.fast_end -= 1
+    assert schedule.delay() == 0.02
+
+def test_controller_poller_axis_error():
+    from bliss.common.axis import _ControllerPoller
+    class FakeAxis(object):
+      _hw_control = False
+      def __init__(self, name):
+        self.name = name
+    class FakeController(object):
+      def state_all(self, axes):
+        raise NotImplementedError
+      def state(self, axis):
+        if axis.name == 'bad':
+          raise RuntimeError("bad axis")
+        return 'MOVING'
+    poller = _ControllerPoller(FakeController())
+    good, bad = FakeAxis('good'), FakeAxis('bad')
+    good_task = gevent.spawn(poller.poll, good)
+    bad_task = gevent.spawn(poller.poll, bad)
+    gevent.joinall([good_task, bad_task])
+    # the error of an axis doesn't fail the other axes of the cycle
+    assert good_task.get() == ('MOVING', None)
+    with pytest.raises(RuntimeError):
+      bad_task.get()
+
+def test_end_of_motion_notification(robz, monkeypatch):
+    from bliss.common import axis
+    monkeypatch.setattr(axis, 'ADAPTIVE_POLLING', False)
+    monkeypatch.setattr(robz.controller, 'notify_end_of_motion', True)
+    robz.position(0)
+    start_time = time.time()
+    robz.move(10, polling_time=1)
+    assert time.time() - start_time < 0.5
+    assert robz.position() == 10
@@ -129,3 +129,22 @@ def test_hw_control(robz, robz2):
     assert robz2._hw_control == False
 
 
+
+def test_axes_polled_together(robz, robz2):
+    controller = robz.controller
+    assert robz2.controller is controller
+    polled_axes = []
+    state_all = controller.state_all
+    def state_all_spy(axes):
+        polled_axes.append(set(axes))
+        return state_all(axes)
+    controller.state_all = state_all_spy
+    try:
+        grp = Group(robz, robz2)
+        grp.move({ robz: 1, robz2: 1 })
+    finally:
+        del controller.state_all
+    assert set([robz, robz2]) in polled_axes
+    assert robz.position() == 1
+    assert robz2.position() == 1
+    assert robz.state() == "READY"
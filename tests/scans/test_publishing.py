@@ -7,25 +7,35 @@
 
 import pytest
 import time
+import struct
 import gevent
 import numpy
 import cPickle as pickle
 from bliss import setup_globals
 from bliss.common import scans
+from bliss.common import event
 from bliss.scanning.scan import Scan
 from bliss.scanning.chain import AcquisitionChain
 from bliss.scanning.acquisition.motor import SoftwarePositionTriggerMaster
 from bliss.scanning.acquisition.counter import SamplingCounterAcquisitionDevice
+from bliss.scanning.acquisition.lima import LimaAcquisitionMaster
+from bliss.scanning.acquisition.timer import SoftwareTimerMaster
 from bliss.data.node import DataNodeContainer
 from bliss.config.settings import scan as redis_scan
 from bliss.config.settings import QueueObjSetting
 from bliss.data.scan import Scan as ScanNode
-from bliss.data.node import get_node, DataNodeIterator
+from bliss.data.node import get_node, DataNodeIterator, _stream_entries
 from bliss.data.channel import ChannelDataNode
+from bliss.data import lima as lima_data
+from bliss.data.lima import edf_frames, LimaImageChannelDataNode
 try:
   import EdfFile
 except ImportError:
   EdfFile = None
+try:
+  import h5py
+except ImportError:
+  h5py = None
 
 def test_parent_node(beacon, scan_tmpdir):
     session = beacon.get("test_session")
@@ -38,6 +48,42 @@ def test_parent_node(beacon, scan_tmpdir):
     assert parent_node.type == "container"
     assert isinstance(parent_node, DataNodeContainer)
 
+def test_software_position_trigger(beacon, scan_tmpdir):
+    session = beacon.get("test_session")
+    session.setup()
+    scan_saving = getattr(setup_globals, "SCAN_SAVING")
+    scan_saving.base_path=str(scan_tmpdir)
+    parent = scan_saving.get_parent_node()
+    m = getattr(setup_globals, "roby")
+    velocity = m.velocity()
+    m.velocity(1)
+    diode = getattr(setup_globals, "diode")
+    npts = 10
+    master = SoftwarePositionTriggerMaster(m, 0, 1, npts)
+    chain = AcquisitionChain()
+    chain.add(master, SamplingCounterAcquisitionDevice(diode, 0.01, npoints=npts))
+    positions = list()
+    def position_changed(position):
+      positions.append(position)
+    event.connect(m, "position", position_changed)
+    try:
+      s = Scan(chain, "test_scan", parent)
+      with gevent.Timeout(10):
+        s.run()
+    finally:
+      event.disconnect(m, "position", position_changed)
+      m.velocity(velocity)
+
+    # the 1s cruise is polled every DEFAULT_POLLING_TIME
+    cruise = [p for p in positions if 0 < p < 1]
+    assert len(cruise) >= 20
+    # each point is triggered close to its position
+    assert master.index == npts
+    triggered = scans.get_data(s)['roby']
+    assert len(triggered) == npts
+    expected = numpy.linspace(0, 1, npts + 1)[:-1]
+    assert numpy.all(numpy.abs(triggered - expected) < 0.05)
+
 def test_scan_node(beacon, redis_data_conn, scan_tmpdir):
     session = beacon.get("test_session")
     session.setup()
@@ -170,6 +216,10 @@ def test_iterator_over_reference_with_lima(beacon, redis_data_conn, scan_tmpdir,
     view_iterator = iter(view)
     img0 = view_iterator.next()
 
+    images = node.get(from_index=0, to_index=npoints).as_array()
+    assert images.shape[0] == npoints
+    assert numpy.array_equal(images[0], img0)
+
     # make another scan -> this should make a new buffer on Lima server,
     # so images from previous view cannot be retrieved from server anymore
     scans.timescan(exp_time, lima_sim, npoints=1)
@@ -189,3 +239,345 @@ def test_iterator_over_reference_with_lima(beacon, redis_data_conn, scan_tmpdir,
 
  
 
+
+def test_hdf5_images_during_acquisition(beacon, scan_tmpdir, lima_simulator,
+                                        monkeypatch):
+    if h5py is None:
+        pytest.skip("h5py module is not available")
+    # images are read from the files only
+    def no_server(url):
+        raise RuntimeError("no server")
+    monkeypatch.setattr(lima_data, 'DeviceProxy', no_server)
+    npoints = 7
+    session = beacon.get("lima_test_session")
+    session.setup()
+    setup_globals.SCAN_SAVING.base_path=str(scan_tmpdir)
+    lima_sim = getattr(setup_globals, "lima_simulator")
+    master = LimaAcquisitionMaster(lima_sim, acq_nb_frames=npoints,
+                                   acq_expo_time=0.2,
+                                   acq_trigger_mode='INTERNAL_TRIGGER_MULTI',
+                                   prepare_once=True, start_once=True,
+                                   save_flag=True, saving_format='HDF5',
+                                   saving_suffix='.h5',
+                                   saving_frame_per_file=3)
+    chain = AcquisitionChain()
+    chain.add(SoftwareTimerMaster(0.2, npoints=npoints), master)
+    s = scans.step_scan(chain, {}, name='hdf5_images')
+    scan_greenlet = gevent.spawn(s.run)
+
+    # same view all along the acquisition: its files stay open
+    view = None
+    images = []
+    with gevent.Timeout(10):
+        while len(images) < npoints:
+            gevent.sleep(0.1)
+            if view is None:
+                nodes = DataNodeIterator(get_node(s.node.db_name)).walk(filter='lima', wait=False)
+                image_node = next(iter(nodes), None)
+                if image_node is None:
+                    continue
+                view = image_node.get(from_index=0, to_index=0)
+            len(view) # updates the view status
+            saved = view.last_image_saved + 1
+            if saved > len(images):
+                view.from_index, view.to_index = len(images), saved
+                images.extend(view)
+    scan_greenlet.get()
+
+    assert len(images) == npoints
+    view.from_index, view.to_index = 0, npoints
+    assert numpy.array_equal(numpy.array(images), view.as_array())
+    view.close()
+
+def write_edf(filename, frames):
+    with open(filename, 'wb') as f:
+        for i, frame in enumerate(frames):
+            header = ('{\nHeaderID = EH:%06d:000000:000000 ;\n'
+                      'ByteOrder = LowByteFirst ;\nDataType = UnsignedShort ;\n'
+                      'Dim_1 = 4 ;\nDim_2 = 3 ;\nSize = %d ;\nImage = %d ;\n'
+                      % (i + 1, frame.nbytes, i + 1))
+            header = header.ljust(510) + '}\n'
+            f.write(header)
+            f.write(frame.astype('<u2').tostring())
+
+def test_edf_frames(tmpdir):
+    edf_file = tmpdir.join('frames.edf')
+    frames = [numpy.arange(12, dtype=numpy.uint16).reshape(3, 4) + i
+              for i in range(3)]
+    write_edf(str(edf_file), frames)
+
+    parsed = edf_frames(str(edf_file))
+    assert len(parsed) == 3
+    content = edf_file.read('rb')
+    for (offset, dtype, shape), frame in zip(parsed, frames):
+        assert shape == (3, 4)
+        assert dtype == numpy.dtype('<u2')
+        data = numpy.frombuffer(content[offset:offset + frame.nbytes],
+                                dtype=dtype).reshape(shape)
+        assert numpy.array_equal(data, frame)
+
+
+class LimaRefData(list):
+    """lima node data: reference status followed by the saving parameters"""
+
+    class Connection(object):
+        def __init__(self, lima_acq_nb):
+            self.lima_acq_nb = lima_acq_nb
+        def get(self, server_url):
+            return self.lima_acq_nb
+
+    def __init__(self, status, saving=None, lima_acq_nb=1):
+        ref_status = dict(server_url='', lima_acq_nb=lima_acq_nb,
+                          buffer_max_number=100, last_image_acquired=-1,
+                          last_image_ready=-1, last_counter_ready=-1,
+                          last_image_saved=-1)
+        ref_status.update(status)
+        list.__init__(self, [ref_status] + ([saving] if saving else []))
+        self._connection = self.Connection(lima_acq_nb)
+
+    def _cnx(self):
+        return self._connection
+
+
+def lima_data_array(images):
+    """lima DATA_ARRAY message of an image or of a sequence of images"""
+    struct_format = '<IHHIIHHHHHHHHHHHHHHHHHHIII'
+    dims = list(reversed(images.shape)) + [0] * (6 - images.ndim)
+    header = struct.pack(struct_format,
+                         LimaImageChannelDataNode._GetView.DataArrayMagic, 2,
+                         struct.calcsize(struct_format), 0, 1, 0,
+                         images.ndim, *(dims + [0] * 10 + [0, 0, 0]))
+    return 'DATA_ARRAY', header + images.astype(numpy.uint16).tostring()
+
+
+class LimaProxy(object):
+
+    def __init__(self, images, image_seq=True):
+        self.images = images
+        self.image_seq = image_seq
+        self.requests = []
+
+    def readImageSeq(self, first_last):
+        self.requests.append(('readImageSeq', list(first_last)))
+        if not self.image_seq:
+            raise RuntimeError("readImageSeq not supported")
+        first, last = first_last
+        return lima_data_array(self.images[first:last])
+
+    def readImage(self, image_nb):
+        self.requests.append(('readImage', image_nb))
+        return lima_data_array(self.images[image_nb])
+
+
+def test_lima_images_from_server_memory(monkeypatch):
+    images = numpy.arange(5 * 12, dtype=numpy.uint16).reshape(5, 3, 4)
+    proxy = LimaProxy(images)
+    monkeypatch.setattr(lima_data, 'DeviceProxy', lambda url: proxy)
+    data = LimaRefData({'server_url': 'id00/limaccds/simulator',
+                        'last_image_acquired': 4, 'last_image_ready': 4})
+
+    view = LimaImageChannelDataNode._GetView(data, 0, 5)
+    assert numpy.array_equal(view.as_array(), images)
+    assert proxy.requests == [('readImageSeq', [0, 5])]
+
+    # by batches
+    del proxy.requests[:]
+    view.batch_size = 2
+    assert numpy.array_equal(numpy.array(list(view)), images)
+    assert proxy.requests == [('readImageSeq', [0, 2]),
+                              ('readImageSeq', [2, 4]),
+                              ('readImageSeq', [4, 5])]
+
+    # server without readImageSeq
+    proxy = LimaProxy(images, image_seq=False)
+    view = LimaImageChannelDataNode._GetView(data, 1, 4)
+    assert numpy.array_equal(view.as_array(), images[1:4])
+    assert proxy.requests == [('readImageSeq', [1, 4]), ('readImage', 1),
+                              ('readImage', 2), ('readImage', 3)]
+
+
+def test_lima_images_memmap(tmpdir):
+    frames = [numpy.arange(12, dtype=numpy.uint16).reshape(3, 4) + i
+              for i in range(3)]
+    write_edf(str(tmpdir.join('frames_0000.edf')), frames)
+    saving = dict(saving_mode='AUTO_FRAME', saving_format='EDF',
+                  saving_frame_per_file=3, saving_next_number=0,
+                  saving_directory=str(tmpdir), saving_prefix='frames_',
+                  saving_suffix='.edf')
+    data = LimaRefData({'last_image_acquired': 2, 'last_image_ready': 2,
+                        'last_image_saved': 2}, saving)
+
+    view = LimaImageChannelDataNode._GetView(data, 0, 3)
+    mapped = view.memmap()
+    # read-only view on the file
+    assert not mapped.flags.writeable
+    assert numpy.array_equal(mapped, numpy.array(frames))
+    if EdfFile is not None:
+        assert numpy.array_equal(view.as_array(), mapped)
+        view.close()
+
+    view = LimaImageChannelDataNode._GetView(data, 1, 3)
+    assert numpy.array_equal(view.memmap(), numpy.array(frames[1:]))
+
+    # image 3 is not saved
+    view = LimaImageChannelDataNode._GetView(data, 0, 4)
+    with pytest.raises(RuntimeError):
+        view.memmap()
+
+
+def test_binary_channel_storage(beacon, redis_data_conn):
+    from bliss.scanning.channel import AcquisitionChannel
+    from bliss.data.node import _create_node
+
+    channel = AcquisitionChannel("spectrum", numpy.float32, (8,), storage="binary")
+    parent = _create_node("test_binary_storage", "container")
+    node = channel.data_node(parent)
+    assert node.info["storage"] == "binary"
+
+    data = numpy.arange(80, dtype=numpy.float32).reshape(10, 8)
+    node.store("new_data", {"data": data[:3], "channel": channel})
+    node.store("new_data", {"data": data[3], "channel": channel})
+    node.store("new_data", {"data": data[4:], "channel": channel})
+
+    assert redis_data_conn.llen(node.db_name+"_data") == 3
+    assert len(node) == 10
+
+    reader_node = get_node(node.db_name)
+    assert numpy.array_equal(reader_node.get(0, -1), data)
+    assert numpy.array_equal(reader_node.get(2, 5), data[2:5])
+    assert numpy.array_equal(reader_node.get(3), data[3])
+
+def test_batched_publication(beacon, redis_data_conn):
+    session = beacon.get("test_session")
+    session.setup()
+    counter_class = getattr(setup_globals, 'TestScanGaussianCounter')
+    counter = counter_class("gaussian", 10, cnt_time=0.01)
+    s = scans.timescan(0.01, counter, npoints=10, return_scan=True, save=False)
+
+    stats = s.publisher.statistics
+    assert stats['events'] >= 10
+    assert 0 < stats['flushes'] < stats['events']
+    assert stats['max_latency'] >= stats['mean_latency']
+
+    redis_data = map(float, redis_data_conn.lrange(s.node.db_name+":timer:gaussian:gaussian_data", 0, -1))
+    assert numpy.array_equal(redis_data, counter.data)
+
+def test_data_iterator_events_stream(beacon, redis_data_conn, scan_tmpdir):
+    scan_saving = getattr(setup_globals, "SCAN_SAVING")
+    scan_saving.base_path=str(scan_tmpdir)
+    parent = scan_saving.get_parent_node()
+    m = getattr(setup_globals, "roby")
+    m.velocity(10)
+    diode = getattr(setup_globals, "diode")
+    npts = 5
+    chain = AcquisitionChain()
+    chain.add(SoftwarePositionTriggerMaster(m, 0, 1, npts), SamplingCounterAcquisitionDevice(diode, 0.01, npoints=npts))
+
+    s = Scan(chain, "test_scan", parent)
+    s.run()
+
+    # replay all the events of the scan from the beginning of its stream
+    iterator = DataNodeIterator(get_node(s.node.db_name))
+    last_point = dict()
+    with gevent.Timeout(5):
+        for event_type, node in iterator.walk_events(from_id='0'):
+            if event_type == DataNodeIterator.NEW_DATA_IN_CHANNEL_EVENT and \
+               iterator.last_event['event'] == 'data':
+                assert int(iterator.last_event['first']) == last_point.get(node.name, 0)
+                last_point[node.name] = int(iterator.last_event['last'])
+                if last_point == {'roby': npts, 'diode': npts}:
+                    break
+
+    # nothing left after the last consumed event
+    assert iterator.read_events(iterator.last_event_id) == []
+
+def test_data_events_streams(beacon, redis_data_conn):
+    session = beacon.get("test_session")
+    session.setup()
+    session_node = get_node(session.name)
+    iterator = DataNodeIterator(session_node)
+    counter_class = getattr(setup_globals, 'TestScanGaussianCounter')
+    counter = counter_class("gaussian", 10, cnt_time=0.01)
+    scan_greenlet = gevent.spawn(scans.timescan, 0.01, counter, npoints=10,
+                                 return_scan=True, save=False)
+
+    # the session iterator follows the data events of the new scan
+    last_point = 0
+    with gevent.Timeout(5):
+        for event_type, node in iterator.walk_events(filter='channel'):
+            if event_type == DataNodeIterator.NEW_DATA_IN_CHANNEL_EVENT and \
+               node.name == 'gaussian' and \
+               iterator.last_event['event'] == 'data':
+                last_point = int(iterator.last_event['last'])
+                if last_point == 10:
+                    break
+    s = scan_greenlet.get()
+
+    def events(node):
+        entries = redis_data_conn.execute_command(
+            'XRANGE', node._event_stream_name, '-', '+')
+        return [event['event'] for _, event in _stream_entries(entries)]
+    # data events are only published in the channel and scan streams
+    assert 'data' in events(s.node)
+    assert 'data' not in events(session_node)
+    assert 'end' in events(session_node)
+
+def test_resume_session_events(beacon, redis_data_conn):
+    session = beacon.get("test_session")
+    session.setup()
+    session_node = get_node(session.name)
+    counter_class = getattr(setup_globals, 'TestScanGaussianCounter')
+    counter = counter_class("gaussian", 10, cnt_time=0.05)
+    scan_greenlet = gevent.spawn(scans.timescan, 0.05, counter, npoints=10,
+                                 save=False)
+
+    def data_events(iterator, events):
+        for event_type, node in events:
+            if event_type == DataNodeIterator.NEW_DATA_IN_CHANNEL_EVENT and \
+               node.name == 'gaussian' and \
+               iterator.last_event['event'] == 'data':
+                yield int(iterator.last_event['last'])
+
+    # stop following the session during the scan
+    iterator = DataNodeIterator(session_node)
+    with gevent.Timeout(5):
+        for last in data_events(iterator, iterator.walk_events(filter='channel')):
+            break
+    from_id = iterator.last_event_id
+
+    # resume: the data events of the running scan are not lost
+    iterator = DataNodeIterator(session_node)
+    with gevent.Timeout(5):
+        for last in data_events(iterator, iterator.walk_events(filter='channel', from_id=from_id)):
+            if last == 10:
+                break
+    scan_greenlet.get()
+
+def test_channel_reader(beacon, redis_data_conn):
+    from bliss.scanning.channel import AcquisitionChannel
+    from bliss.data.node import _create_node
+    from bliss.data.channel import read_channels
+
+    parent = _create_node("test_channel_reader", "container")
+    counter = AcquisitionChannel("counter", numpy.float64, ())
+    spectrum = AcquisitionChannel("spectrum", numpy.int32, (4,), storage="binary")
+    counter_node = counter.data_node(parent)
+    spectrum_node = spectrum.data_node(parent)
+    counter_data = numpy.arange(6, dtype=numpy.float64)
+    spectrum_data = numpy.arange(24, dtype=numpy.int32).reshape(6, 4)
+
+    counter_reader = get_node(counter_node.db_name).get_reader()
+    spectrum_reader = get_node(spectrum_node.db_name).get_reader(from_index=1)
+    assert len(counter_reader.read()) == 0
+
+    counter_node.store("new_data", {"data": counter_data[:4], "channel": counter})
+    spectrum_node.store("new_data", {"data": spectrum_data[:4], "channel": spectrum})
+    new_counter, new_spectrum = read_channels([counter_reader, spectrum_reader])
+    assert numpy.array_equal(new_counter, counter_data[:4])
+    assert numpy.array_equal(new_spectrum, spectrum_data[1:4])
+
+    counter_node.store("new_data", {"data": counter_data[4:], "channel": counter})
+    spectrum_node.store("new_data", {"data": spectrum_data[4:], "channel": spectrum})
+    assert numpy.array_equal(counter_reader.read(), counter_data[4:])
+    assert numpy.array_equal(spectrum_reader.read(), spectrum_data[4:])
+    assert counter_reader.index == spectrum_reader.index == 6
@@ -51,6 +51,29 @@ def test_timescan(beacon):
     assert numpy.array_equal(scan_data['gaussian'], counter.data)
 
 
+def test_get_data_selection(beacon, tmpdir):
+    session = beacon.get("test_session")
+    session.setup()
+    counter_class = getattr(setup_globals, 'TestScanGaussianCounter')
+    counter = counter_class("gaussian", 10, cnt_time=0)
+    m1 = getattr(setup_globals, 'm1')
+    s = scans.ascan(m1, 0, 10, 10, 0, counter, return_scan=True, save=False)
+
+    scan_data = scans.get_data(s, channels=['gaussian'], first=2, last=7,
+                               block_size=2)
+    assert scan_data.dtype.names == ('gaussian',)
+    assert numpy.array_equal(scan_data['gaussian'], counter.data[2:7])
+
+    memmap_file = str(tmpdir.join('data.raw'))
+    scan_data = scans.get_data(s, memmap_threshold=0, memmap_file=memmap_file)
+    assert isinstance(scan_data, numpy.memmap)
+    assert numpy.array_equal(scan_data['gaussian'], counter.data)
+    assert numpy.array_equal(scans.get_data(s.node)['gaussian'], counter.data)
+
+    with pytest.raises(ValueError):
+        scans.get_data(s, channels=['unknown'])
+
+
 def test_pointscan(beacon):
     session = beacon.get("test_session")
     session.setup()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+#
+# This file is part of the bliss project
+#
+# Copyright (c) 2016 Beamline Control Unit, ESRF
+# Distributed under the GNU LGPLv3. See LICENSE for more info.
+
+import gevent
+import h5py
+import numpy
+from bliss import setup_globals
+from bliss.common import scans
+from bliss.data.node import get_node
+from bliss.scanning.writer.service import ScanWriter, wait_written
+
+
+def test_external_writer(beacon, scan_tmpdir):
+    session = beacon.get("test_session")
+    session.setup()
+    scan_saving = getattr(setup_globals, "SCAN_SAVING")
+    scan_saving.base_path = str(scan_tmpdir)
+    scan_saving.writer = 'external'
+    try:
+        counter_class = getattr(setup_globals, 'TestScanGaussianCounter')
+        counter = counter_class("gaussian", 10, cnt_time=0.01)
+        s = scans.timescan(0.01, counter, npoints=10, run=False, return_scan=True)
+        assert s.writer is None
+
+        writer_task = gevent.spawn(ScanWriter(get_node(s.node.db_name),
+                                              chunk_points=4).run)
+        gevent.sleep(0.1)
+        s.run()
+        status = wait_written(s.node, timeout=5)
+        writer_task.get()
+    finally:
+        scan_saving.writer = 'hdf5'
+
+    assert status['state'] == 'DONE'
+    assert status['points_written'] == status['points_available']
+    with h5py.File(status['filename'], 'r') as f:
+        measurement = f[s.node.name]['measurement']
+        data = measurement['timer_master']['gaussian:gaussian']
+        assert numpy.array_equal(data[:], counter.data)
+
+def test_external_writer_not_saved(beacon, scan_tmpdir):
+    session = beacon.get("test_session")
+    session.setup()
+    scan_saving = getattr(setup_globals, "SCAN_SAVING")
+    scan_saving.base_path = str(scan_tmpdir)
+    # saved by the in-process writer, not by the service
+    counter_class = getattr(setup_globals, 'TestScanGaussianCounter')
+    counter = counter_class("gaussian", 3, cnt_time=0.01)
+    s = scans.timescan(0.01, counter, npoints=3, run=False, return_scan=True)
+
+    writer_task = gevent.spawn(ScanWriter(get_node(s.node.db_name)).run)
+    gevent.sleep(0.1)
+    s.run()
+    status = wait_written(s.node, timeout=5)
+    writer_task.get()
+
+    assert status['state'] == 'NOT_SAVED'
+
+def test_external_writer_no_service(beacon, scan_tmpdir):
+    session = beacon.get("test_session")
+    session.setup()
+    scan_saving = getattr(setup_globals, "SCAN_SAVING")
+    scan_saving.base_path = str(scan_tmpdir)
+    scan_saving.writer = 'external'
+    try:
+        counter_class = getattr(setup_globals, 'TestScanGaussianCounter')
+        counter = counter_class("gaussian", 3, cnt_time=0.01)
+        s = scans.timescan(0.01, counter, npoints=3, return_scan=True)
+    finally:
+        scan_saving.writer = 'hdf5'
+
+    # no writer service: the scan is not saved
+    with gevent.Timeout(2):
+        status = wait_written(s.node, start_timeout=0.5)
+    assert status['state'] == 'NOT_SAVED'
@@ -11,7 +11,9 @@ from bliss.common import measurementgroup
 from bliss import setup_globals
 from bliss.common import scans
 from bliss.common import measurement
-from bliss.common.session import get_current
+from bliss.common.session import get_current, resolve, is_instance, _init_units, _LazyObject
+from bliss.common.axis import Axis
+from bliss.common.motor_group import Group
 from treelib import Tree
 
 def test_session_does_not_load_session(beacon):
@@ -110,3 +112,59 @@ def test_prdef(beacon, capsys):
   output = capsys.readouterr()[0]
   assert output.endswith(visible_func_code)
 
+def test_init_units(beacon):
+  units = _init_units(beacon, ['refs_test', 'm0'])
+  refs_unit = [u for u in units if 'refs_test' in u.names][0]
+  m0_unit = [u for u in units if 'm0' in u.names][0]
+  assert m0_unit in refs_unit.dependencies
+  assert units.index(m0_unit) < units.index(refs_unit)
+  required = set(name for unit in units for name in unit.required)
+  assert set(['s1hg', 's1vo']) <= required
+  for unit in units:
+    for dependency in unit.dependencies:
+      assert units.index(dependency) < units.index(unit)
+
+def test_concurrent_setup(beacon):
+  session = beacon.get("test_session")
+  initialized = dict()
+  for concurrency in (1, 4):
+    # empty setup_globals
+    [setup_globals.__dict__.pop(k) for k in setup_globals.__dict__.keys()]
+    beacon._clear_instances()
+    env_dict = dict()
+    session.setup(env_dict, concurrency=concurrency)
+    initialized[concurrency] = set(session.init_times)
+    assert initialized[concurrency] == set(session.object_names)
+  assert initialized[1] == initialized[4]
+
+def test_lazy_setup(beacon):
+  session = beacon.get("test_session")
+  # empty setup_globals
+  [setup_globals.__dict__.pop(k) for k in setup_globals.__dict__.keys()]
+  beacon._clear_instances()
+  env_dict = dict()
+  session.setup(env_dict, lazy=True)
+  assert isinstance(setup_globals.robz, _LazyObject)
+  assert env_dict['robz'] is setup_globals.robz
+  assert 'robz' not in session.init_times
+  # measurement groups are created at setup
+  assert measurementgroup.get_all()
+  robz = setup_globals.robz
+  assert robz
+  assert robz == beacon.get('robz')
+  assert not robz != beacon.get('robz')
+  assert beacon.get('robz') in {robz: None}
+  assert robz.name == 'robz'
+  assert 'robz' in session.init_times
+  assert setup_globals.robz is beacon.get('robz')
+  assert env_dict['robz'] is setup_globals.robz
+  assert resolve(robz) is setup_globals.robz
+  assert isinstance(setup_globals.roby, _LazyObject)
+  # only the axes are created when looking for axes
+  assert not is_instance(setup_globals.diode, Axis)
+  assert isinstance(setup_globals.diode, _LazyObject)
+  assert is_instance(setup_globals.m0, Axis)
+  assert not isinstance(setup_globals.m0, _LazyObject)
+  group = Group(setup_globals.roby)
+  assert group.axes['roby'] is beacon.get('roby')
+  assert not isinstance(setup_globals.roby, _LazyObject)